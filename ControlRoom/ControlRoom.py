@@ -22,13 +22,23 @@ SOFTWARE.
 import logging
 import os
 import json
-import random, qt, time
-import numpy as np
+import qt
+from ControlRoomLib import ControlRoomProtocol as protocol
+from ControlRoomLib.ControlRoomAutopilot import ControlRoomAutopilot
+from ControlRoomLib.ControlRoomEngine import ControlRoomEngine
+from ControlRoomLib.ControlRoomRigs import ControlRoomRigs
 from ControlRoomLib.UtilSlicerFuncs import setRotation
-from ControlRoomLib.UtilConnections import UtilConnections
 from ControlRoomLib.UtilSlicerFuncs import setTranslation
 from datetime import datetime, timedelta
-from ControlRoomLib.UtilConnectionsWtNnBlcRcv import UtilConnectionsWtNnBlcRcv
+from ControlRoomLib.UtilCalibration import CALIBRATION_MODELS
+from ControlRoomLib.UtilEventLoop import UtilEventLoopQt
+from ControlRoomLib.UtilHeatmap import UtilHeatmap
+from ControlRoomLib.UtilReplay import UtilReplayData
+from ControlRoomLib.UtilSceneAssets import UtilSceneAssets, loadRenderMesh
+from ControlRoomLib.UtilMetrics import metrics
+from ControlRoomLib.UtilPickerModel import UtilPickerModel
+from ControlRoomLib.UtilPoseFilter import POSE_FILTERS
+from ControlRoomLib.UtilRenderMode import UtilRenderMode
 
 import vtk
 
@@ -81,6 +91,10 @@ class ControlRoomWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.logic = None
         self._parameterNode = None
         self._updatingGUIFromParameterNode = False
+        self._metricsTimer = None
+        self._renderFpsTimer = None
+        self._rigsTimer = None
+        self._storeTimer = None
 
     def setup(self):
         """
@@ -102,7 +116,6 @@ class ControlRoomWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         # Create logic class. Logic implements all computations that should be possible to run
         # in batch mode, without a graphical user interface.
         self.logic = ControlRoomLogic(self.resourcePath('Configs/'))
-        self.logic.ui = self.ui
 
         # Connections
 
@@ -112,9 +125,20 @@ class ControlRoomWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
         # These connections ensure that whenever user changes some settings on the GUI, that is saved in the MRML scene
         # (in the selected parameter node).
+        # Subject, session and trial pickers only update the rows that change
+        self._subjectPicker = UtilPickerModel(self.ui.comboSubjectAcr)
+        self._expTimePicker = UtilPickerModel(self.ui.comboExpTime)
+        self._targetTrialPicker = UtilPickerModel(self.ui.comboTargetTrial)
+        self.ui.lineSubjectFilter.connect("textChanged(QString)", self._subjectPicker.setFilter)
+        self.ui.lineExpTimeFilter.connect("textChanged(QString)", self._expTimePicker.setFilter)
         self.ui.comboSubjectAcr.connect("currentIndexChanged(int)", self.onComboSubjectAcr)
         self.ui.comboExpTime.connect("currentIndexChanged(int)", self.onComboExpTime)
         self.ui.comboTargetTrial.connect("currentIndexChanged(int)", self.onComboTargetTrial)
+        for i in POSE_FILTERS:
+            self.ui.comboPoseFilter.addItem(i)
+        self.ui.comboPoseFilter.connect("currentIndexChanged(int)", self.onComboPoseFilter)
+        for i in CALIBRATION_MODELS:
+            self.ui.comboCalibrationModel.addItem(i)
 
         # Buttons
         self.ui.pushAddSubj.connect('clicked(bool)', self.onPushAddSubj)
@@ -128,33 +152,71 @@ class ControlRoomWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.ui.pushStopCurTrial.connect('clicked(bool)', self.onPushStopCurTrial)
         self.ui.pushCurTrial.connect('clicked(bool)', self.onPushCurTrial)
         self.ui.pushTargetTrial.connect('clicked(bool)', self.onPushTargetTrial)
+        self.ui.pushAutopilot.connect('clicked(bool)', self.onPushAutopilot)
+        self.ui.pushAutopilotPause.connect('clicked(bool)', self.onPushAutopilotPause)
+        self.ui.pushAutopilotNext.connect('clicked(bool)', self.onPushAutopilotNext)
+        self.ui.numAutopilotInterval.connect('valueChanged(double)', self.onNumAutopilotInterval)
         self.ui.pushReplay.connect('clicked(bool)', self.onPushReplay)
         self.ui.pushReplayRecord.connect('clicked(bool)', self.onPushReplayRecord)
+        self.ui.pushHeatmapFromFile.connect('clicked(bool)', self.onPushHeatmapFromFile)
+        self.ui.pushClearHeatmap.connect('clicked(bool)', self.onPushClearHeatmap)
+        self.ui.checkHeatmap.connect('toggled(bool)', self.onCheckHeatmap)
+        self.ui.checkRenderMode.connect('toggled(bool)', self.onCheckRenderMode)
+        self.ui.pushFitCalibration.connect('clicked(bool)', self.onPushFitCalibration)
 
         self.ui.pushConnect.connect('clicked(bool)', self.onPushConnect)
+        self.ui.pushConnectRigs.connect('clicked(bool)', self.onPushConnectRigs)
+        self.ui.pushExportMetrics.connect('clicked(bool)', self.onPushExportMetrics)
+        self.ui.checkMetrics.connect('toggled(bool)', self.onCheckMetrics)
+        self.ui.checkProfiling.connect('toggled(bool)', self.onCheckProfiling)
+        self.ui.checkCapture.connect('toggled(bool)', self.onCheckCapture)
+        self.ui.checkNoGoggles.connect('toggled(bool)', self.onCheckNoGoggles)
 
         # Text
         self.ui.textTimer.setPlainText("Trial Duration Timer: 00:00:00.000000") 
         self.ui.textIPPort.connect('textChanged()', self.onTextIPPort)
+        self.ui.lineTrackerShm.connect('editingFinished()', self.onLineTrackerShm)
         self.ui.textSessionSeq.connect('textChanged()', self.onTextSessionSeq)
 
         # Make sure parameter node is initialized (needed for module reload)
         self.initializeParameterNode()
 
-        for i in self.logic._subjectAcrList:
-            self.ui.comboSubjectAcr.addItem(i)
+        self._subjectPicker.setItems(self.logic.engine.store.acronymList())
+        # Pick up edits of other stations sharing SubjectConfig.json
+        self._storeTimer = qt.QTimer()
+        self._storeTimer.setInterval(2000)
+        self._storeTimer.connect('timeout()', self.updateFromStore)
+        self._storeTimer.start()
+        self.onCheckNoGoggles(self.ui.checkNoGoggles.checked)
+        self.ui.comboPoseFilter.setCurrentText(self._parameterNode.GetParameter("PoseFilter"))
+
+        # Pick up where the last session was (e.g. after a crash)
+        record = self.logic.processRestoreSession()
+        if record:
+            self._subjectPicker.setCurrentText(record["SubjectAcr"])
+            self._expTimePicker.setCurrentText(record["ExperimentTimeStamp"])
+
+        # Warm the mesh cache once the GUI is up so visualization starts instantly
+        qt.QTimer.singleShot(0, lambda: self.logic._sceneAssets.preload( \
+            ["BoardModel.STL", "TrackerIndicatorModel.STL"]))
 
     def cleanup(self):
         """
         Called when the application closes and the module widget is destroyed.
         """
         self.removeObservers()
-        if self.logic._connections_screendot:
-            self.logic._connections_screendot.clear()
-        if self.logic._connections_tracker:
-            self.logic._connections_tracker.clear()
-        if self.logic._connections_goggle:
-            self.logic._connections_goggle.clear()
+        if self._metricsTimer:
+            self._metricsTimer.stop()
+        if self._rigsTimer:
+            self._rigsTimer.stop()
+        if self._storeTimer:
+            self._storeTimer.stop()
+        if self._renderFpsTimer:
+            self._renderFpsTimer.stop()
+        self.logic.stopRenderMode()
+        self.logic.stopGazeDisplay()
+        self.logic.stopHeatmap()
+        self.logic.processDisconnectTerminal()
 
     def enter(self):
         """
@@ -194,6 +256,7 @@ class ControlRoomWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
         self.setParameterNode(self.logic.getParameterNode())
         self.ui.textIPPort.setPlainText(self._parameterNode.GetParameter("TerminalIPPort")) 
+        self.ui.lineTrackerShm.setText(self._parameterNode.GetParameter("TrackerSharedMemory"))
 
     def setParameterNode(self, inputParameterNode):
         """
@@ -322,44 +385,149 @@ class ControlRoomWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     def onTextIPPort(self):
         self._parameterNode.SetParameter("TerminalIPPort", self.ui.textIPPort.plainText)
 
+    def onLineTrackerShm(self):
+        self.logic.engine.setTrackerSharedMemory(self.ui.lineTrackerShm.text.strip())
+
     def onPushConnect(self):
+        self.logic.engine.linkStatusCallback = self.updateLinkStatus
         self.logic.processConnectTerminal()
 
+    def onPushConnectRigs(self):
+        path = self.ui.pathRigs.currentPath
+        if path == '':
+            slicer.util.errorDisplay("No rigs file.")
+            return
+        try:
+            self.logic.processConnectRigs(path)
+        except (OSError, ValueError, KeyError) as e:
+            slicer.util.errorDisplay("Could not load rigs: " + str(e))
+            return
+        if not self._rigsTimer:
+            self._rigsTimer = qt.QTimer()
+            self._rigsTimer.setInterval(1000)
+            self._rigsTimer.connect('timeout()', self.updateRigStatus)
+        self._rigsTimer.start()
+        self.updateRigStatus()
+
+    def updateRigStatus(self):
+        self.ui.textRigStatus.setPlainText(self.logic.rigs.summary())
+
+    def onCheckNoGoggles(self, checked):
+        self.logic.engine.useGoggles = not checked
+
+    def onComboPoseFilter(self):
+        self.logic.engine.setPoseFilter(self.ui.comboPoseFilter.currentText)
+
+    def updateLinkStatus(self, summary, changed=False):
+        self.ui.labelLinkStatus.setText(summary)
+
+    def onCheckMetrics(self, checked):
+        metrics.enabled = checked
+        if not self._metricsTimer:
+            self._metricsTimer = qt.QTimer()
+            self._metricsTimer.setInterval(1000)
+            self._metricsTimer.connect('timeout()', self.updateMetricsPanel)
+        if checked:
+            self._metricsTimer.start()
+        else:
+            self._metricsTimer.stop()
+
+    def onCheckProfiling(self, checked):
+        if checked:
+            metrics.startProfiling()
+            print("[AKTRACK INFO] Profiling started.")
+        elif metrics.isProfiling():
+            self.ui.textMetrics.setPlainText(metrics.stopProfiling())
+            print("[AKTRACK INFO] Profiling stopped.")
+
+    def onCheckCapture(self, checked):
+        if checked:
+            self.logic.engine.startCapture(self.logic._configPath + "Capture-" + \
+                datetime.now().strftime("%Y%m%d%H%M%S") + ".akcap")
+        else:
+            self.logic.engine.stopCapture()
+
+    def updateMetricsPanel(self):
+        text = metrics.report()
+        for name, stats in self.logic.engine.receiveStats().items():
+            text += "\n%s datagrams: %s" % (name, stats)
+        self.ui.textMetrics.setPlainText(text)
+
+    def onPushExportMetrics(self):
+        path = qt.QFileDialog.getSaveFileName(None, "Export Metrics", "", "JSON (*.json)")
+        if not path:
+            return
+        metrics.export(path)
+        if metrics.isProfiling():
+            report = metrics.stopProfiling(path + ".prof")
+            with open(path + ".txt", "w") as f:
+                f.write(report)
+            self.ui.checkProfiling.checked = False
+        print("[AKTRACK INFO] Metrics exported to " + path)
+
     def onPushAddSubj(self):
-        self.ui.comboSubjectAcr.clear()
-        acr = self.ui.textAddSubj.text
-        self.logic.processAddSubject(acr)
-        for i in self.logic._subjectAcrList:
-            self.ui.comboSubjectAcr.addItem(i)
-        self.ui.comboSubjectAcr.setCurrentIndex(self.ui.comboSubjectAcr.count-1)
+        acr = self.logic.processAddSubject(self.ui.textAddSubj.text)
+        if acr is None:
+            return
+        self._subjectPicker.setItems(self.logic.engine.store.acronymList())
+        self._subjectPicker.setCurrentText(acr)
+
+    def updateFromStore(self):
+        """
+        Apply the subjects and sessions other stations added or changed to
+        the pickers, leaving the selection and the sequence being edited
+        alone.
+        """
+        store = self.logic.engine.store
+        changed = store.refresh()
+        if not changed:
+            return
+        current = self.ui.comboSubjectAcr.currentText
+        self.ui.comboSubjectAcr.blockSignals(True)
+        self._subjectPicker.setItems(store.acronymList())
+        self.ui.comboSubjectAcr.blockSignals(False)
+        if self.ui.comboSubjectAcr.currentText != current:
+            self.onComboSubjectAcr()
+            return
+        subjectNum = self.logic.engine.subjectNum() if current else None
+        if subjectNum in changed and subjectNum in store.subjects():
+            self.ui.comboExpTime.blockSignals(True)
+            self._expTimePicker.setItems([e["datetime"] for e in store.experiments(subjectNum)])
+            self.ui.comboExpTime.blockSignals(False)
+            self.ui.comboTargetTrial.blockSignals(True)
+            self._targetTrialPicker.setItems(store.sequence(subjectNum, self.ui.comboExpTime.currentText) or [])
+            self.ui.comboTargetTrial.blockSignals(False)
 
     def onComboSubjectAcr(self, i=None):
         self._parameterNode.SetParameter("SubjectAcr", self.ui.comboSubjectAcr.currentText) 
-        self.ui.comboExpTime.clear()
+        sessions = []
         if self._parameterNode.GetParameter("SubjectAcr"):
-            subj = self.logic._subjectConfig[self._parameterNode.GetParameter("SubjectAcr").split("_")[1]]
-            exparr = subj["experiments"]
-            for e in exparr:
-                self.ui.comboExpTime.addItem(e["datetime"])
+            sessions = [e["datetime"] for e in self.logic.engine.store.experiments(self.logic.engine.subjectNum())]
+        # One session update per subject change, whether or not the
+        # selected row moved
+        self.ui.comboExpTime.blockSignals(True)
+        self._expTimePicker.setItems(sessions)
+        self.ui.comboExpTime.blockSignals(False)
+        self.onComboExpTime()
 
     def onComboExpTime(self,i=None):
         self._parameterNode.SetParameter("ExperimentTimeStamp", self.ui.comboExpTime.currentText) 
         if self._parameterNode.GetParameter("SubjectAcr"):
-            subj = self.logic._subjectConfig[self._parameterNode.GetParameter("SubjectAcr").split("_")[1]]
-            exparr = subj["experiments"]
             self.onPushRetrieveSeq()
-            self.ui.comboTargetTrial.clear()
-            for e in exparr:
-                if e["datetime"] == self.ui.comboExpTime.currentText:
-                    for ee in e["sequence"]:
-                        self.ui.comboTargetTrial.addItem(ee)
+            seq = self.logic.engine.store.sequence(self.logic.engine.subjectNum(), self.ui.comboExpTime.currentText)
+            self.ui.comboTargetTrial.blockSignals(True)
+            self._targetTrialPicker.setItems(seq or [])
+            self.ui.comboTargetTrial.blockSignals(False)
+            self.onComboTargetTrial()
+            self.ui.labelCalibration.setText("Calibration: " + self.logic.engine.loadCalibration().report())
 
     def onPushStartAnExp(self):
         timestamp = datetime.now().strftime("%m%d%Y%H%M%S")
-        self.logic.processStartAnExp(timestamp)
+        if not self.logic.processStartAnExp(timestamp):
+            return
         self._parameterNode.SetParameter("ExperimentTimeStamp", timestamp)
         self.onComboSubjectAcr()
-        self.ui.comboExpTime.setCurrentIndex(self.ui.comboExpTime.count-1)
+        self._expTimePicker.setCurrentText(timestamp)
 
     def onPushRandSeq(self):
         # see orders.png for more information
@@ -380,12 +548,10 @@ class ControlRoomWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self._parameterNode.SetParameter("SessionSeqTempDisplay", self.ui.textSessionSeq.plainText)
     
     def onPushRetrieveSeq(self):
-        subj = self.logic._subjectConfig[self._parameterNode.GetParameter("SubjectAcr").split("_")[1]]
-        exparr = subj["experiments"]
-        for e in exparr:
-            if e["datetime"] == self.ui.comboExpTime.currentText:
-                self.ui.textSessionSeq.setPlainText('\n'.join(e["sequence"])) 
-                self._parameterNode.SetParameter("SessionSeq", self._parameterNode.GetParameter("SessionSeqTempDisplay"))
+        seq = self.logic.engine.store.sequence(self.logic.engine.subjectNum(), self.ui.comboExpTime.currentText)
+        if seq is not None:
+            self.ui.textSessionSeq.setPlainText('\n'.join(seq))
+            self._parameterNode.SetParameter("SessionSeq", self._parameterNode.GetParameter("SessionSeqTempDisplay"))
 
     def onPushApplySeq(self):
         text = self._parameterNode.GetParameter("SessionSeqTempDisplay")
@@ -393,130 +559,119 @@ class ControlRoomWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
             exp = self.logic.processApplySeq(text)
             if exp:
                 self._parameterNode.SetParameter("SessionSeq", text)
-                self.ui.comboTargetTrial.clear()
-                for i in exp:
-                    self.ui.comboTargetTrial.addItem(i)
+                self._targetTrialPicker.setItems(exp)
         
     def onPushStartVis(self):
+        self.logic.setupIndicatorScene()
+        self.logic.startGazeDisplay()
+        self.logic.engine.startVisualization()
 
-        if not self._parameterNode.GetNodeReference("TrackerIndicatorTr"):
-            transformNode = slicer.vtkMRMLTransformNode()
-            slicer.mrmlScene.AddNode(transformNode)
-            self._parameterNode.SetNodeReferenceID(
-                "TrackerIndicatorTr", transformNode.GetID())
-
-        if not self._parameterNode.GetNodeReference("TrackerIndicator"):
-            inputModel = slicer.util.loadModel(self.logic._configPath + "BoardModel.STL")
-            inputModel.GetDisplayNode().SetColor(0,0,0)
-            inputModel = slicer.util.loadModel(self.logic._configPath + "TrackerIndicatorModel.STL")
-            inputModel.GetDisplayNode().SetColor(1,1,1)
-            self._parameterNode.SetNodeReferenceID(
-                "TrackerIndicator", inputModel.GetID())
+    def onPushStopVis(self):
+        self.logic.stopGazeDisplay()
+        self.logic.engine.stopVisualization()
+        
+    def onCheckHeatmap(self, checked):
+        if checked:
+            self.logic.startHeatmap()
+        else:
+            self.logic.stopHeatmap()
+
+    def onCheckRenderMode(self, checked):
+        if not self._renderFpsTimer:
+            self._renderFpsTimer = qt.QTimer()
+            self._renderFpsTimer.setInterval(1000)
+            self._renderFpsTimer.connect('timeout()', self.updateRenderFps)
+        if checked:
+            self.logic.startRenderMode()
+            self._renderFpsTimer.start()
+        else:
+            self._renderFpsTimer.stop()
+            print("[AKTRACK INFO] Render mode: " + self.logic.renderMode.frameRate.report() + ".")
+            self.logic.stopRenderMode()
+            self.ui.labelRenderFps.setText("")
 
-            threeDViewNode = slicer.app.layoutManager().threeDWidget(0).threeDView().mrmlViewNode()
-            camera = slicer.modules.cameras.logic().GetViewActiveCameraNode(threeDViewNode).GetCamera()
-            t,m = vtk.vtkTransform(), vtk.vtkMatrix4x4()
-            setRotation([\
-                [1,0,0], \
-                [0,0,-1], \
-                [0,1,0]], m)
-            t.SetMatrix(m)
-            camera.ApplyTransform(t)
+    def updateRenderFps(self):
+        self.ui.labelRenderFps.setText(self.logic.renderMode.frameRate.report())
 
-        modelTransform = self._parameterNode.GetNodeReference("TrackerIndicatorTr")
-        modelIndicator = self._parameterNode.GetNodeReference("TrackerIndicator")
+    def onPushHeatmapFromFile(self):
+        path = self.ui.pathReplay.currentPath
+        if path == '':
+            slicer.util.errorDisplay("No file.")
+            return
+        heatmap = self.logic.processHeatmapFromFile(path)
+        print("[AKTRACK INFO] Heatmap of " + str(heatmap.total) + " samples (" + \
+            str(heatmap.outside) + " off the board).")
 
-        modelTransform.SetMatrixTransformToParent(self.logic._connections_tracker._transformMatrixTrackerIndicator)
-        modelIndicator.SetAndObserveTransformNodeID(
-            modelTransform.GetID())
+    def onPushClearHeatmap(self):
+        self.logic.clearHeatmap()
 
-        comm_out = "start_visualizat" + ";"
-        self.logic._connections_tracker.utilSendCommand(comm_out)
-        self._parameterNode.SetParameter("Visualization", "true")
+    def onPushFitCalibration(self):
+        path = self.ui.pathReplay.currentPath
+        if path == '':
+            slicer.util.errorDisplay("No file. The VPC recordings are looked up next to the data file.")
+            return
+        try:
+            speed = float(self.ui.lineVpcSpeed.text)
+            fixation = [float(v) for v in self.ui.lineVpcFixation.text.split(",")]
+            onset = float(self.ui.lineVpcOnset.text)
+            if len(fixation) != 2:
+                raise ValueError()
+        except ValueError:
+            slicer.util.errorDisplay("Enter the VPC dot speed, its fixation point (x,y) and its onset.")
+            return
+        calibration = self.logic.processFitCalibration(os.path.dirname(path), speed, fixation, onset, \
+            self.ui.comboCalibrationModel.currentText)
+        if not calibration:
+            return
+        print("[AKTRACK INFO] Calibration fitted: " + calibration.report() + ".")
+        if slicer.util.confirmYesNoDisplay("Calibration fitted: " + calibration.report() + \
+                ".\nUse it for this session (live indicator, replays and heatmaps)?"):
+            self.logic.engine.acceptCalibration()
+            self.ui.labelCalibration.setText("Calibration: " + calibration.report())
+        else:
+            self.logic.engine.discardCalibration()
 
-    def onPushStopVis(self):
-        comm_out = "stop_visualizati" + ";"
-        self.logic._connections_tracker.utilSendCommand(comm_out)
-        self._parameterNode.SetParameter("Visualization", "false")
-        
     def onPushPrevTrial(self):
-        
-        if self._parameterNode.GetParameter("PrevTrial"):
-            if self._parameterNode.GetParameter("PrevTrial") == "__NONE__":
-                return
-            else:
-                # Notify aktrack-matlab module
-                if not self.ui.checkNoGoggles.checked: 
-                    if self._parameterNode.GetParameter("PrevTrial") == "VPB-hfixed":
-                        self.logic._connections_goggle.utilSendCommand('1')
-                    elif self._parameterNode.GetParameter("PrevTrial") == "VPB-hfree":
-                        self.logic._connections_goggle.utilSendCommand('2')
-                # Notify aktrack-ros module
-                comm_out = "start_trialxxxxx" + "_" + \
-                    self._parameterNode.GetParameter("ExperimentTimeStamp") + "_" + \
-                    self._parameterNode.GetParameter("SubjectAcr").split("_")[1] + "_" + \
-                    self._parameterNode.GetParameter("PrevTrial") + ";"
-                self.logic._connections_tracker.utilSendCommand(comm_out)
-                # Notify aktrack-screen module
-                comm = {"commandtype":"trialcommand", \
-                    "commandcontent":self._parameterNode.GetParameter("PrevTrial")}
-                comm_out = json.dumps(comm)
-                self.logic._connections_screendot.utilSendCommand(comm_out)
-                self._parameterNode.SetParameter("RunningATrial", "true")
-                # Update the "current trial" and "previous trial" identifiers
-                sessionSeq = self._parameterNode.GetParameter("SessionSeq").strip().split("\n")
-                sessionSeq = ["__NONE__"] + sessionSeq + ["__NONE__"]
-                self._parameterNode.SetParameter("TrialIndex", \
-                    str(int(self._parameterNode.GetParameter("TrialIndex"))-1))
-                self._parameterNode.SetParameter("PrevTrial", \
-                    sessionSeq[int(self._parameterNode.GetParameter("TrialIndex"))])
-                self._parameterNode.SetParameter("CurTrial", \
-                    sessionSeq[int(self._parameterNode.GetParameter("TrialIndex"))+1])
-                # Set GUI timer
-                self._timer_start = datetime.now()
-                qt.QTimer.singleShot(329, self.AccuTimerCallBack)
+        if self.logic.engine.performPreviousTrial():
+            # Set GUI timer
+            self._timer_start = datetime.now()
+            qt.QTimer.singleShot(329, self.AccuTimerCallBack)
 
     def onPushStopCurTrial(self):
-        # Notify aktrack-screen module
-        comm = {"commandtype":"trialstopcommand", \
-            "commandcontent":""}
-        comm_out = json.dumps(comm)
-        self.logic._connections_screendot.utilSendCommand(comm_out)
-        # Notify aktrack-ros module (delay notifying to account for subject reaction time)
-        qt.QTimer.singleShot(500, self.logic._connections_screendot.utilDelayNotifyEndTrialROS)
-        # Notify aktrack-matlab module
-        if not self.ui.checkNoGoggles.checked: 
-            if self._parameterNode.GetParameter("CurTrial") == "VPB-hfixed":
-                self.logic._connections_goggle.utilSendCommand('3')
-            elif self._parameterNode.GetParameter("CurTrial") == "VPB-hfree":
-                self.logic._connections_goggle.utilSendCommand('4')
-        
+        self.logic.engine.stopCurrentTrial()
+
     def onPushCurTrial(self):
-        
-        if self._parameterNode.GetParameter("CurTrial"):
-            if self._parameterNode.GetParameter("CurTrial") == "__NONE__":
-                return
-            else:
-                # Notify aktrack-matlab module
-                if not self.ui.checkNoGoggles.checked: 
-                    if self._parameterNode.GetParameter("CurTrial") == "VPB-hfixed":
-                        self.logic._connections_goggle.utilSendCommand('1')
-                    elif self._parameterNode.GetParameter("CurTrial") == "VPB-hfree":
-                        self.logic._connections_goggle.utilSendCommand('2')
-                # Notify aktrack-ros module
-                comm_out = "start_trialxxxxx" + "_" + \
-                    self._parameterNode.GetParameter("ExperimentTimeStamp") + "_" + \
-                    self._parameterNode.GetParameter("SubjectAcr").split("_")[1] + "_" + \
-                    self._parameterNode.GetParameter("CurTrial") + ";"
-                self.logic._connections_tracker.utilSendCommand(comm_out)
-                # Notify aktrack-screen module
-                comm = {"commandtype":"trialcommand", \
-                    "commandcontent":self._parameterNode.GetParameter("CurTrial")}
-                comm_out = json.dumps(comm)
-                self.logic._connections_screendot.utilSendCommand(comm_out)
-                self._parameterNode.SetParameter("RunningATrial", "true")
-                self._timer_start = datetime.now()
-                qt.QTimer.singleShot(329, self.AccuTimerCallBack)
+        if self.logic.engine.performCurrentTrial():
+            self._timer_start = datetime.now()
+            qt.QTimer.singleShot(329, self.AccuTimerCallBack)
+
+    def onPushAutopilot(self):
+        autopilot = self.logic.autopilot
+        autopilot.stateCallback = self.updateAutopilotStatus
+        if autopilot.state in ("idle", "done", "failed"):
+            autopilot.start(float(self.ui.numAutopilotInterval.value))
+        else:
+            autopilot.stop()
+
+    def onPushAutopilotPause(self):
+        if self.logic.autopilot.state == "paused":
+            self.logic.autopilot.resume()
+        else:
+            self.logic.autopilot.pause()
+
+    def onPushAutopilotNext(self):
+        self.logic.autopilot.startNext()
+
+    def onNumAutopilotInterval(self, value):
+        self.logic.autopilot.interval = max(value, protocol.TRACKER_STOP_DELAY + 0.1)
+
+    def updateAutopilotStatus(self, state):
+        self.ui.labelAutopilotStatus.setText("Autopilot " + state)
+        self.ui.pushAutopilot.text = "Start Autopilot" if state in ("idle", "done", "failed") else "Stop Autopilot"
+        self.ui.pushAutopilotPause.text = "Resume" if state == "paused" else "Pause"
+        if state == "running":
+            self._timer_start = datetime.now()
+            qt.QTimer.singleShot(329, self.AccuTimerCallBack)
 
     def AccuTimerCallBack(self):
         if self._parameterNode.GetParameter("RunningATrial") == "true":
@@ -529,97 +684,26 @@ class ControlRoomWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     
     def onPushTargetTrial(self):
         # Check if the name is valid
-        if self._parameterNode.GetParameter("TargetTrial"):
-            # Notify aktrack-matlab module
-            if not self.ui.checkNoGoggles.checked: 
-                if self._parameterNode.GetParameter("TargetTrial") == "VPB-hfixed":
-                    self.logic._connections_goggle.utilSendCommand('1')
-                elif self._parameterNode.GetParameter("TargetTrial") == "VPB-hfree":
-                    self.logic._connections_goggle.utilSendCommand('2')
-            # Notify aktrack-ros module
-            comm_out = "start_trialxxxxx" + "_" + \
-                self._parameterNode.GetParameter("ExperimentTimeStamp") + "_" + \
-                self._parameterNode.GetParameter("SubjectAcr").split("_")[1] + "_" + \
-                self._parameterNode.GetParameter("TargetTrial") + ";"
-            self.logic._connections_tracker.utilSendCommand(comm_out)
-            # Notify aktrack-screen module
-            # Send trial info to screen dot application
-            comm = {"commandtype":"trialcommand", \
-                "commandcontent":self._parameterNode.GetParameter("TargetTrial")}
-            comm_out = json.dumps(comm)
-            self.logic._connections_screendot.utilSendCommand(comm_out)
-            # Set the running flag
-            self._parameterNode.SetParameter("RunningATrial", "true")
-            # Update the "current trial" and "previous trial" identifiers
-            sessionSeq = self._parameterNode.GetParameter("SessionSeq").strip().split("\n")
-            sessionSeq = ["__NONE__"] + sessionSeq + ["__NONE__"]
-            self._parameterNode.SetParameter("TrialIndex", \
-                str(self.ui.comboTargetTrial.currentIndex))
-            self._parameterNode.SetParameter("PrevTrial", \
-                sessionSeq[int(self._parameterNode.GetParameter("TrialIndex"))])
-            self._parameterNode.SetParameter("CurTrial", \
-                sessionSeq[int(self._parameterNode.GetParameter("TrialIndex"))+1])
+        if self.logic.engine.performTargetTrial(self.ui.comboTargetTrial.currentIndex):
             # Set GUI timer
             self._timer_start = datetime.now()
             qt.QTimer.singleShot(329, self.AccuTimerCallBack)
 
     def replayInit(self):
-        self.onPushConnect()
         path = self.ui.pathReplay.currentPath 
         if path == '':
             slicer.util.errorDisplay("No file.")
             return
-        import csv
-        data = []
-        with open (path) as csvfile:
-            spamreader = csv.reader(csvfile)
-            for row in spamreader:
-                data.append(row)
-        
-        data = np.array(data,dtype=float)
-        data = data[:,0:3] # t, x, y
-
         playspeed = float(self.ui.numReplaySpeed.value)
         print("[AKTRACK INFO] Setting replay speed " + str(playspeed) + "x.")
-        
-        data[:,0] = data[:,0] / float(playspeed)
 
-        self.replay_data = data
-        self.replay_t_max = np.max(data[:,0])
+        self.replay_data = UtilReplayData.open(path, playspeed, self.logic.engine.recordingCalibration(path))
+        self.replay_t_max = self.replay_data.t_max
 
     def onPushReplay(self):
         self.replayInit()
 
-        if not self._parameterNode.GetNodeReference("TrackerIndicatorTr"):
-            transformNode = slicer.vtkMRMLTransformNode()
-            slicer.mrmlScene.AddNode(transformNode)
-            self._parameterNode.SetNodeReferenceID(
-                "TrackerIndicatorTr", transformNode.GetID())
-
-        if not self._parameterNode.GetNodeReference("TrackerIndicator"):
-            inputModel = slicer.util.loadModel(self.logic._configPath + "BoardModel.STL")
-            inputModel.GetDisplayNode().SetColor(0,0,0)
-            inputModel = slicer.util.loadModel(self.logic._configPath + "TrackerIndicatorModel.STL")
-            inputModel.GetDisplayNode().SetColor(1,1,1)
-            self._parameterNode.SetNodeReferenceID(
-                "TrackerIndicator", inputModel.GetID())
-
-            threeDViewNode = slicer.app.layoutManager().threeDWidget(0).threeDView().mrmlViewNode()
-            camera = slicer.modules.cameras.logic().GetViewActiveCameraNode(threeDViewNode).GetCamera()
-            t,m = vtk.vtkTransform(), vtk.vtkMatrix4x4()
-            setRotation([\
-                [1,0,0], \
-                [0,0,-1], \
-                [0,1,0]], m)
-            t.SetMatrix(m)
-            camera.ApplyTransform(t)
-
-        modelTransform = self._parameterNode.GetNodeReference("TrackerIndicatorTr")
-        modelIndicator = self._parameterNode.GetNodeReference("TrackerIndicator")
-
-        modelTransform.SetMatrixTransformToParent(self.logic._connections_tracker._transformMatrixTrackerIndicator)
-        modelIndicator.SetAndObserveTransformNodeID(
-            modelTransform.GetID())
+        self.logic.setupIndicatorScene()
 
         self.timer_start_replay = datetime.now()
         self.helperReplay()
@@ -652,22 +736,22 @@ class ControlRoomWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         print("[AKTRACK INFO] Record stopped.")
 
         
+    @metrics.timed("helperReplay")
     def helperReplay(self):
         duration = (datetime.now() - self.timer_start_replay).total_seconds()
         duration = timedelta(seconds=duration).total_seconds()
-        t = self.replay_data[:,0]
-        now_idx = np.max(np.where(t <= duration))
-        p = self.replay_data[now_idx,1:3]
-        p = [-p[0] * 1000.0, -p[1] * 1000.0, 0]
-        
-        setTranslation(p, self.logic._connections_tracker._transformMatrixTrackerIndicator)
+        p = self.replay_data.positionAt(duration)
+
+        setTranslation(p, self.logic._transformMatrixTrackerIndicator)
         self._parameterNode.GetNodeReference(
-            "TrackerIndicatorTr").SetMatrixTransformToParent(self.logic._connections_tracker._transformMatrixTrackerIndicator)
-        slicer.app.processEvents()
+            "TrackerIndicatorTr").SetMatrixTransformToParent(self.logic._transformMatrixTrackerIndicator)
+        if not self.logic.renderMode.requestRender():
+            slicer.app.processEvents()
 
         if duration < self.replay_t_max:
             qt.QTimer.singleShot(30, self.helperReplay)
         else:
+            self.replay_data.close()
             print("[AKTRACK INFO] Replay ended.")
 #
 # ControlRoomLogic
@@ -681,6 +765,10 @@ class ControlRoomLogic(ScriptedLoadableModuleLogic):
     requiring an instance of the Widget.
     Uses ScriptedLoadableModuleLogic base class, available at:
     https://github.com/Slicer/Slicer/blob/master/Base/Python/slicer/ScriptedLoadableModule.py
+
+    Session, protocol and connection logic is in ControlRoomEngine
+    (ControlRoomLib), which runs without Slicer. This class binds it to
+    the MRML parameter node, the Qt event loop and the scene.
     """
 
     def __init__(self, configPath):
@@ -689,315 +777,266 @@ class ControlRoomLogic(ScriptedLoadableModuleLogic):
         """
         ScriptedLoadableModuleLogic.__init__(self)
         self._configPath = configPath
-        self.initializeModule()
-        self._connections_screendot = None
-        self._connections_tracker = None
-        self._connections_goggle = None
+        self._parameterNode = self.getParameterNode()
+        self.engine = ControlRoomEngine(configPath, self._parameterNode, UtilEventLoopQt())
+        self._transformMatrixTrackerIndicator = vtk.vtkMatrix4x4()
+        self._transformMatrixGazeIndicator = vtk.vtkMatrix4x4()
+        self._gazeTimer = None
+        self._gazeShown = 0
+        self._heatmap = None
+        self._heatmapTimer = None
+        self._heatmapSeen = 0
+        self._sceneAssets = UtilSceneAssets(configPath)
+        self.engine.openJournal(configPath + "TrialJournal.log")
+        self.rigs = ControlRoomRigs(configPath, self.engine.store)
+        self.autopilot = ControlRoomAutopilot(self.engine)
+        self.renderMode = UtilRenderMode()
 
     def setDefaultParameters(self, parameterNode):
         """
         Initialize parameter node with default settings.
         """
-        if not parameterNode.GetParameter("RunningATrial"):
-            parameterNode.SetParameter("RunningATrial", "false")
-        if not parameterNode.GetParameter("Visualization"):
-            parameterNode.SetParameter("Visualization", "false")
-        if not parameterNode.GetParameter("SubjectAcr"):
-            parameterNode.SetParameter("SubjectAcr", self.ui.comboSubjectAcr.currentText)
-        if not parameterNode.GetParameter("ExperimentTimeStamp"):
-            parameterNode.SetParameter("ExperimentTimeStamp", self.ui.comboExpTime.currentText) 
-        if not parameterNode.GetParameter("TargetTrial"):
-            parameterNode.SetParameter("TargetTrial", self.ui.comboTargetTrial.currentText)
-        if not parameterNode.GetParameter("TerminalIPPort"):
-            parameterNode.SetParameter("TerminalIPPort", \
-            "127.0.0.1:8753\n127.0.0.1:8769\n127.0.0.1:8757\n10.17.101.48:8057\n0.0.0.0:8059\n0.0.0.0:8083\n127.0.0.1:8297\n127.0.0.1:8293")
-        if not parameterNode.GetParameter("CurTrial"):
-            parameterNode.SetParameter("CurTrial", "__NONE__")
-        if not parameterNode.GetParameter("PrevTrial"):
-            parameterNode.SetParameter("PrevTrial", "__NONE__")
+        self._parameterNode = parameterNode
+        self.engine.setParameterNode(parameterNode)
 
-    def processConnectTerminal(self):
+    def setupIndicatorScene(self):
+        """
+        Make sure the board, the tracker indicator and its transform are in
+        the scene. Meshes come from the per-process cache, so this does no
+        file I/O after the first call, even after a scene clear.
+        """
+        if not self._parameterNode.GetNodeReference("TrackerIndicatorTr"):
+            transformNode = slicer.vtkMRMLTransformNode()
+            slicer.mrmlScene.AddNode(transformNode)
+            self._parameterNode.SetNodeReferenceID(
+                "TrackerIndicatorTr", transformNode.GetID())
 
-        terminalIPPort = self._parameterNode.GetParameter("TerminalIPPort")
-        ipPortArr = terminalIPPort.strip().split("\n")
-        packetInterval = 8 # wait time of the singleShot function (msec)
-
-        # Screen dot connections
-        sock_ip_receive_nnblc, sock_port_receive_nnblc = \
-            ipPortArr[2].split(":")[0], int(ipPortArr[2].split(":")[1])
-        sock_ip_receive, sock_port_receive = \
-            ipPortArr[1].split(":")[0], int(ipPortArr[1].split(":")[1])
-        sock_ip_send, sock_port_send = \
-            ipPortArr[0].split(":")[0], int(ipPortArr[0].split(":")[1])
-
-        if not self._connections_screendot:
-            self._connections_screendot = ControlRoomConnectionsScreenDot(sock_ip_receive_nnblc, sock_port_receive_nnblc, packetInterval, \
-                sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send)
-            self._connections_screendot.setup()
-            self._connections_screendot._flag_receiving_nnblc = True
-            self._connections_screendot.receiveTimerCallBack()
-            self._connections_screendot._parameterNode = self._parameterNode
-            self._connections_screendot.ui = self.ui
-
-        # Tracker connections
-        sock_ip_receive_nnblc, sock_port_receive_nnblc = \
-            ipPortArr[5].split(":")[0], int(ipPortArr[5].split(":")[1])
-        sock_ip_receive, sock_port_receive = \
-            ipPortArr[4].split(":")[0], int(ipPortArr[4].split(":")[1])
-        sock_ip_send, sock_port_send = \
-            ipPortArr[3].split(":")[0], int(ipPortArr[3].split(":")[1])
-
-        if not self._connections_tracker:
-            self._connections_tracker = ControlRoomConnectionsTracker(sock_ip_receive_nnblc, sock_port_receive_nnblc, packetInterval, \
-                sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send)
-            self._connections_tracker.setup()
-            self._connections_tracker._flag_receiving_nnblc = True
-            self._connections_tracker.receiveTimerCallBack()
-            self._connections_tracker._parameterNode = self._parameterNode
-
-        self._connections_screendot._connections_tracker = self._connections_tracker
-
-        # Goggle connections
-        sock_ip_receive, sock_port_receive = \
-            ipPortArr[7].split(":")[0], int(ipPortArr[7].split(":")[1])
-        sock_ip_send, sock_port_send = \
-            ipPortArr[6].split(":")[0], int(ipPortArr[6].split(":")[1])
-
-        if not self._connections_goggle:
-            self._connections_goggle = UtilConnections(sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send)
-            self._connections_goggle.setup()
-            self._connections_goggle._sock_receive.settimeout(15)
-
-        self._connections_screendot._connections_goggle = self._connections_goggle
-            
-    def initializeModule(self):
-        with open(self._configPath + "SubjectConfig.json") as f:
-            self._subjectConfig = json.load(f)
-        self._subjectAcrList = []
-        self._subjectNumList = []
-        for i in self._subjectConfig.keys():
-            self._subjectAcrList.append(self._subjectConfig[i]["acronym"]+"_"+i) 
-            self._subjectNumList.append(int(i))
-        self._parameterNode = self.getParameterNode()
-    
-    def processAddSubject(self, acr):
-        subjectNum = max(self._subjectNumList)+1
-        self._subjectAcrList.append(acr + "_" + str(subjectNum))
-        self._subjectNumList.append(subjectNum)
-        newSubject = {str(subjectNum): {"acronym": acr, "experiments": []}}
-        self._subjectConfig.update(newSubject)
-        with open(self._configPath + "SubjectConfig.json", "w") as f:
-            json.dump(self._subjectConfig, f, indent=4)
+        if not self._parameterNode.GetNodeReference("TrackerIndicator"):
+            self._sceneAssets.addModel("BoardModel.STL", (0,0,0))
+            inputModel = self._sceneAssets.addModel("TrackerIndicatorModel.STL", (1,1,1))
+            self._parameterNode.SetNodeReferenceID(
+                "TrackerIndicator", inputModel.GetID())
 
-    def processStartAnExp(self, timestamp):
-        subj = self._subjectConfig[self._parameterNode.GetParameter("SubjectAcr").split("_")[1]]
-        exparr = subj["experiments"]
-        exparr.append({"datetime": timestamp, "sequence": []})
-        subj["experiments"] = exparr
-        with open(self._configPath + "SubjectConfig.json", "w") as f:
-            json.dump(self._subjectConfig, f, indent=4)
-    
-    def processRandSeq(self):
-        vpb = ["VPB-hfree", "VPB-hfixed"]
-        random.shuffle(vpb)
-
-        vpc = ["VPC-L", "VPC-R", "VPC-U", "VPC-D"]
-        vpc.extend(random.sample(set(vpc), 2))
-        random.shuffle(vpc)
-
-        # vpm = ["VPM-2", "VPM-4", "VPM-6", "VPM-8", "VPM-12", "VPM-24"]
-        vpm = ["VPM-2", "VPM-4", "VPM-6", "VPM-8", "VPM-12", "VPM-18"]
-        random.shuffle(vpm)
-        def randDir(sess):
-            arr = [sess+"-L", sess+"-R", sess+"-U", sess+"-D"]
-            arr.extend(random.sample(set(arr), 2))
-            random.shuffle(arr)
-            return arr
-        tempvpm = []
-        for i in range(len(vpm)):
-            tempvpm.extend(randDir(vpm[i]))
-        vpm = tempvpm
-        
-        res = [vpb, vpc, vpm]
-        random.shuffle(res)
-        return res
+            threeDViewNode = slicer.app.layoutManager().threeDWidget(0).threeDView().mrmlViewNode()
+            camera = slicer.modules.cameras.logic().GetViewActiveCameraNode(threeDViewNode).GetCamera()
+            t,m = vtk.vtkTransform(), vtk.vtkMatrix4x4()
+            setRotation([\
+                [1,0,0], \
+                [0,0,-1], \
+                [0,1,0]], m)
+            t.SetMatrix(m)
+            camera.ApplyTransform(t)
 
-    def processSeqTextCheck(self, text):
-        res = text.strip().split("\n")
-        # saved = ['VPM-2-L', 'VPM-2-U', 'VPM-2-R', 'VPM-2-D', \
-        #     'VPM-4-L', 'VPM-4-U', 'VPM-4-R', 'VPM-4-D', \
-        #     'VPM-12-U', 'VPM-12-R', 'VPM-12-L', 'VPM-12-D', \
-        #     'VPM-6-U', 'VPM-6-L', 'VPM-6-D', 'VPM-6-R', \
-        #     'VPM-24-U', 'VPM-24-R', 'VPM-24-D', 'VPM-24-L', \
-        #     'VPM-8-D', 'VPM-8-L', 'VPM-8-R', 'VPM-8-U', \
-        #     'VPC-U', 'VPC-D', 'VPC-R', 'VPC-L', \
-        #     'VPB-hfixed', 'VPB-hfree']
-        saved = ['VPM-2-L', 'VPM-2-U', 'VPM-2-R', 'VPM-2-D', \
-            'VPM-4-L', 'VPM-4-U', 'VPM-4-R', 'VPM-4-D', \
-            'VPM-12-U', 'VPM-12-R', 'VPM-12-L', 'VPM-12-D', \
-            'VPM-6-U', 'VPM-6-L', 'VPM-6-D', 'VPM-6-R', \
-            'VPM-18-U', 'VPM-18-R', 'VPM-18-D', 'VPM-18-L', \
-            'VPM-8-D', 'VPM-8-L', 'VPM-8-R', 'VPM-8-U', \
-            'VPC-U', 'VPC-D', 'VPC-R', 'VPC-L', \
-            'VPB-hfixed', 'VPB-hfree']
-        saved_poped = []
-        if len(res) != len(saved) + 14:
-            slicer.util.errorDisplay("The sequence does not pass! Number of trials is not valid")
-            return
-        while res:
-            i = res.pop(0)
-            if i not in saved and i not in saved_poped:
-                slicer.util.errorDisplay("The sequence does not pass: A trial is not valid")
-                return
-            if i not in saved and i in saved_poped:
-                saved_poped.remove(i)
-            if i in saved and i not in saved_poped:
-                saved.remove(i)
-                saved_poped.append(i)
-            if i in saved and i in saved_poped:
-                slicer.util.errorDisplay("The sequence does not pass: A trial repeated 3 times")
-                return
-        if len(saved) != 0:
-            slicer.util.errorDisplay("The sequence does not pass: A trial is not performed")
-            return
-        return True
+        modelTransform = self._parameterNode.GetNodeReference("TrackerIndicatorTr")
+        modelIndicator = self._parameterNode.GetNodeReference("TrackerIndicator")
 
-    def processApplySeq(self, text):
-        exp = text.strip().split("\n")
-        subj = self._subjectConfig[self._parameterNode.GetParameter("SubjectAcr").split("_")[1]]
-        exparr = subj["experiments"]
-        for i in exparr:
-            if self._parameterNode.GetParameter("ExperimentTimeStamp") == i["datetime"]:
-                if slicer.util.confirmYesNoDisplay("Override the previous sequence?"):
-                    i["sequence"] = exp
-                    subj["experiments"] = exparr
-                    with open(self._configPath + "SubjectConfig.json", "w") as f:
-                        json.dump(self._subjectConfig, f, indent=4)
-                    self._parameterNode.SetParameter("CurTrial", exp[0])
-                    self._parameterNode.SetParameter("PrevTrial", "__NONE__")
-                    self._parameterNode.SetParameter("TrialIndex", "0")
-                    return exp
-                else:
-                    return None
-        if not self._parameterNode.GetParameter("ExperimentTimeStamp"):
-            return None
-        self._parameterNode.SetParameter("CurTrial", exp[0])
-        self._parameterNode.SetParameter("PrevTrial", "__NONE__")
-        self._parameterNode.SetParameter("TrialIndex", "0")
-        exparr.append({"datetime": self._parameterNode.GetParameter("ExperimentTimeStamp"), "sequence": exp})
-        subj["experiments"] = exparr
-        with open(self._configPath + "SubjectConfig.json", "w") as f:
-            json.dump(self._subjectConfig, f, indent=4)
-        
-        return exp
+        modelTransform.SetMatrixTransformToParent(self._transformMatrixTrackerIndicator)
+        if modelIndicator.GetTransformNodeID() != modelTransform.GetID():
+            modelIndicator.SetAndObserveTransformNodeID(
+                modelTransform.GetID())
 
-class ControlRoomConnectionsScreenDot(UtilConnectionsWtNnBlcRcv):
+    def startGazeDisplay(self):
+        """
+        Show the latest gaze sample next to the tracker indicator. Refreshed
+        at display rate (30 Hz), independent of the gaze sample rate.
+        """
+        if self.engine.gazeBuffer() is None:
+            return
+        if not self._parameterNode.GetNodeReference("GazeIndicatorTr"):
+            transformNode = slicer.vtkMRMLTransformNode()
+            slicer.mrmlScene.AddNode(transformNode)
+            self._parameterNode.SetNodeReferenceID("GazeIndicatorTr", transformNode.GetID())
+        if not self._parameterNode.GetNodeReference("GazeIndicator"):
+            gazeModel = self._sceneAssets.addSphere(5.0, (1,0,0), "GazeIndicator")
+            self._parameterNode.SetNodeReferenceID("GazeIndicator", gazeModel.GetID())
+        self._parameterNode.GetNodeReference("GazeIndicator").SetAndObserveTransformNodeID( \
+            self._parameterNode.GetNodeReference("GazeIndicatorTr").GetID())
+        if not self._gazeTimer:
+            self._gazeTimer = qt.QTimer()
+            self._gazeTimer.setInterval(33)
+            self._gazeTimer.connect('timeout()', self.updateGazeDisplay)
+        self._gazeTimer.start()
+
+    def stopGazeDisplay(self):
+        if self._gazeTimer:
+            self._gazeTimer.stop()
+
+    def updateGazeDisplay(self):
+        gazeBuffer = self.engine.gazeBuffer()
+        if gazeBuffer is None or gazeBuffer.written == self._gazeShown:
+            return
+        self._gazeShown = gazeBuffer.written
+        sample = gazeBuffer.latest()
+        setTranslation([sample[1], sample[2], 0], self._transformMatrixGazeIndicator)
+        self._parameterNode.GetNodeReference("GazeIndicatorTr").SetMatrixTransformToParent( \
+            self._transformMatrixGazeIndicator)
+        self.renderMode.requestRender()
+
+    def setupHeatmapScene(self):
+        """
+        Make sure the heatmap accumulator and its textured plane over the
+        board are in place.
+        """
+        if not self._heatmap:
+            from vtk.util import numpy_support
+            bounds = loadRenderMesh(self._configPath + "BoardModel.STL").GetBounds()
+            self._heatmap = UtilHeatmap(bounds[0:4])
+            self._heatmapImage = vtk.vtkImageData()
+            self._heatmapImage.SetDimensions(self._heatmap.shape[1], self._heatmap.shape[0], 1)
+            self._heatmapImage.AllocateScalars(vtk.VTK_UNSIGNED_CHAR, 4)
+            self._heatmapPixels = numpy_support.vtk_to_numpy(self._heatmapImage.GetPointData().GetScalars())
+            self._heatmapProducer = vtk.vtkTrivialProducer()
+            self._heatmapProducer.SetOutput(self._heatmapImage)
+            self._heatmapSeen = self.engine.timeline.stream("tracker").written
+        if not self._parameterNode.GetNodeReference("DriftHeatmap"):
+            xmin, xmax, ymin, ymax = self._heatmap.extent
+            # Just above the board surface
+            z = loadRenderMesh(self._configPath + "BoardModel.STL").GetBounds()[5] + 0.5
+            heatmapModel = self._sceneAssets.addPlane([xmin, xmin + self._heatmap.shape[1] * self._heatmap.binSize, \
+                ymin, ymin + self._heatmap.shape[0] * self._heatmap.binSize], z, "DriftHeatmap")
+            displayNode = heatmapModel.GetDisplayNode()
+            displayNode.SetTextureImageDataConnection(self._heatmapProducer.GetOutputPort())
+            displayNode.SetInterpolateTexture(False)
+            displayNode.SetBackfaceCulling(False)
+            displayNode.SetScalarVisibility(False)
+            self._parameterNode.SetNodeReferenceID("DriftHeatmap", heatmapModel.GetID())
+
+    def startHeatmap(self):
+        """
+        Accumulate live tracker poses into the heatmap. The poses are binned
+        in batches from the timeline and the texture refreshed at display
+        rate (30 Hz), independent of the pose rate.
+        """
+        self.setupHeatmapScene()
+        self._parameterNode.GetNodeReference("DriftHeatmap").GetDisplayNode().SetVisibility(True)
+        if not self._heatmapTimer:
+            self._heatmapTimer = qt.QTimer()
+            self._heatmapTimer.setInterval(33)
+            self._heatmapTimer.connect('timeout()', self.updateHeatmap)
+        self._heatmapTimer.start()
+
+    def stopHeatmap(self):
+        if self._heatmapTimer:
+            self._heatmapTimer.stop()
+        if self._parameterNode.GetNodeReference("DriftHeatmap"):
+            self._parameterNode.GetNodeReference("DriftHeatmap").GetDisplayNode().SetVisibility(False)
+
+    def clearHeatmap(self):
+        if self._heatmap:
+            self._heatmap.clear()
+            self.refreshHeatmapTexture()
+
+    def updateHeatmap(self):
+        stream = self.engine.timeline.stream("tracker")
+        if stream.written == self._heatmapSeen:
+            return
+        t, positions = stream.tail(stream.written - self._heatmapSeen)
+        self._heatmapSeen = stream.written
+        self._heatmap.addPositions(self.engine.calibration.applyLive(positions))
+        self.refreshHeatmapTexture()
 
-    def __init__(self, sock_ip_receive_nnblc, sock_port_receive_nnblc, packetInterval, \
-            sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send):
-        super().__init__(sock_ip_receive_nnblc, sock_port_receive_nnblc, packetInterval, \
-            sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send)
+    def refreshHeatmapTexture(self):
+        self._heatmap.rgba(self._heatmapPixels)
+        self._heatmapImage.Modified()
+        self.renderMode.requestRender()
 
-    def setup(self):
-        super().setup()
-        self._jsondata = None
-
-    def handleReceivedData(self):
-        """
-        Override the parent class function
-        """
-        func = self.utilMsgParse()
-        func()
-
-    def utilMsgParse(self):
-        """
-        """
-        data = self._data_buff.decode("UTF-8")
-        self._jsondata = json.loads(data)
-        if self._jsondata["commandtype"] == "test":
-            return self.utilTestCallBack
-        elif self._jsondata["commandtype"] == "trialStop":
-            return self.utilTrialStopped
-
-    def utilTestCallBack(self):
-        """
-        """
-        print("test")
-
-    def utilTrialStopped(self):
-        print("Trial stopped")
-        self._parameterNode.SetParameter("RunningATrial", "false")
-        # Notify aktrack-ros module (delay notifying to account for subject reaction time)
-        qt.QTimer.singleShot(500, self.utilDelayNotifyEndTrialROS)
-        # Notify aktrack-matlab module
-        if not self.ui.checkNoGoggles.checked: 
-            if self._parameterNode.GetParameter("CurTrial") == "VPB-hfixed":
-                print("sending end command (VPB-hfixed) ...")
-                self._connections_goggle.utilSendCommand('3')
-            elif self._parameterNode.GetParameter("CurTrial") == "VPB-hfree":
-                print("sending end command (VPB-hfree) ...")
-                self._connections_goggle.utilSendCommand('4')
-
-        msg = self._jsondata["commandcontent"]
-        if msg == "trialcomplete":
-            sessionSeq = self._parameterNode.GetParameter("SessionSeq").strip().split("\n")
-            sessionSeq = ["__NONE__"] + sessionSeq + ["__NONE__"]
-            self._parameterNode.SetParameter("TrialIndex", \
-                str(int(self._parameterNode.GetParameter("TrialIndex"))+1))
-            self._parameterNode.SetParameter("PrevTrial", \
-                sessionSeq[int(self._parameterNode.GetParameter("TrialIndex"))])
-            self._parameterNode.SetParameter("CurTrial", \
-                sessionSeq[int(self._parameterNode.GetParameter("TrialIndex"))+1])
-        elif msg == "trialstop":
-            return
+    def startRenderMode(self):
+        """
+        Render the 3D view alone, on demand (see UtilRenderMode). No model
+        of the scene is shown in the slice views meanwhile.
+        """
+        self.setupIndicatorScene()
+        self.renderMode.enter([m.GetDisplayNode() for m in slicer.util.getNodesByClass("vtkMRMLModelNode") \
+            if m.GetDisplayNode()])
 
-    def utilDelayNotifyEndTrialROS(self):
-        comm_out = "stop_trialxxxxxx" + ";"
-        self._connections_tracker.utilSendCommand(comm_out)
+    def stopRenderMode(self):
+        self.renderMode.leave()
 
-class ControlRoomConnectionsTracker(UtilConnectionsWtNnBlcRcv):
+    def processHeatmapFromFile(self, path):
+        """
+        Rebuild the heatmap from a recording (CSV or archive) in one pass.
+        """
+        self.setupHeatmapScene()
+        self._heatmap.clear()
+        self._heatmap.addRecording(path, self.engine.recordingCalibration(path))
+        self.refreshHeatmapTexture()
+        self._parameterNode.GetNodeReference("DriftHeatmap").GetDisplayNode().SetVisibility(True)
+        return self._heatmap
 
-    def __init__(self, sock_ip_receive_nnblc, sock_port_receive_nnblc, packetInterval, \
-            sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send):
-        super().__init__(sock_ip_receive_nnblc, sock_port_receive_nnblc, packetInterval, \
-            sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send)
-        self._transformMatrixTrackerIndicator = None
+    def processConnectTerminal(self):
+        self.engine.connect()
+        self.engine.poseCallback = self.utilVisCallBack
 
-    def setup(self):
-        super().setup()
-        self._jsondata = None
-        if not self._transformMatrixTrackerIndicator:
-            self._transformMatrixTrackerIndicator = vtk.vtkMatrix4x4()
+    def processDisconnectTerminal(self):
+        self.rigs.disconnect()
+        self.engine.disconnect()
+        self.engine.closeJournal()
+        self.engine.eventLoop().close()
 
-    def handleReceivedData(self):
+    def processConnectRigs(self, path):
         """
-        Override the parent class function
+        Connect the rigs of a rigs file next to this ControlRoom's own
+        connections, on an event loop thread shared by the rigs.
         """
-        func = self.utilMsgParse()
-        func()
+        self.rigs.load(path, self._parameterNode.GetParameter("TerminalIPPort"))
+        self.rigs.connect()
 
-    def utilMsgParse(self):
+    def processRestoreSession(self):
         """
+        Restore where the last session was from the trial journal tail.
         """
-        data = self._data_buff.decode("UTF-8")
-        if data.startswith("__msg_pose_"):
-            msg = data[11:]
-            num_str = msg.split("_")
-            self._buffvispose = []
-            for i in num_str:
-                self._buffvispose.append(float(i))
-            return self.utilVisCallBack
-        elif data == "test":
-            return self.utilTestCallBack
-        
-    def utilVisCallBack(self):
-        p = [self._buffvispose[0], self._buffvispose[1], 0]
-        setTranslation(p, self._transformMatrixTrackerIndicator)
-        self._parameterNode.GetNodeReference(
-            "TrackerIndicatorTr").SetMatrixTransformToParent(self._transformMatrixTrackerIndicator)
-        slicer.app.processEvents()
+        return self.engine.restoreFromJournal()
+
+    def utilVisCallBack(self, pose):
+        x, y = self.engine.calibration.livePoint(pose[0], pose[1])
+        setTranslation([x, y, 0], self._transformMatrixTrackerIndicator)
+        modelTransform = self._parameterNode.GetNodeReference("TrackerIndicatorTr")
+        if modelTransform:
+            modelTransform.SetMatrixTransformToParent(self._transformMatrixTrackerIndicator)
+            if not self.renderMode.requestRender():
+                slicer.app.processEvents()
+
+    def processAddSubject(self, acr):
+        try:
+            return self.engine.addSubject(acr)
+        except TimeoutError as e:
+            slicer.util.errorDisplay("Subject store busy: " + str(e))
+            return None
+
+    def processStartAnExp(self, timestamp):
+        try:
+            self.engine.startExperiment(timestamp)
+        except TimeoutError as e:
+            slicer.util.errorDisplay("Subject store busy: " + str(e))
+            return False
+        return True
+
+    def processRandSeq(self):
+        return protocol.randomSequence()
 
-    def utilTestCallBack(self):
+    def processSeqTextCheck(self, text):
+        try:
+            protocol.checkSequence(text)
+        except ValueError as e:
+            slicer.util.errorDisplay(str(e))
+            return
+        return True
+
+    def processFitCalibration(self, recordingDir, speed, fixation, onset, model):
         """
+        Fit the calibration of the current session from its VPC recordings
+        in recordingDir, as the candidate the operator accepts or not.
         """
-        print("test")
+        try:
+            return self.engine.fitCalibration([recordingDir], speed, fixation, onset, model=model)
+        except (ValueError, TimeoutError) as e:
+            slicer.util.errorDisplay("Calibration failed: " + str(e))
+            return None
+
+    def processApplySeq(self, text):
+        try:
+            return self.engine.applySequence(text, \
+                lambda: slicer.util.confirmYesNoDisplay("Override the previous sequence?"))
+        except (ValueError, TimeoutError) as e:
+            slicer.util.errorDisplay(str(e))
+            return None
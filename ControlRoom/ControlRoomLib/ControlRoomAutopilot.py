@@ -0,0 +1,173 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Session autopilot
+#
+
+import traceback
+from ControlRoomLib import ControlRoomProtocol as protocol
+
+
+class ControlRoomAutopilot():
+    """
+    Runs the applied sequence of an engine: when aktrack-screen reports
+    the end of a trial, the next one is armed right away (its commands
+    prepared, see ControlRoomEngine.armTrial) and started interval
+    seconds later.
+
+    state is "idle", "running" (a trial is on), "waiting" (between
+    trials), "paused", "done" or "failed" (a trial could not be started,
+    e.g. a component did not answer). pause() lets the running trial
+    finish and holds; the operator can meanwhile run or pick trials by
+    hand, resume() continues from the current trial index. startNext()
+    skips the rest of the wait.
+
+    Only a completed trial moves the trial index on. A trial that times
+    out or is stopped on the screen side pauses the autopilot on that
+    trial, so it is not run again until the operator resumes.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.state = "idle"
+        self.interval = 1.0
+        self.trialTimeout = None
+        self.stateCallback = None
+        self._remaining = None
+        self._generation = 0
+
+    def _setState(self, state):
+        self.state = state
+        if self.stateCallback:
+            self.stateCallback(state)
+
+    def start(self, interval=1.0, trials=None, trialTimeout=None):
+        """
+        Run trials from the current trial index, at most `trials` of them
+        (the rest of the sequence if None).
+        """
+        self.interval = max(interval, protocol.TRACKER_STOP_DELAY + 0.1)
+        self._remaining = trials
+        self.trialTimeout = trialTimeout
+        self.engine.trialStoppedCallback = self._onTrialStopped
+        self._startTrial()
+
+    def stop(self):
+        self._generation += 1
+        self._setState("idle")
+
+    def pause(self):
+        if self.state == "waiting":
+            self._generation += 1
+        if self.state in ("running", "waiting"):
+            self._setState("paused")
+
+    def resume(self):
+        if self.state != "paused":
+            return
+        if self.engine.parameter("RunningATrial") == "true":
+            # A trial started by hand meanwhile, go on after it
+            self._setState("running")
+        else:
+            self._startTrial()
+
+    def startNext(self):
+        """
+        Start the next trial now instead of after the interval.
+        """
+        if self.state == "waiting":
+            self._startTrial()
+
+    def _startTrial(self):
+        self._generation += 1
+        if self.engine.parameter("RunningATrial") == "true":
+            # Started by hand, take over once it ends
+            self._setState("running")
+            return
+        if self._remaining is not None and self._remaining <= 0:
+            self._setState("done")
+            return
+        try:
+            performed = self.engine.performCurrentTrial()
+        except Exception:
+            traceback.print_exc()
+            self._fail()
+            return
+        if not performed:
+            self._setState("done")
+            return
+        if self._remaining is not None:
+            self._remaining -= 1
+        self._setState("running")
+        if self.trialTimeout:
+            generation = self._generation
+            self.engine.eventLoop().callLater(self.trialTimeout, lambda: self._onTrialTimeout(generation))
+
+    def _fail(self):
+        print("[AKTRACK INFO] Autopilot failed at trial " + self.engine.parameter("CurTrial") + ".")
+        self._generation += 1
+        self._setState("failed")
+
+    def _onTrialTimeout(self, generation):
+        if generation == self._generation and self.state == "running":
+            print("[AKTRACK INFO] Trial " + self.engine.parameter("CurTrial") + \
+                " timed out, stopping and pausing.")
+            # Paused before the stop goes out, so its "trialstop" is not
+            # taken for a new trial end
+            self._generation += 1
+            self._setState("paused")
+            try:
+                self.engine.stopCurrentTrial()
+            except Exception:
+                traceback.print_exc()
+                self._fail()
+
+    def _onTrialStopped(self, trial, content):
+        if self.state != "running":
+            return
+        if content != "trialcomplete":
+            print("[AKTRACK INFO] Trial " + trial + " was stopped, pausing.")
+            self._generation += 1
+            self._setState("paused")
+            return
+        nextTrial = self.engine.parameter("CurTrial")
+        if self._remaining is not None and self._remaining <= 0 or \
+                not nextTrial or nextTrial == protocol.NONE_TRIAL:
+            self._setState("done")
+            return
+        # Arm the next trial while this one winds down
+        try:
+            self.engine.armTrial(nextTrial)
+        except Exception:
+            traceback.print_exc()
+            self._fail()
+            return
+        self._setState("waiting")
+        generation = self._generation
+        self.engine.eventLoop().callLater(self.interval, lambda: self._onIntervalElapsed(generation))
+
+    def _onIntervalElapsed(self, generation):
+        if generation == self._generation and self.state == "waiting":
+            self._startTrial()
@@ -0,0 +1,360 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Command line runner for scripted sessions and batch jobs, no Slicer needed:
+#   python -m ControlRoomLib.ControlRoomCli subjects
+#   python -m ControlRoomLib.ControlRoomCli run --subject TESTSUB1_21 --session 11152022151111 --trials 3
+# (run from the ControlRoom directory)
+# Modules needing numpy are imported by the commands using them, so the
+# sequence and capture commands run on the standard library only.
+#
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from ControlRoomLib import ControlRoomProtocol as protocol
+from ControlRoomLib.ControlRoomRigConfig import parseIPPort
+
+# Commands that do not touch the engine (nor the subject store)
+ENGINELESS_COMMANDS = ["random-sequence", "check-sequence", "convert-recording", "capture-info", "capture-play"]
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    "..", "Resources", "Configs", "")
+
+
+def cmdSubjects(engine, args):
+    for acr in engine.store.acronymList():
+        print(acr)
+
+
+def cmdAddSubject(engine, args):
+    print(engine.addSubject(args.acronym))
+
+
+def cmdRandomSequence(engine, args):
+    res = protocol.randomSequence()
+    print("\n".join(res[0] + res[1] + res[2]))
+
+
+def cmdCheckSequence(engine, args):
+    with open(args.file) as f:
+        text = f.read()
+    try:
+        protocol.checkSequence(text)
+    except ValueError as e:
+        print(str(e))
+        return 1
+    print("The sequence passes.")
+
+
+def cmdTrials(engine, args):
+    """
+    List trials across sessions, one recording path per line (with its
+    byte range, or JSON entries), e.g. to feed replay or batch analysis.
+    """
+    from ControlRoomLib.ControlRoomTrialIndex import ControlRoomTrialIndex
+    index = ControlRoomTrialIndex(engine.store, args.recordings)
+    subject = args.subject
+    if subject and "_" in subject:
+        subject = protocol.subjectNumFromAcr(subject)
+    if args.spans:
+        for path, offset, size in index.recordings(trial=args.trial, subject=subject, \
+                session=args.session, paradigm=args.paradigm):
+            print(path + " " + str(offset) + " " + str(size))
+        return
+    recorded = None if args.all else True
+    entries = index.query(trial=args.trial, subject=subject, session=args.session, \
+        paradigm=args.paradigm, recorded=recorded)
+    if args.json:
+        print(json.dumps([e._asdict() for e in entries], indent=2))
+        return
+    for e in entries:
+        print(e.path if e.path else "(not recorded) " + e.session + " " + e.subject + " " + \
+            str(e.index) + " " + e.trial)
+
+
+def cmdExport(engine, args):
+    """
+    Export sessions and their recordings to a columnar dataset, see
+    ControlRoomExport.
+    """
+    from ControlRoomLib.ControlRoomExport import ControlRoomExport
+    from ControlRoomLib.ControlRoomTrialIndex import ControlRoomTrialIndex
+    index = ControlRoomTrialIndex(engine.store, args.recordings)
+    subject = args.subject
+    if subject and "_" in subject:
+        subject = protocol.subjectNumFromAcr(subject)
+    try:
+        export = ControlRoomExport(index, args.output, args.format, args.chunk_rows, args.jobs)
+    except (ImportError, ValueError) as e:
+        print(str(e))
+        return 1
+    rows = export.run(force=args.force, trial=args.trial, subject=subject, session=args.session, \
+        paradigm=args.paradigm)
+    recorded = [r for r in rows if r["file"]]
+    print(args.output + ": " + str(len(rows)) + " trials, " + str(len(recorded)) + " recordings, " + \
+        str(sum(r["rows"] for r in recorded)) + " rows")
+
+
+def cmdCalibrate(engine, args):
+    """
+    Fit the tracker to board calibration of a session to its recorded VPC
+    trials, and store it with the session if --accept is given.
+    """
+    subject = protocol.subjectNumFromAcr(args.subject) if "_" in args.subject else args.subject
+    fixation = [float(v) for v in args.fixation.split(",")]
+    onset = [float(v) for v in args.onset.split(",")]
+    kwargs = {"mmPerDegree": args.mm_per_degree} if args.mm_per_degree else {}
+    try:
+        calibration = engine.fitCalibration(args.recordings, args.speed, fixation, \
+            onset[0] if len(onset) == 1 else onset, subject, args.session, args.model, skip=args.skip, **kwargs)
+        if args.accept:
+            engine.acceptCalibration()
+    except (ValueError, TimeoutError) as e:
+        print(str(e))
+        return 1
+    print(args.session + " of subject " + subject + ": " + calibration.report() + \
+        ("" if args.accept else " (not stored, --accept stores it)"))
+    print(json.dumps(calibration.matrix.tolist()))
+
+
+def cmdConvertRecording(engine, args):
+    from ControlRoomLib.UtilRecordArchive import UtilRecordArchive, csvToArchive
+    for path in args.files:
+        out = csvToArchive(path, chunkRows=args.chunk_rows)
+        archive = UtilRecordArchive(out)
+        print(out + ": " + str(archive.rows()) + " rows, " + str(archive.chunkCount()) + " chunks, " + \
+            "%.1fx smaller" % (os.path.getsize(path) / float(os.path.getsize(out))))
+
+
+def cmdHeatmap(engine, args):
+    """
+    Occupancy heatmap of the board over one or more recordings, saved as
+    a .npy array (rows along y, columns along x).
+    """
+    import numpy as np
+    from ControlRoomLib.UtilHeatmap import UtilHeatmap
+    from ControlRoomLib.UtilSceneAssets import stlBounds
+    extent = args.extent or stlBounds(engine.configPath() + "BoardModel.STL")[0:4]
+    heatmap = UtilHeatmap(extent, args.bin_size)
+    for path in args.files:
+        heatmap.addRecording(path, engine.recordingCalibration(path))
+    np.save(args.output, heatmap.counts)
+    iy, ix = np.unravel_index(np.argmax(heatmap.counts), heatmap.shape)
+    print(args.output + ": " + str(heatmap.total) + " samples, " + str(heatmap.outside) + \
+        " off the board, densest bin at x=%.0f y=%.0f mm" % (heatmap.extent[0] + (ix + 0.5) * heatmap.binSize, \
+        heatmap.extent[2] + (iy + 0.5) * heatmap.binSize))
+
+
+def cmdRun(engine, args):
+    """
+    Run trials of an applied session one after the other on the
+    autopilot, each one until aktrack-screen reports its end (or the
+    trial timeout), interval seconds apart.
+    """
+    from ControlRoomLib.ControlRoomAutopilot import ControlRoomAutopilot
+    try:
+        engine.openSession(args.subject, args.session, args.start_index)
+    except ValueError as e:
+        print(str(e))
+        return 1
+    if args.ip_port:
+        with open(args.ip_port) as f:
+            engine.setTerminalIPPort(f.read())
+    engine.useGoggles = not args.no_goggles
+    engine.setHeartbeatLinks(args.heartbeat)
+    engine.connect()
+    if args.tracker_shm:
+        engine.setTrackerSharedMemory(args.tracker_shm)
+    if args.capture:
+        engine.startCapture(args.capture)
+    loop = engine.eventLoop()
+    autopilot = ControlRoomAutopilot(engine)
+    autopilot.stateCallback = lambda state: state == "running" and \
+        print("[AKTRACK INFO] Trial " + engine.parameter("CurTrial") + " started.")
+    try:
+        autopilot.start(args.interval, args.trials, args.trial_timeout)
+        loop.run(until=lambda: autopilot.state not in ("running", "waiting"))
+        # Let the delayed end-of-trial notifications go out
+        loop.run(protocol.TRACKER_STOP_DELAY + 0.1)
+    finally:
+        engine.disconnect()
+    print("[AKTRACK INFO] Next trial: " + engine.parameter("CurTrial") + \
+        " (index " + engine.parameter("TrialIndex") + ")")
+    if autopilot.state != "done":
+        return 1
+
+
+def cmdCaptureInfo(engine, args):
+    from ControlRoomLib.UtilCapture import UtilCapture
+    capture = UtilCapture(args.file)
+    for name, s in capture.summary().items():
+        duration = s["t_last"] - s["t_first"]
+        print("%s: %d datagrams, %d bytes, %.1f s, %.0f/s" % (name, s["datagrams"], s["bytes"], \
+            duration, s["datagrams"] / duration if duration > 0 else 0.0))
+
+
+def cmdCapturePlay(engine, args):
+    """
+    Re-send a capture to the local sockets it was received on (or
+    --target), e.g. into a running ControlRoom, at --speed times the
+    captured rate or as fast as possible (--speed 0).
+    """
+    from ControlRoomLib.UtilCapture import UtilCapture, UtilCapturePlayer
+    targets = {}
+    for t in args.target:
+        name, address = t.split("=", 1)
+        targets[name] = parseIPPort(address)
+    player = UtilCapturePlayer(UtilCapture(args.file), args.speed or None, args.channel or None, targets)
+    res = player.play()
+    print("Sent %d datagrams in %.3f s, max lag %.3f ms" % (res["sent"], res["duration"], res["max_lag"] * 1000.0))
+
+
+def cmdRunRigs(engine, args):
+    """
+    Run sessions on several rigs at once, each assigned as
+    rig=ACR_<num>:<session>[:<start index>], printing the status of every
+    rig side by side every status-interval seconds.
+    """
+    from ControlRoomLib.ControlRoomRigs import ControlRoomRigs
+    rigs = ControlRoomRigs(engine.configPath(), engine.store, args.thread_per_rig)
+    rigs.load(args.rigs)
+    try:
+        rigs.connect()
+        for assignment in args.assign:
+            name, session = assignment.split("=", 1)
+            fields = session.split(":")
+            rigs.rig(name).runSession(fields[0], fields[1], int(fields[2]) if len(fields) > 2 else 0, \
+                args.trials, args.interval, args.trial_timeout)
+        while rigs.isRunning():
+            rigs.wait(args.status_interval)
+            print(rigs.summary())
+        # Let the delayed end-of-trial notifications go out
+        time.sleep(protocol.TRACKER_STOP_DELAY + 0.1)
+    finally:
+        rigs.disconnect()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless ControlRoom")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH, \
+        help="directory holding SubjectConfig.json")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("subjects", help="list subjects")
+    p = sub.add_parser("add-subject", help="add a subject")
+    p.add_argument("acronym")
+    sub.add_parser("random-sequence", help="print a random session sequence")
+    p = sub.add_parser("check-sequence", help="validate a sequence file")
+    p.add_argument("file")
+    p = sub.add_parser("run-rigs", help="run sessions on several rigs concurrently")
+    p.add_argument("--rigs", required=True, help="rigs file (JSON)")
+    p.add_argument("--thread-per-rig", action="store_true", \
+        help="run each rig on its own thread, so a silent component holds up its rig only")
+    p.add_argument("--assign", action="append", required=True, \
+        help="rig=ACR_<num>:<session>[:<start index>] (repeatable)")
+    p.add_argument("--trials", type=int, default=1, help="trials per rig")
+    p.add_argument("--interval", type=float, default=1.0, help="seconds between trials")
+    p.add_argument("--trial-timeout", type=float, default=300.0, help="seconds")
+    p.add_argument("--status-interval", type=float, default=5.0, help="seconds")
+    p = sub.add_parser("trials", help="query trials and their recordings across sessions")
+    p.add_argument("--recordings", action="append", default=[], help="recording directory (repeatable)")
+    p.add_argument("--trial", help="e.g. VPM-12-L")
+    p.add_argument("--subject", help="subject number or ACR_<num>")
+    p.add_argument("--session", help="session datetime")
+    p.add_argument("--paradigm", choices=["VPB", "VPC", "VPM"])
+    p.add_argument("--all", action="store_true", help="include trials without a recording")
+    p.add_argument("--spans", action="store_true", help="print the byte offset and size of each trial's rows")
+    p.add_argument("--json", action="store_true")
+    p = sub.add_parser("export", help="export sessions and recordings to Parquet or HDF5")
+    p.add_argument("--recordings", action="append", default=[], help="recording directory (repeatable)")
+    p.add_argument("--output", required=True, help="dataset directory")
+    p.add_argument("--format", default="parquet", help="parquet or hdf5")
+    p.add_argument("--jobs", type=int, help="parallel sessions, all cores by default")
+    p.add_argument("--chunk-rows", type=int, default=65536, help="rows per row group / chunk")
+    p.add_argument("--force", action="store_true", help="rewrite recordings exported before")
+    p.add_argument("--trial", help="e.g. VPM-12-L")
+    p.add_argument("--subject", help="subject number or ACR_<num>")
+    p.add_argument("--session", help="session datetime")
+    p.add_argument("--paradigm", choices=["VPB", "VPC", "VPM"])
+    p = sub.add_parser("calibrate", help="fit a session's tracker to board calibration to its VPC trials")
+    p.add_argument("--recordings", action="append", default=[], help="recording directory (repeatable)")
+    p.add_argument("--subject", required=True, help="subject number or ACR_<num>")
+    p.add_argument("--session", required=True, help="session datetime")
+    p.add_argument("--model", default="affine", help="affine or homography")
+    p.add_argument("--speed", type=float, required=True, help="VPC dot speed (deg/s) set on aktrack-screen")
+    p.add_argument("--fixation", required=True, help="x,y of the VPC start point on the board (mm)")
+    p.add_argument("--onset", required=True, \
+        help="seconds from the first recorded sample to the dot leaving fixation, one for all trials or one per" \
+        " recorded VPC trial in session order (a,b,...)")
+    p.add_argument("--mm-per-degree", type=float, help="board mm per degree of visual angle (1 m viewing distance)")
+    p.add_argument("--skip", type=float, default=0.5, help="seconds of pursuit onset left out of each trial")
+    p.add_argument("--accept", action="store_true", help="store the fit with the session")
+    p = sub.add_parser("convert-recording", help="convert recorded CSV files to archives (.akrec)")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--chunk-rows", type=int, default=4096)
+    p = sub.add_parser("heatmap", help="board occupancy heatmap of recordings (.npy)")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--bin-size", type=float, default=5.0, help="mm")
+    p.add_argument("--output", default="heatmap.npy")
+    p.add_argument("--extent", type=float, nargs=4, metavar=("XMIN", "XMAX", "YMIN", "YMAX"), \
+        help="board area (mm), the BoardModel.STL bounds of the config directory by default")
+    p = sub.add_parser("run", help="run trials of an applied session")
+    p.add_argument("--subject", required=True, help="ACR_<num>")
+    p.add_argument("--session", required=True, help="session datetime")
+    p.add_argument("--start-index", type=int, default=0)
+    p.add_argument("--trials", type=int, default=1)
+    p.add_argument("--interval", type=float, default=1.0, help="seconds between trials")
+    p.add_argument("--trial-timeout", type=float, default=300.0, help="seconds")
+    p.add_argument("--ip-port", help="file with the ip:port lines (eight, or nine with the goggle stream)")
+    p.add_argument("--no-goggles", action="store_true")
+    p.add_argument("--tracker-shm", help="take tracker poses from this shared memory ring")
+    p.add_argument("--heartbeat", action="append", default=[], choices=["screen", "tracker", "goggle"], \
+        help="send heartbeats on this link, whose peer answers them (repeatable)")
+    p.add_argument("--capture", help="record all received datagrams to this file (.akcap)")
+    p = sub.add_parser("capture-info", help="channels and rates of a capture file")
+    p.add_argument("file")
+    p = sub.add_parser("capture-play", help="re-send a capture to the local sockets")
+    p.add_argument("file")
+    p.add_argument("--speed", type=float, default=1.0, help="times the captured rate, 0 for as fast as possible")
+    p.add_argument("--channel", action="append", default=[], help="e.g. tracker.stream (repeatable), all by default")
+    p.add_argument("--target", action="append", default=[], help="<channel>=ip:port (repeatable)")
+    args = parser.parse_args(argv)
+
+    config = args.config if args.config.endswith(os.sep) else args.config + os.sep
+    engine = None
+    if args.command not in ENGINELESS_COMMANDS:
+        from ControlRoomLib.ControlRoomEngine import ControlRoomEngine
+        engine = ControlRoomEngine(config)
+    return {"subjects": cmdSubjects, "add-subject": cmdAddSubject, \
+        "random-sequence": cmdRandomSequence, "check-sequence": cmdCheckSequence, \
+        "trials": cmdTrials, "export": cmdExport, "calibrate": cmdCalibrate, "convert-recording": cmdConvertRecording, "heatmap": cmdHeatmap, "run": cmdRun, \
+        "run-rigs": cmdRunRigs, "capture-info": cmdCaptureInfo, "capture-play": cmdCapturePlay}[args.command](engine, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Component connections (aktrack-screen, aktrack-ros, goggle service)
+#
+
+import json
+from ControlRoomLib.UtilConnectionsWtNnBlcRcv import UtilConnectionsWtNnBlcRcv
+from ControlRoomLib.UtilMessages import parsePoseMsg, parseGazeMsg
+from ControlRoomLib.UtilMetrics import metrics
+from ControlRoomLib.UtilReceivePolicy import UtilReceivePolicyLatest, UtilReceivePolicyQueued
+from ControlRoomLib.UtilRingBuffer import UtilRingBuffer
+
+
+class ControlRoomConnectionsScreenDot(UtilConnectionsWtNnBlcRcv):
+    """
+    aktrack-screen. Receives trialStop events, which are handed to
+    trialStoppedCallback(content) ("trialcomplete" or "trialstop").
+    """
+
+    metricsName = "screen"
+
+    def __init__(self, sock_ip_receive_nnblc, sock_port_receive_nnblc, \
+            sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send):
+        # Trial stop events must never be lost
+        super().__init__(sock_ip_receive_nnblc, sock_port_receive_nnblc, \
+            sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send, \
+            receivePolicy=UtilReceivePolicyQueued())
+        self.trialStoppedCallback = None
+
+    def setup(self):
+        super().setup()
+        self._jsondata = None
+
+    def handleReceivedData(self):
+        """
+        Override the parent class function
+        """
+        func = self.utilMsgParse()
+        if func:
+            func()
+
+    @metrics.timed("screen.utilMsgParse")
+    def utilMsgParse(self):
+        """
+        """
+        data = self._data_buff.decode("UTF-8")
+        self._jsondata = json.loads(data)
+        if self._jsondata["commandtype"] == "test":
+            return self.utilTestCallBack
+        elif self._jsondata["commandtype"] == "trialStop":
+            return self.utilTrialStopped
+
+    def utilTestCallBack(self):
+        """
+        """
+        print("test")
+
+    def utilTrialStopped(self):
+        print("Trial stopped")
+        if self.trialStoppedCallback:
+            self.trialStoppedCallback(self._jsondata["commandcontent"])
+
+
+class ControlRoomConnectionsTracker(UtilConnectionsWtNnBlcRcv):
+    """
+    aktrack-ros. Receives the tracker pose stream. The newest decoded
+    pose of each drain is handed to poseCallback(pose) (latest wins);
+    posesCallback(poses), if set, gets all of them.
+    """
+
+    metricsName = "tracker"
+
+    def __init__(self, sock_ip_receive_nnblc, sock_port_receive_nnblc, \
+            sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send):
+        # Only the newest pose matters for display
+        super().__init__(sock_ip_receive_nnblc, sock_port_receive_nnblc, \
+            sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send, \
+            receivePolicy=UtilReceivePolicyLatest())
+        self._buffvispose = None
+        self.poseCallback = None
+        self.posesCallback = None
+        self.datagramsCallback = self._onDatagrams
+
+    def setup(self):
+        super().setup()
+        self._jsondata = None
+
+    def _onDatagrams(self, datagrams):
+        if not self.posesCallback:
+            return
+        poses = [pose for pose in (parsePoseMsg(d.decode("UTF-8")) for d in datagrams) if pose is not None]
+        if poses:
+            self.posesCallback(poses)
+
+    def handleReceivedData(self):
+        """
+        Override the parent class function
+        """
+        func = self.utilMsgParse()
+        if func:
+            func()
+
+    @metrics.timed("tracker.utilMsgParse")
+    def utilMsgParse(self):
+        """
+        """
+        data = self._data_buff.decode("UTF-8")
+        pose = parsePoseMsg(data)
+        if pose is not None:
+            self._buffvispose = pose
+            return self.utilVisCallBack
+        elif data == "test":
+            return self.utilTestCallBack
+
+    @metrics.timed("tracker.utilVisCallBack")
+    def utilVisCallBack(self):
+        if self.poseCallback:
+            self.poseCallback(self._buffvispose)
+
+    def utilTestCallBack(self):
+        """
+        """
+        print("test")
+
+
+class ControlRoomConnectionsGoggle(UtilConnectionsWtNnBlcRcv):
+    """
+    Goggle service. Commands ('1'-'4') go over the blocking pair as
+    before; gaze samples stream in on the non-blocking socket as
+    "__msg_gaze_<t>_<x>_<y>..." datagrams, (t, x, y) per sample with x, y
+    on the board plane, and are kept in a bounded ring buffer.
+    """
+
+    metricsName = "goggle"
+
+    def __init__(self, sock_ip_receive_nnblc, sock_port_receive_nnblc, \
+            sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send, capacity=30000):
+        # Every sample goes to the buffer; a large kernel buffer absorbs GUI stalls
+        super().__init__(sock_ip_receive_nnblc, sock_port_receive_nnblc, \
+            sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send, \
+            receivePolicy=UtilReceivePolicyQueued(), rcvBufSize=1048576)
+        self.gazeBuffer = UtilRingBuffer(capacity, 3)
+        self.gazeCallback = None
+
+    @metrics.timed("goggle.handleReceivedData")
+    def handleReceivedData(self):
+        """
+        Override the parent class function
+        """
+        samples = parseGazeMsg(self._data_buff)
+        if samples is None:
+            return
+        if len(samples) == 3:
+            self.gazeBuffer.append(samples)
+        else:
+            self.gazeBuffer.extend(samples)
+        if self.gazeCallback:
+            self.gazeCallback(samples)
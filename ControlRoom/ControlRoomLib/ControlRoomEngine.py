@@ -0,0 +1,749 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Headless ControlRoom engine
+#
+
+import time
+import numpy as np
+
+from ControlRoomLib import ControlRoomProtocol as protocol
+from ControlRoomLib.ControlRoomConnections import ControlRoomConnectionsScreenDot, ControlRoomConnectionsTracker, \
+    ControlRoomConnectionsGoggle
+from ControlRoomLib.ControlRoomRigConfig import ControlRoomRigConfig
+from ControlRoomLib.ControlRoomSubjectStore import ControlRoomSubjectStore
+from ControlRoomLib.ControlRoomTrialIndex import ControlRoomTrialIndex, parseRecordingName
+from ControlRoomLib.UtilCalibration import UtilCalibration, fitCalibration
+from ControlRoomLib.UtilCapture import UtilCaptureWriter
+from ControlRoomLib.UtilConnections import UtilConnections, utilSendCommands
+from ControlRoomLib.UtilHealthMonitor import UtilHealthMonitor
+from ControlRoomLib.UtilMetrics import metrics
+from ControlRoomLib.UtilPoseFilter import makePoseFilter
+from ControlRoomLib.UtilRecordArchive import recordingBlocks
+from ControlRoomLib.UtilSharedRing import UtilSharedRingReader
+from ControlRoomLib.UtilTimeline import UtilTimeline
+from ControlRoomLib.UtilTrialJournal import UtilTrialJournal
+
+# Session state written to the trial journal with every transition
+JOURNAL_STATE = ["SubjectAcr", "ExperimentTimeStamp", "TrialIndex", "CurTrial", "PrevTrial", "RunningATrial"]
+
+# Heartbeat of each link, sent only to the links listed in the parameter
+# "HeartbeatLinks" (comma separated), whose peers implement it
+HEARTBEATS = {"screen": '{"commandtype": "heartbeat", "commandcontent": ""}', \
+    "tracker": "heartbeat_xxxxxx;", "goggle": "0"}
+
+DEFAULT_TERMINAL_IP_PORT = \
+    "127.0.0.1:8753\n127.0.0.1:8769\n127.0.0.1:8757\n10.17.101.48:8057\n0.0.0.0:8059\n0.0.0.0:8083\n127.0.0.1:8297\n127.0.0.1:8293\n0.0.0.0:8299"
+
+
+class ControlRoomParameters():
+    """
+    Dictionary backed stand-in for the MRML parameter node, used when
+    the engine runs outside Slicer. Same GetParameter/SetParameter API.
+    """
+
+    def __init__(self, values=None):
+        self._values = dict(values) if values else {}
+
+    def GetParameter(self, name):
+        return self._values.get(name, "")
+
+    def SetParameter(self, name, value):
+        self._values[name] = value
+
+    def GetParameterNames(self):
+        return list(self._values.keys())
+
+
+class ControlRoomEngine():
+    """
+    Session, protocol and connection logic, independent of the GUI.
+
+    State lives in a parameter store: the MRML parameter node inside
+    Slicer, ControlRoomParameters otherwise. The event loop is a
+    UtilEventLoopQt on the GUI and a UtilEventLoopSelector headless.
+    """
+
+    def __init__(self, configPath, parameterNode=None, eventLoop=None, store=None):
+        self._configPath = configPath
+        self._parameterNode = parameterNode if parameterNode is not None else ControlRoomParameters()
+        self._eventLoop = eventLoop
+        self.store = store if store is not None else ControlRoomSubjectStore(configPath + "SubjectConfig.json")
+        self.useGoggles = True
+        self._connections_screendot = None
+        self._connections_tracker = None
+        self._connections_goggle = None
+        self._healthMonitor = None
+        self._healthInterval = 1.0
+        self._journal = None
+        self._journalSyncPending = False
+        self._armed = None
+        self._capture = None
+        self._trackerRing = None
+        self._trackerRingCursor = 0
+        self._trackerRingPolling = False
+        # Polled at display rate; a ring with no new row for
+        # _trackerRingStall seconds is checked and UDP taken meanwhile
+        self._trackerRingInterval = 0.016
+        self._trackerRingStall = 0.5
+        self._trackerRingAdvanced = 0.0
+        # Tracker to board mapping of the current session (live poses), and
+        # a fitted one awaiting the operator, (subject, session, calibration)
+        self.calibration = UtilCalibration()
+        self.calibrationCandidate = None
+        self.poseCallback = None
+        self.trialStoppedCallback = None
+        # linkStatusCallback(summary, changed) on every health monitor tick
+        self.linkStatusCallback = None
+        self._poseFilter = None
+        self.timeline = UtilTimeline()
+        self.timeline.addStream("tracker", 2)
+        self.timeline.addStream("gaze", 2)
+        self.timeline.addStream("screen", 1, capacity=4096)
+        self.timeline.addStream("goggle", 1, capacity=4096)
+        self.setDefaultParameters(self._parameterNode)
+        self._poseFilter = makePoseFilter(self._parameterNode.GetParameter("PoseFilter"))
+
+    def setDefaultParameters(self, parameterNode):
+        """
+        Initialize parameter node with default settings.
+        """
+        if not parameterNode.GetParameter("RunningATrial"):
+            parameterNode.SetParameter("RunningATrial", "false")
+        if not parameterNode.GetParameter("Visualization"):
+            parameterNode.SetParameter("Visualization", "false")
+        if not parameterNode.GetParameter("TerminalIPPort"):
+            parameterNode.SetParameter("TerminalIPPort", DEFAULT_TERMINAL_IP_PORT)
+        if not parameterNode.GetParameter("CurTrial"):
+            parameterNode.SetParameter("CurTrial", protocol.NONE_TRIAL)
+        if not parameterNode.GetParameter("PrevTrial"):
+            parameterNode.SetParameter("PrevTrial", protocol.NONE_TRIAL)
+        if not parameterNode.GetParameter("PoseFilter"):
+            parameterNode.SetParameter("PoseFilter", "none")
+
+    def configPath(self):
+        return self._configPath
+
+    def parameter(self, name):
+        return self._parameterNode.GetParameter(name)
+
+    def setTerminalIPPort(self, text):
+        """
+        ip:port lines of the connections (see DEFAULT_TERMINAL_IP_PORT),
+        used from the next connect on.
+        """
+        self._parameterNode.SetParameter("TerminalIPPort", text)
+
+    def setParameterNode(self, parameterNode):
+        self._parameterNode = parameterNode
+        self.setDefaultParameters(parameterNode)
+        self._poseFilter = makePoseFilter(parameterNode.GetParameter("PoseFilter"))
+
+    def eventLoop(self):
+        if not self._eventLoop:
+            from ControlRoomLib.UtilEventLoop import UtilEventLoopSelector
+            self._eventLoop = UtilEventLoopSelector()
+        return self._eventLoop
+
+    #
+    # Connections
+    #
+
+    def connect(self):
+        """
+        Create the screen, tracker and goggle connections from the
+        "TerminalIPPort" parameter (see ControlRoomRigConfig) and start
+        monitoring them. Existing connections are kept.
+        """
+        config = ControlRoomRigConfig.fromTerminalIPPort("", self._parameterNode.GetParameter("TerminalIPPort"))
+        eventLoop = self.eventLoop()
+
+        # Screen dot connections
+        if not self._connections_screendot:
+            self._connections_screendot = ControlRoomConnectionsScreenDot(*config.endpoint("screen", "stream"), \
+                *config.endpoint("screen", "receive"), *config.endpoint("screen", "send"))
+            self._connections_screendot.setup()
+            self._connections_screendot._flag_receiving_nnblc = True
+            self._connections_screendot.registerEventLoop(eventLoop)
+            self._connections_screendot.trialStoppedCallback = self.onTrialStopped
+
+        # Tracker connections
+        if not self._connections_tracker:
+            self._connections_tracker = ControlRoomConnectionsTracker(*config.endpoint("tracker", "stream"), \
+                *config.endpoint("tracker", "receive"), *config.endpoint("tracker", "send"))
+            self._connections_tracker.setup()
+            self._connections_tracker._flag_receiving_nnblc = True
+            self._connections_tracker.registerEventLoop(eventLoop)
+            self._connections_tracker.poseCallback = self.onPose
+            self._connections_tracker.posesCallback = self.onTrackerPoses
+
+        # Goggle connections
+        if not self._connections_goggle:
+            if config.endpoint("goggle", "stream"):
+                self._connections_goggle = ControlRoomConnectionsGoggle(*config.endpoint("goggle", "stream"), \
+                    *config.endpoint("goggle", "receive"), *config.endpoint("goggle", "send"))
+                self._connections_goggle._flag_receiving_nnblc = True
+                self._connections_goggle.gazeCallback = self.onGaze
+            else:
+                self._connections_goggle = UtilConnections(*config.endpoint("goggle", "receive"), \
+                    *config.endpoint("goggle", "send"))
+            self._connections_goggle._receiveTimeout = 15
+            self._connections_goggle.setup()
+            self._connections_goggle.registerEventLoop(eventLoop)
+
+        if self._capture:
+            self._setCapture(self._capture)
+
+        # Poses from a co-located tracker through shared memory
+        if self._parameterNode.GetParameter("TrackerSharedMemory") and not self._trackerRingPolling:
+            self._trackerRingPolling = True
+            eventLoop.callLater(self._trackerRingInterval, self._pollTrackerRing)
+
+        # Link health (RTT, and heartbeats and reconnect where enabled)
+        if not self._healthMonitor:
+            self._healthMonitor = UtilHealthMonitor(eventLoop, self._healthInterval)
+            self._healthMonitor.statusCallback = self._onLinkStatus
+            heartbeats = self.heartbeatLinks()
+            for name, conn in (("screen", self._connections_screendot), \
+                    ("tracker", self._connections_tracker), ("goggle", self._connections_goggle)):
+                self._healthMonitor.addLink(name, conn, HEARTBEATS[name] if name in heartbeats else None)
+            eventLoop.callLater(self._healthInterval, self._healthTick)
+
+    def _onLinkStatus(self, summary, changed):
+        if self.linkStatusCallback:
+            self.linkStatusCallback(summary, changed)
+
+    def healthLinks(self):
+        """
+        UtilLinkHealth of each link while connected, else empty.
+        """
+        return self._healthMonitor.links() if self._healthMonitor else []
+
+    def receiveStats(self):
+        """
+        {link name: received / handled / dropped counters} of the stream
+        sockets while connected.
+        """
+        return {name: conn.receiveStats() for name, conn in (("screen", self._connections_screendot), \
+            ("tracker", self._connections_tracker), ("goggle", self._connections_goggle)) if conn}
+
+    def heartbeatLinks(self):
+        return [name for name in self._parameterNode.GetParameter("HeartbeatLinks").split(",") if name]
+
+    def setHeartbeatLinks(self, names):
+        """
+        Send heartbeats to the links names (of HEARTBEATS) from the next
+        connect on. Only enable a link whose peer answers heartbeats.
+        """
+        for name in names:
+            if name not in HEARTBEATS:
+                raise ValueError("Unknown link " + name)
+        self._parameterNode.SetParameter("HeartbeatLinks", ",".join(names))
+
+    def _healthTick(self):
+        if self._healthMonitor:
+            self._healthMonitor.tick()
+            self.eventLoop().callLater(self._healthInterval, self._healthTick)
+
+    def setPoseFilter(self, name):
+        """
+        Select the live pose filter, one of UtilPoseFilter.POSE_FILTERS.
+        """
+        self._poseFilter = makePoseFilter(name)
+        self._parameterNode.SetParameter("PoseFilter", name)
+
+    def onTrackerPoses(self, poses):
+        """
+        Every tracker pose of a UDP drain, stamped (raw) on the timeline,
+        so its tracker history is at the full stream rate.
+        """
+        t = time.monotonic()
+        self.timeline.stream("tracker").extend(np.full(len(poses), t), np.array([p[:2] for p in poses]))
+
+    def onPose(self, pose):
+        """
+        Newest tracker pose of a UDP drain (latest wins): handed, filtered,
+        to poseCallback (the GUI indicator). The timeline gets every pose
+        through onTrackerPoses.
+        """
+        t = time.monotonic()
+        if self._poseFilter:
+            pose = self._poseFilter.update(t, pose)
+        if self.poseCallback:
+            self.poseCallback(pose)
+
+    def setTrackerSharedMemory(self, name):
+        """
+        Take tracker poses from the shared memory ring name (see
+        UtilSharedRing) instead of the UDP stream, "" for UDP. Commands
+        go over UDP either way.
+        """
+        self._parameterNode.SetParameter("TrackerSharedMemory", name)
+        if name and self._connections_tracker and not self._trackerRingPolling:
+            self._trackerRingPolling = True
+            self.eventLoop().callLater(self._trackerRingInterval, self._pollTrackerRing)
+
+    def _pollTrackerRing(self):
+        """
+        Hand over the poses published since the last poll. Attaches to the
+        ring once the producer has created it. While attached and rows come
+        in, UDP poses are drained and dropped. When no row came for
+        _trackerRingStall seconds, a removed or replaced segment is left
+        (and the new one attached once there), a stalled one is kept but
+        poses are taken from UDP until its rows come again.
+        """
+        name = self._parameterNode.GetParameter("TrackerSharedMemory")
+        if not name or not self._connections_tracker:
+            self._closeTrackerRing()
+            self._trackerRingPolling = False
+            return
+        if self._trackerRing is None or self._trackerRing.name != name:
+            self._closeTrackerRing()
+            try:
+                self._trackerRing = UtilSharedRingReader(name)
+            except (FileNotFoundError, ValueError):
+                self._trackerRing = None
+            if self._trackerRing:
+                self._trackerRingCursor = self._trackerRing.written
+                self._trackerRingAdvanced = time.monotonic()
+                self._connections_tracker._flag_receiving_nnblc = False
+                print("[AKTRACK INFO] Tracker poses from shared memory " + name + ".")
+        else:
+            first, rows = self._trackerRing.read(self._trackerRingCursor)
+            now = time.monotonic()
+            if rows.shape[0]:
+                self._trackerRingCursor = first + rows.shape[0]
+                self._trackerRingAdvanced = now
+                if self._connections_tracker._flag_receiving_nnblc:
+                    print("[AKTRACK INFO] Tracker poses from shared memory " + name + " again.")
+                    self._connections_tracker._flag_receiving_nnblc = False
+                self.onPoses(rows)
+            elif now - self._trackerRingAdvanced > self._trackerRingStall:
+                # Checked again one stall period later
+                self._trackerRingAdvanced = now
+                if not self._trackerRing.isCurrent():
+                    print("[AKTRACK INFO] Shared memory " + name + " was removed or replaced, " \
+                        "tracker poses from UDP until it is back.")
+                    self._closeTrackerRing()
+                elif not self._connections_tracker._flag_receiving_nnblc:
+                    print("[AKTRACK INFO] Shared memory " + name + " stalled, tracker poses from UDP.")
+                    self._connections_tracker._flag_receiving_nnblc = True
+        self.eventLoop().callLater(self._trackerRingInterval, self._pollTrackerRing)
+
+    def _closeTrackerRing(self):
+        if self._trackerRing:
+            self._trackerRing.close()
+            self._trackerRing = None
+            if self._connections_tracker:
+                self._connections_tracker._flag_receiving_nnblc = True
+
+    def onPoses(self, rows):
+        """
+        Several poses at once (shared memory): all are stamped on the
+        timeline, the newest goes on as in onPose.
+        """
+        t = time.monotonic()
+        self.timeline.stream("tracker").extend(np.full(rows.shape[0], t), rows[:, :2])
+        pose = rows[-1]
+        if self._poseFilter:
+            pose = self._poseFilter.update(t, pose)
+        if self.poseCallback:
+            self.poseCallback(pose)
+
+    def onGaze(self, samples):
+        """
+        Gaze samples received, (t, x, y) flat. The last sample is stamped
+        with the receive time, earlier ones keep their goggle-clock offsets.
+        Stamps are clamped so they never go back (receive jitter between
+        datagrams, a goggle clock reset): the timeline lookups need them
+        sorted.
+        """
+        samples = np.asarray(samples).reshape(-1, 3)
+        now = time.monotonic()
+        stream = self.timeline.stream("gaze")
+        t = now - (samples[-1, 0] - samples[:, 0])
+        if stream.written:
+            t = np.maximum(t, stream.tail(1)[0][0])
+        stream.extend(np.maximum.accumulate(t), samples[:, 1:])
+
+    def gazeBuffer(self):
+        """
+        Ring buffer of (t, x, y) gaze samples, None without a gaze stream.
+        """
+        return getattr(self._connections_goggle, "gazeBuffer", None)
+
+    def startCapture(self, path):
+        """
+        Record every datagram received on every connection, with its
+        arrival time, to a capture file (see UtilCapture). Connections
+        made later are captured as well, until stopCapture().
+        """
+        self.stopCapture()
+        self._capture = UtilCaptureWriter(path)
+        self._setCapture(self._capture)
+        print("[AKTRACK INFO] Capturing to " + path + ".")
+
+    def stopCapture(self):
+        """
+        Stop capturing, returns the number of datagrams captured.
+        """
+        if not self._capture:
+            return 0
+        self._setCapture(None)
+        self._capture.close()
+        n = self._capture.records
+        print("[AKTRACK INFO] Captured " + str(n) + " datagrams to " + self._capture.path + ".")
+        self._capture = None
+        return n
+
+    def isCapturing(self):
+        return self._capture is not None
+
+    def _setCapture(self, writer):
+        for name, conn in (("screen", self._connections_screendot), ("tracker", self._connections_tracker), \
+                ("goggle", self._connections_goggle)):
+            if conn:
+                conn.setCapture(writer, name)
+
+    def disconnect(self):
+        self.stopCapture()
+        self._closeTrackerRing()
+        if self._healthMonitor:
+            self._healthMonitor.clear()
+            self._healthMonitor = None
+        for conn in (self._connections_screendot, self._connections_tracker, self._connections_goggle):
+            if conn:
+                conn.clear()
+        self._connections_screendot = None
+        self._connections_tracker = None
+        self._connections_goggle = None
+
+    #
+    # Trial journal
+    #
+
+    def openJournal(self, path):
+        self._journal = UtilTrialJournal(path)
+        self._journal.open()
+
+    def closeJournal(self):
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+    def journalEvent(self, event, trial=""):
+        if not self._journal:
+            return
+        state = {name: self._parameterNode.GetParameter(name) for name in JOURNAL_STATE}
+        state["Trial"] = trial
+        self._journal.append(event, state)
+        if not self._journalSyncPending:
+            # fsync whatever the batch left pending once things calm down
+            self._journalSyncPending = True
+            self.eventLoop().callLater(self._journal.fsyncInterval, self._journalSync)
+
+    def _journalSync(self):
+        self._journalSyncPending = False
+        if self._journal:
+            self._journal.sync()
+
+    def restoreFromJournal(self):
+        """
+        Restore the session state of the last journal record (subject,
+        session, sequence, trial position). A trial that was running is
+        restored as not running. Returns the record, or None.
+        """
+        if not self._journal:
+            return None
+        record = self._journal.last()
+        if not record or not record.get("SubjectAcr") or not record.get("ExperimentTimeStamp"):
+            return None
+        subjectNum = protocol.subjectNumFromAcr(record["SubjectAcr"])
+        if subjectNum not in self.store.subjects():
+            return None
+        seq = self.store.sequence(subjectNum, record["ExperimentTimeStamp"])
+        for name in JOURNAL_STATE:
+            self._parameterNode.SetParameter(name, record.get(name, ""))
+        self._parameterNode.SetParameter("RunningATrial", "false")
+        if seq:
+            self._parameterNode.SetParameter("SessionSeq", "\n".join(seq))
+        self.loadCalibration()
+        if record["event"] == "start":
+            print("[AKTRACK INFO] Trial " + record.get("Trial", "") + " was running when the session ended.")
+        print("[AKTRACK INFO] Restored session " + record["ExperimentTimeStamp"] + " of " + \
+            record["SubjectAcr"] + " at trial " + record.get("CurTrial", ""))
+        return record
+
+    #
+    # Subjects and sessions
+    #
+
+    def openSession(self, subjectAcr, timestamp, startIndex=0):
+        """
+        Make an applied session current, at position startIndex of its
+        sequence. Raises ValueError if it has no applied sequence.
+        """
+        seq = self.store.sequence(protocol.subjectNumFromAcr(subjectAcr), timestamp)
+        if not seq:
+            raise ValueError("Session " + timestamp + " has no applied sequence.")
+        self._parameterNode.SetParameter("SubjectAcr", subjectAcr)
+        self._parameterNode.SetParameter("ExperimentTimeStamp", timestamp)
+        self._parameterNode.SetParameter("SessionSeq", "\n".join(seq))
+        self.setTrialIndex(startIndex)
+        self.loadCalibration()
+        return seq
+
+    def subjectNum(self):
+        return protocol.subjectNumFromAcr(self._parameterNode.GetParameter("SubjectAcr"))
+
+    def addSubject(self, acr):
+        return self.store.addSubject(acr)
+
+    def startExperiment(self, timestamp):
+        self.store.startExperiment(self.subjectNum(), timestamp)
+        self._parameterNode.SetParameter("ExperimentTimeStamp", timestamp)
+        self.loadCalibration()
+
+    def sessionCalibration(self, subjectNum, timestamp):
+        """
+        Stored calibration of a session, the uncalibrated mapping if none.
+        """
+        return UtilCalibration.fromDict(self.store.calibration(subjectNum, timestamp))
+
+    def recordingCalibration(self, path):
+        """
+        Calibration of the session a recording file belongs to (by its
+        name), the uncalibrated mapping if unknown.
+        """
+        parsed = parseRecordingName(path)
+        if not parsed:
+            return UtilCalibration()
+        return self.sessionCalibration(parsed[1], parsed[0])
+
+    def loadCalibration(self):
+        """
+        Map live poses with the calibration of the current session.
+        """
+        acr = self._parameterNode.GetParameter("SubjectAcr")
+        timestamp = self._parameterNode.GetParameter("ExperimentTimeStamp")
+        if acr and timestamp:
+            self.calibration = self.sessionCalibration(protocol.subjectNumFromAcr(acr), timestamp)
+        else:
+            self.calibration = UtilCalibration()
+        return self.calibration
+
+    def fitCalibration(self, recordingDirs, speed, fixation, onset, subjectNum=None, timestamp=None, \
+            model="affine", **kwargs):
+        """
+        Fit a calibration to the recorded VPC trials of a session (the
+        current one by default), given the stimulus speed, fixation and
+        onset (see UtilCalibration.fitCalibration, also for kwargs). The
+        fit is kept as the candidate: it maps nothing until accepted with
+        acceptCalibration(). Returns it.
+        Raises ValueError if the trials do not allow a fit.
+        """
+        subjectNum = subjectNum or self.subjectNum()
+        timestamp = timestamp or self._parameterNode.GetParameter("ExperimentTimeStamp")
+        index = ControlRoomTrialIndex(self.store, recordingDirs)
+        trials = [(e.trial, np.concatenate(list(recordingBlocks(e.path)))) for e in \
+            index.query(subject=subjectNum, session=timestamp, paradigm="VPC", recorded=True)]
+        calibration = fitCalibration(trials, speed, fixation, onset, model, **kwargs)
+        self.calibrationCandidate = (subjectNum, timestamp, calibration)
+        return calibration
+
+    def acceptCalibration(self):
+        """
+        Store the candidate calibration with its session, where it maps
+        live poses, replays and heatmaps from then on. Returns it.
+        Raises ValueError if there is none.
+        """
+        if not self.calibrationCandidate:
+            raise ValueError("No fitted calibration to accept.")
+        subjectNum, timestamp, calibration = self.calibrationCandidate
+        self.store.setCalibration(subjectNum, timestamp, calibration.toDict())
+        self.calibrationCandidate = None
+        self.loadCalibration()
+        return calibration
+
+    def discardCalibration(self):
+        self.calibrationCandidate = None
+
+    def applySequence(self, text, confirmOverride=None):
+        """
+        Save text as the sequence of the current session and rewind to its
+        first trial. If the session already has a sequence, confirmOverride()
+        decides whether it is replaced. Returns the sequence or None.
+        Raises ValueError if the sequence does not pass the check.
+        """
+        exp = protocol.checkSequence(text)
+        timestamp = self._parameterNode.GetParameter("ExperimentTimeStamp")
+        if not timestamp:
+            return None
+        if self.store.sequence(self.subjectNum(), timestamp) is not None:
+            if confirmOverride and not confirmOverride():
+                return None
+        self.store.setSequence(self.subjectNum(), timestamp, exp)
+        self._parameterNode.SetParameter("CurTrial", exp[0])
+        self._parameterNode.SetParameter("PrevTrial", protocol.NONE_TRIAL)
+        self._parameterNode.SetParameter("TrialIndex", "0")
+        self.journalEvent("apply")
+        return exp
+
+    def setTrialIndex(self, index):
+        """
+        Point PrevTrial/CurTrial at position index of the applied sequence.
+        """
+        sessionSeq = protocol.paddedSequence(self._parameterNode.GetParameter("SessionSeq"))
+        self._parameterNode.SetParameter("TrialIndex", str(index))
+        self._parameterNode.SetParameter("PrevTrial", sessionSeq[index])
+        self._parameterNode.SetParameter("CurTrial", sessionSeq[index+1])
+
+    #
+    # Trials
+    #
+
+    def _armKey(self, trial):
+        return (trial, self._parameterNode.GetParameter("ExperimentTimeStamp"), \
+            self._parameterNode.GetParameter("SubjectAcr"), self.useGoggles)
+
+    def _trialStartCommands(self, trial):
+        commands = []
+        # aktrack-matlab module
+        goggleCommand = protocol.goggleStartCommand(trial)
+        if self.useGoggles and goggleCommand:
+            commands.append((self._connections_goggle, self._connections_goggle.prepareCommand(goggleCommand)))
+        # aktrack-ros module
+        commands.append((self._connections_tracker, self._connections_tracker.prepareCommand( \
+            protocol.trackerStartCommand(self._parameterNode.GetParameter("ExperimentTimeStamp"), \
+            self.subjectNum(), trial))))
+        # aktrack-screen module
+        commands.append((self._connections_screendot, self._connections_screendot.prepareCommand( \
+            protocol.screenTrialCommand(trial))))
+        return commands
+
+    def armTrial(self, trial):
+        """
+        Prepare the start commands of trial ahead of time, so startTrial()
+        only puts them on the wire. Dropped if the session or the goggle
+        setting changes meanwhile.
+        """
+        self._armed = (self._armKey(trial), self._trialStartCommands(trial))
+
+    @metrics.timed("engine.startTrial")
+    def startTrial(self, trial):
+        """
+        Notify the goggle, aktrack-ros and aktrack-screen modules that
+        trial starts. The commands are sent back to back, then the
+        responses collected.
+        """
+        armed, self._armed = self._armed, None
+        if armed and armed[0] == self._armKey(trial):
+            commands = armed[1]
+        else:
+            commands = self._trialStartCommands(trial)
+        utilSendCommands(commands)
+        goggleCommand = protocol.goggleStartCommand(trial)
+        if self.useGoggles and goggleCommand:
+            self.timeline.ingestEvent("goggle", goggleCommand)
+        self.timeline.ingestEvent("screen", trial)
+        self._parameterNode.SetParameter("RunningATrial", "true")
+
+    def performCurrentTrial(self):
+        trial = self._parameterNode.GetParameter("CurTrial")
+        if not trial or trial == protocol.NONE_TRIAL:
+            return False
+        self.startTrial(trial)
+        self.journalEvent("start", trial)
+        return True
+
+    def performPreviousTrial(self):
+        trial = self._parameterNode.GetParameter("PrevTrial")
+        if not trial or trial == protocol.NONE_TRIAL:
+            return False
+        self.startTrial(trial)
+        self.setTrialIndex(int(self._parameterNode.GetParameter("TrialIndex"))-1)
+        self.journalEvent("start", trial)
+        return True
+
+    def performTargetTrial(self, index):
+        """
+        Run the trial at position index of the applied sequence.
+        """
+        trial = self._parameterNode.GetParameter("TargetTrial")
+        if not trial:
+            return False
+        self.startTrial(trial)
+        self.setTrialIndex(index)
+        self.journalEvent("start", trial)
+        return True
+
+    def stopCurrentTrial(self):
+        # Notify aktrack-screen module
+        self._connections_screendot.utilSendCommand(protocol.screenStopCommand())
+        # Notify aktrack-ros module (delay notifying to account for subject reaction time)
+        self.eventLoop().callLater(protocol.TRACKER_STOP_DELAY, self.notifyEndTrialROS)
+        # Notify aktrack-matlab module
+        self.notifyEndTrialGoggle()
+
+    def notifyEndTrialROS(self):
+        self._connections_tracker.utilSendCommand(protocol.TRACKER_STOP_TRIAL)
+
+    def notifyEndTrialGoggle(self):
+        goggleCommand = protocol.goggleStopCommand(self._parameterNode.GetParameter("CurTrial"))
+        if self.useGoggles and goggleCommand:
+            print("sending end command (" + self._parameterNode.GetParameter("CurTrial") + ") ...")
+            self._connections_goggle.utilSendCommand(goggleCommand)
+            self.timeline.ingestEvent("goggle", goggleCommand)
+
+    def onTrialStopped(self, content):
+        """
+        aktrack-screen reported the end of the trial, either completed
+        ("trialcomplete") or stopped by the operator ("trialstop").
+        """
+        trial = self._parameterNode.GetParameter("CurTrial")
+        self.timeline.ingestEvent("screen", content)
+        self._parameterNode.SetParameter("RunningATrial", "false")
+        # Notify aktrack-ros module (delay notifying to account for subject reaction time)
+        self.eventLoop().callLater(protocol.TRACKER_STOP_DELAY, self.notifyEndTrialROS)
+        # Notify aktrack-matlab module
+        self.notifyEndTrialGoggle()
+        if content == "trialcomplete":
+            self.setTrialIndex(int(self._parameterNode.GetParameter("TrialIndex"))+1)
+            self.journalEvent("complete", trial)
+        else:
+            self.journalEvent("stop", trial)
+        if self.trialStoppedCallback:
+            self.trialStoppedCallback(trial, content)
+
+    def startVisualization(self):
+        if self._poseFilter:
+            self._poseFilter.reset()
+        self.loadCalibration()
+        self._connections_tracker.utilSendCommand(protocol.TRACKER_START_VIS)
+        self._parameterNode.SetParameter("Visualization", "true")
+
+    def stopVisualization(self):
+        self._connections_tracker.utilSendCommand(protocol.TRACKER_STOP_VIS)
+        self._parameterNode.SetParameter("Visualization", "false")
@@ -0,0 +1,282 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Columnar export of sessions and recordings (Parquet or HDF5)
+#
+# Layout under the output directory (hive-style partitions):
+#   trials<ext>   one row per trial of every exported session: the
+#                 SubjectConfig.json fields, the source recording and its
+#                 exported file, rows, t_min, t_max
+#   recordings/subject=<num>/session=<datetime>/trial=<trial>/<index><ext>
+#                 one file per recorded trial, one column per recorded
+#                 field (t, x, y, c3, ...), written in row groups (Parquet)
+#                 or chunks (HDF5) of chunkRows, compressed
+# pyarrow (Parquet) or h5py (HDF5) is needed, only for the chosen format.
+#
+
+import collections
+import concurrent.futures
+import os
+import numpy as np
+
+from ControlRoomLib.UtilRecordArchive import recordingBlocks
+
+EXPORT_FORMATS = ["parquet", "hdf5"]
+
+TRIAL_COLUMNS = ["subject", "acronym", "session", "index", "trial", "paradigm", \
+    "source", "file", "rows", "t_min", "t_max"]
+
+
+def recordingColumns(n):
+    """
+    Names of the columns of a recording with n fields.
+    """
+    return ["t", "x", "y"][:n] + ["c" + str(i) for i in range(3, n)]
+
+
+class _ParquetTrialWriter():
+    """
+    One Parquet file, a row group per written block, zstd compressed.
+    """
+
+    ext = ".parquet"
+
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self._schema = pa.schema([(c, pa.float64()) for c in columns])
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+
+    def write(self, block):
+        self._writer.write_table(self._pa.Table.from_arrays( \
+            [block[:, i] for i in range(block.shape[1])], schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+    @staticmethod
+    def summary(path):
+        """
+        (rows, t_min, t_max) of an exported recording, from its footer.
+        """
+        import pyarrow.parquet as pq
+        meta = pq.ParquetFile(path).metadata
+        t = [meta.row_group(i).column(0).statistics for i in range(meta.num_row_groups)]
+        if not t:
+            return 0, float("nan"), float("nan")
+        return meta.num_rows, min(s.min for s in t), max(s.max for s in t)
+
+    @staticmethod
+    def writeTable(path, table):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.table(table), path, compression="zstd")
+
+
+class _Hdf5TrialWriter():
+    """
+    One HDF5 file, a resizable dataset per column, gzip compressed in
+    chunks of the written block size.
+    """
+
+    ext = ".h5"
+
+    def __init__(self, path, columns):
+        import h5py
+        self._file = h5py.File(path, "w")
+        self._columns = columns
+        self._rows = 0
+        self._tMin = self._tMax = float("nan")
+
+    def write(self, block):
+        n = block.shape[0]
+        for i, c in enumerate(self._columns):
+            if c not in self._file:
+                self._file.create_dataset(c, shape=(0,), maxshape=(None,), dtype="f8", \
+                    chunks=(n,), compression="gzip", shuffle=True)
+            d = self._file[c]
+            d.resize((self._rows + n,))
+            d[self._rows:] = block[:, i]
+        if self._rows == 0:
+            self._tMin = block[0, 0]
+        self._tMax = block[-1, 0]
+        self._rows += n
+
+    def close(self):
+        self._file.attrs["rows"] = self._rows
+        self._file.attrs["t_min"] = self._tMin
+        self._file.attrs["t_max"] = self._tMax
+        self._file.close()
+
+    @staticmethod
+    def summary(path):
+        import h5py
+        with h5py.File(path, "r") as f:
+            return int(f.attrs["rows"]), float(f.attrs["t_min"]), float(f.attrs["t_max"])
+
+    @staticmethod
+    def writeTable(path, table):
+        import h5py
+        with h5py.File(path, "w") as f:
+            for c, values in table.items():
+                if values and isinstance(values[0], str):
+                    f.create_dataset(c, data=values, dtype=h5py.string_dtype())
+                else:
+                    f.create_dataset(c, data=np.asarray(values))
+
+
+_WRITERS = {"parquet": _ParquetTrialWriter, "hdf5": _Hdf5TrialWriter}
+
+
+def checkExportFormat(fmt):
+    """
+    Raise (ImportError, ValueError) unless fmt can be written here.
+    """
+    if fmt not in _WRITERS:
+        raise ValueError("Unknown export format " + str(fmt))
+    if fmt == "parquet":
+        import pyarrow.parquet
+    else:
+        import h5py
+
+
+def trialExportPath(outDir, entry, fmt):
+    return os.path.join(outDir, "recordings", "subject=" + entry.subject, "session=" + entry.session, \
+        "trial=" + entry.trial, str(entry.index) + _WRITERS[fmt].ext)
+
+
+def exportTrial(entry, outDir, fmt, chunkRows=65536, force=False):
+    """
+    Export the recording of one trial entry, streaming it in blocks of
+    chunkRows rows. Skipped if the exported file is newer than the
+    recording unless force. Returns the entry's row of the trials table.
+    """
+    writerClass = _WRITERS[fmt]
+    path = trialExportPath(outDir, entry, fmt)
+    row = entry._asdict()
+    row.update(source=entry.path, file=os.path.relpath(path, outDir))
+    if force or not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(entry.path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = path + ".part"
+        writer, pending, pendingRows = None, [], 0
+        try:
+            for block in recordingBlocks(entry.path):
+                pending.append(block)
+                pendingRows += block.shape[0]
+                if pendingRows >= chunkRows:
+                    if writer is None:
+                        writer = writerClass(partial, recordingColumns(block.shape[1]))
+                    writer.write(np.concatenate(pending))
+                    pending, pendingRows = [], 0
+            if pending:
+                if writer is None:
+                    writer = writerClass(partial, recordingColumns(pending[0].shape[1]))
+                writer.write(np.concatenate(pending))
+            if writer is None:
+                raise ValueError(entry.path + " is empty")
+            writer, finished = None, writer
+            finished.close()
+            os.replace(partial, path)
+        finally:
+            # On failure: close the writer and leave no partial file behind
+            try:
+                if writer is not None:
+                    writer.close()
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+    row["rows"], row["t_min"], row["t_max"] = writerClass.summary(path)
+    return row
+
+
+def exportSession(entries, outDir, fmt, chunkRows=65536, force=False):
+    """
+    Rows of the trials table for the entries of one session, exporting
+    the recorded ones. A recording that cannot be read is reported and
+    left out of the export.
+    """
+    rows = []
+    for entry in entries:
+        row = None
+        if entry.path is not None:
+            try:
+                row = exportTrial(entry, outDir, fmt, chunkRows, force)
+            except Exception as e:
+                print("[AKTRACK INFO] Export of " + entry.path + " failed: " + str(e))
+        if row is None:
+            row = entry._asdict()
+            row.update(source=entry.path or "", file="", rows=0, t_min=float("nan"), t_max=float("nan"))
+        rows.append(row)
+    return rows
+
+
+class ControlRoomExport():
+    """
+    Exports the sessions of a trial index to a columnar dataset, one
+    session per task, sessions running in parallel worker processes
+    (jobs, all cores by default; 1 runs in this process). Recordings are
+    streamed chunkRows rows at a time, so memory stays bounded whatever
+    their length, and only recordings changed since the last export are
+    rewritten. The trials table is rewritten on every run.
+    """
+
+    def __init__(self, index, outDir, fmt="parquet", chunkRows=65536, jobs=None):
+        checkExportFormat(fmt)
+        self._index = index
+        self.outDir = outDir
+        self.fmt = fmt
+        self.chunkRows = chunkRows
+        self.jobs = jobs
+
+    def sessions(self, **kwargs):
+        """
+        {(subject, session): [entry, ...]} of the entries matching
+        index.query(**kwargs).
+        """
+        res = collections.OrderedDict()
+        for entry in self._index.query(**kwargs):
+            res.setdefault((entry.subject, entry.session), []).append(entry)
+        return res
+
+    def run(self, force=False, **kwargs):
+        """
+        Export the sessions matching index.query(**kwargs). Returns the
+        rows of the written trials table.
+        """
+        sessions = list(self.sessions(**kwargs).values())
+        os.makedirs(self.outDir, exist_ok=True)
+        if self.jobs == 1 or len(sessions) <= 1:
+            results = [exportSession(s, self.outDir, self.fmt, self.chunkRows, force) for s in sessions]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(self.jobs) as pool:
+                results = list(pool.map(exportSession, sessions, [self.outDir] * len(sessions), \
+                    [self.fmt] * len(sessions), [self.chunkRows] * len(sessions), [force] * len(sessions)))
+        rows = [row for res in results for row in res]
+        table = {c: [row[c] for row in rows] for c in TRIAL_COLUMNS}
+        path = os.path.join(self.outDir, "trials" + _WRITERS[self.fmt].ext)
+        _WRITERS[self.fmt].writeTable(path + ".part", table)
+        os.replace(path + ".part", path)
+        return rows
@@ -0,0 +1,153 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Experiment protocol: sequences and component commands
+#
+
+import json
+import random
+
+# Trials every valid session contains; 14 of them are performed twice
+TRIALS = ['VPM-2-L', 'VPM-2-U', 'VPM-2-R', 'VPM-2-D', \
+    'VPM-4-L', 'VPM-4-U', 'VPM-4-R', 'VPM-4-D', \
+    'VPM-12-U', 'VPM-12-R', 'VPM-12-L', 'VPM-12-D', \
+    'VPM-6-U', 'VPM-6-L', 'VPM-6-D', 'VPM-6-R', \
+    'VPM-18-U', 'VPM-18-R', 'VPM-18-D', 'VPM-18-L', \
+    'VPM-8-D', 'VPM-8-L', 'VPM-8-R', 'VPM-8-U', \
+    'VPC-U', 'VPC-D', 'VPC-R', 'VPC-L', \
+    'VPB-hfixed', 'VPB-hfree']
+REPEATED_TRIALS = 14
+
+NONE_TRIAL = "__NONE__"
+
+TRACKER_STOP_TRIAL = "stop_trialxxxxxx" + ";"
+TRACKER_START_VIS = "start_visualizat" + ";"
+TRACKER_STOP_VIS = "stop_visualizati" + ";"
+
+# aktrack-ros is told a trial ended this long after the screen (seconds),
+# to account for subject reaction time
+TRACKER_STOP_DELAY = 0.5
+
+
+def randomSequence():
+    """
+    Random session order, see orders.png. Returns the three paradigm
+    blocks (VPB, VPC, VPM) in random order.
+    """
+    vpb = ["VPB-hfree", "VPB-hfixed"]
+    random.shuffle(vpb)
+
+    vpc = ["VPC-L", "VPC-R", "VPC-U", "VPC-D"]
+    vpc.extend(random.sample(vpc, 2))
+    random.shuffle(vpc)
+
+    # vpm = ["VPM-2", "VPM-4", "VPM-6", "VPM-8", "VPM-12", "VPM-24"]
+    vpm = ["VPM-2", "VPM-4", "VPM-6", "VPM-8", "VPM-12", "VPM-18"]
+    random.shuffle(vpm)
+    def randDir(sess):
+        arr = [sess+"-L", sess+"-R", sess+"-U", sess+"-D"]
+        arr.extend(random.sample(arr, 2))
+        random.shuffle(arr)
+        return arr
+    tempvpm = []
+    for i in range(len(vpm)):
+        tempvpm.extend(randDir(vpm[i]))
+    vpm = tempvpm
+
+    res = [vpb, vpc, vpm]
+    random.shuffle(res)
+    return res
+
+
+def checkSequence(text):
+    """
+    Validate a session sequence (one trial per line). Returns the list of
+    trials, raises ValueError with the reason if it does not pass.
+    """
+    res = text.strip().split("\n")
+    seq = list(res)
+    saved = list(TRIALS)
+    saved_poped = []
+    if len(res) != len(saved) + REPEATED_TRIALS:
+        raise ValueError("The sequence does not pass! Number of trials is not valid")
+    while res:
+        i = res.pop(0)
+        if i not in saved and i not in saved_poped:
+            raise ValueError("The sequence does not pass: A trial is not valid")
+        if i not in saved and i in saved_poped:
+            saved_poped.remove(i)
+        if i in saved and i not in saved_poped:
+            saved.remove(i)
+            saved_poped.append(i)
+        if i in saved and i in saved_poped:
+            raise ValueError("The sequence does not pass: A trial repeated 3 times")
+    if len(saved) != 0:
+        raise ValueError("The sequence does not pass: A trial is not performed")
+    return seq
+
+
+def paddedSequence(sessionSeq):
+    """
+    Applied sequence text to the list indexed by TrialIndex
+    (PrevTrial is [TrialIndex], CurTrial is [TrialIndex+1]).
+    """
+    return [NONE_TRIAL] + sessionSeq.strip().split("\n") + [NONE_TRIAL]
+
+
+def goggleStartCommand(trial):
+    """
+    Goggle command starting a trial, None if the goggles are not involved.
+    """
+    return {"VPB-hfixed": '1', "VPB-hfree": '2'}.get(trial)
+
+
+def goggleStopCommand(trial):
+    return {"VPB-hfixed": '3', "VPB-hfree": '4'}.get(trial)
+
+
+def trackerStartCommand(timestamp, subjectNum, trial):
+    return "start_trialxxxxx" + "_" + timestamp + "_" + subjectNum + "_" + trial + ";"
+
+
+def screenTrialCommand(trial):
+    return json.dumps({"commandtype":"trialcommand", "commandcontent":trial})
+
+
+def screenStopCommand():
+    return json.dumps({"commandtype":"trialstopcommand", "commandcontent":""})
+
+
+def subjectNumFromAcr(subjectAcr):
+    """
+    "ACR_21" -> "21"
+    """
+    return subjectAcr.rsplit("_", 1)[1]
+
+
+def paradigmOf(trial):
+    """
+    "VPM-12-L" -> "VPM"
+    """
+    return trial.split("-", 1)[0]
@@ -0,0 +1,138 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Rig endpoint configuration
+#
+
+import json
+
+# Components of a rig and, per component, its endpoints: where commands
+# are sent ("send"), where replies come back ("receive") and where
+# unsolicited datagrams arrive ("stream": screen events, tracker poses,
+# goggle gaze; optional for the goggle)
+COMPONENTS = ["screen", "tracker", "goggle"]
+ENDPOINTS = ["send", "receive", "stream"]
+
+
+def parseIPPort(text):
+    """
+    "ip:port" -> (ip, port), ValueError if malformed.
+    """
+    try:
+        ip, port = text.strip().rsplit(":", 1)
+        port = int(port)
+    except (AttributeError, ValueError):
+        raise ValueError("Invalid ip:port: " + repr(text))
+    if not ip or not 0 < port < 65536:
+        raise ValueError("Invalid ip:port: " + repr(text))
+    return ip, port
+
+
+class ControlRoomRigConfig():
+    """
+    Endpoints of one rig (a screen, a tracker and a goggle service),
+    component -> endpoint -> (ip, port).
+    """
+
+    def __init__(self, name, endpoints, useGoggles=True):
+        self.name = name
+        self.useGoggles = useGoggles
+        self._endpoints = {}
+        for c in COMPONENTS:
+            if c not in endpoints:
+                raise ValueError("Rig " + name + ": no " + c + " endpoints")
+            for e in ENDPOINTS:
+                value = endpoints[c].get(e)
+                if value is None:
+                    if c == "goggle" and e == "stream":
+                        continue
+                    raise ValueError("Rig " + name + ": no " + c + " " + e + " endpoint")
+                self._endpoints[(c, e)] = parseIPPort(value) if isinstance(value, str) else tuple(value)
+
+    def endpoint(self, component, endpoint):
+        """
+        (ip, port), None for a missing optional endpoint.
+        """
+        return self._endpoints.get((component, endpoint))
+
+    def localEndpoints(self):
+        """
+        Endpoints this side binds to.
+        """
+        return [v for (c, e), v in self._endpoints.items() if e != "send"]
+
+    @classmethod
+    def fromTerminalIPPort(cls, name, text, useGoggles=True):
+        """
+        From the "TerminalIPPort" parameter: send, receive and stream lines
+        of the screen, then the tracker, then send and receive of the
+        goggle, optionally its stream.
+        """
+        lines = [i for i in text.strip().split("\n") if i.strip()]
+        if len(lines) < 8:
+            raise ValueError("Expected at least 8 ip:port lines, got " + str(len(lines)))
+        endpoints = {"screen": dict(zip(ENDPOINTS, lines[0:3])), \
+            "tracker": dict(zip(ENDPOINTS, lines[3:6])), "goggle": dict(zip(ENDPOINTS, lines[6:9]))}
+        return cls(name, endpoints, useGoggles)
+
+    def terminalIPPort(self):
+        return "\n".join("%s:%d" % self._endpoints[(c, e)] \
+            for c in COMPONENTS for e in ENDPOINTS if (c, e) in self._endpoints)
+
+    @classmethod
+    def fromDict(cls, d):
+        return cls(d["name"], d, d.get("useGoggles", True))
+
+    def toDict(self):
+        d = {"name": self.name, "useGoggles": self.useGoggles}
+        for (c, e), v in self._endpoints.items():
+            d.setdefault(c, {})[e] = "%s:%d" % v
+        return d
+
+
+def loadRigConfigs(path, reserved=None):
+    """
+    Rig configurations of a rigs file, {"rigs": [{"name": ..., "screen":
+    {"send": "ip:port", "receive": ..., "stream": ...}, "tracker": ...,
+    "goggle": ..., "useGoggles": true}, ...]}. reserved is the config of
+    the station's own connections (see fromTerminalIPPort), whose local
+    ports no rig may use. Raises ValueError on duplicate names or local
+    ports used twice.
+    """
+    with open(path) as f:
+        configs = [ControlRoomRigConfig.fromDict(d) for d in json.load(f)["rigs"]]
+    names, ports = set(), {}
+    if reserved is not None:
+        for ip, port in reserved.localEndpoints():
+            ports[port] = reserved.name
+    for config in configs:
+        if config.name in names:
+            raise ValueError("Duplicate rig name: " + config.name)
+        names.add(config.name)
+        for ip, port in config.localEndpoints():
+            if port in ports:
+                raise ValueError("Port " + str(port) + " used by " + ports[port] + " and rig " + config.name)
+            ports[port] = "rig " + config.name
+    return configs
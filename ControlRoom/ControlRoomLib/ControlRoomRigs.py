@@ -0,0 +1,177 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Several rigs driven from one ControlRoom
+#
+
+import time
+from ControlRoomLib.ControlRoomAutopilot import ControlRoomAutopilot
+from ControlRoomLib.ControlRoomEngine import ControlRoomEngine, ControlRoomParameters
+from ControlRoomLib.ControlRoomRigConfig import ControlRoomRigConfig, loadRigConfigs
+from ControlRoomLib.ControlRoomSubjectStore import ControlRoomSubjectStore
+from ControlRoomLib.UtilEventLoop import UtilEventLoopThread
+
+
+class ControlRoomRig():
+    """
+    One rig: an engine with its own parameters and trial journal, on the
+    shared subject store, dispatched on eventLoop (a started
+    UtilEventLoopThread, shared with other rigs), or on an event loop
+    thread of its own if none is given. The engine is only touched on
+    that thread, the methods below hand over to it.
+    """
+
+    def __init__(self, config, configPath, store, eventLoop=None):
+        self.name = config.name
+        self.config = config
+        self._ownLoop = eventLoop is None
+        self.eventLoop = UtilEventLoopThread("rig-" + config.name) if self._ownLoop else eventLoop
+        self.engine = ControlRoomEngine(configPath, \
+            ControlRoomParameters({"TerminalIPPort": config.terminalIPPort()}), self.eventLoop, store)
+        self.engine.useGoggles = config.useGoggles
+        self.engine.openJournal(configPath + "TrialJournal-" + config.name + ".log")
+        self.autopilot = ControlRoomAutopilot(self.engine)
+        self._starting = False
+        if self._ownLoop:
+            self.eventLoop.start()
+
+    def connect(self):
+        self.eventLoop.call(self.engine.connect)
+
+    def runSession(self, subjectAcr, session, startIndex=0, trials=1, interval=1.0, trialTimeout=300.0):
+        """
+        Perform trials of an applied session from startIndex, interval
+        seconds apart. Raises ValueError if the session has no sequence;
+        the trials are started without waiting on them.
+        """
+        self.eventLoop.call(self.engine.openSession, subjectAcr, session, startIndex)
+        self._starting = True
+        def start():
+            self._starting = False
+            self.autopilot.start(interval, trials, trialTimeout)
+        self.eventLoop.callSoon(start)
+
+    def stop(self):
+        """
+        Stop after the running trial.
+        """
+        self.eventLoop.callSoon(self.autopilot.stop)
+
+    def disconnect(self):
+        """
+        Stop and disconnect, ending the rig's thread if it has its own.
+        """
+        def close():
+            self.autopilot.stop()
+            self.engine.disconnect()
+            self.engine.closeJournal()
+        self.eventLoop.call(close)
+        if self._ownLoop:
+            self.eventLoop.close()
+
+    def isRunning(self):
+        return self._starting or self.autopilot.state in ("running", "waiting", "paused")
+
+    def summary(self):
+        engine = self.engine
+        line = "%s: %s, %s %s, trial %s (index %s)" % (self.name, self.autopilot.state, \
+            engine.parameter("SubjectAcr") or "-", engine.parameter("ExperimentTimeStamp") or "-", \
+            engine.parameter("CurTrial"), engine.parameter("TrialIndex") or "-")
+        if engine.healthLinks():
+            line += "\n  " + "; ".join(link.summary() for link in engine.healthLinks())
+        return line
+
+
+class ControlRoomRigs():
+    """
+    The rigs of a rigs file (see loadRigConfigs), on one subject store.
+    By default all rigs share one event loop thread: one selector waits
+    on every rig's sockets and timers, so a rig adds its sockets and no
+    thread. Commands wait for their response on that thread, though, so
+    a component that stops answering holds up every rig for up to its
+    receive timeout (0.5 s) per command. threadPerRig=True gives each
+    rig a loop thread of its own instead, isolating the rigs at the cost
+    of a thread and a wake-up socket pair per rig (see the rigs scenario
+    of ControlRoomBenchmark).
+    """
+
+    def __init__(self, configPath, store=None, threadPerRig=False):
+        self._configPath = configPath
+        self.store = store if store is not None else ControlRoomSubjectStore(configPath + "SubjectConfig.json")
+        self.threadPerRig = threadPerRig
+        self.eventLoop = None
+        self.rigs = []
+
+    def load(self, path, terminalIPPort=None):
+        """
+        Replace the rigs with those of the rigs file. terminalIPPort is
+        the station's own "TerminalIPPort", whose local ports the rigs
+        must not use. Raises ValueError on a bad or clashing rigs file.
+        """
+        reserved = ControlRoomRigConfig.fromTerminalIPPort("the station", terminalIPPort) \
+            if terminalIPPort else None
+        configs = loadRigConfigs(path, reserved)
+        self.disconnect()
+        if not self.threadPerRig:
+            self.eventLoop = UtilEventLoopThread("rigs")
+            self.eventLoop.start()
+        self.rigs = [ControlRoomRig(config, self._configPath, self.store, self.eventLoop) \
+            for config in configs]
+
+    def rig(self, name):
+        for rig in self.rigs:
+            if rig.name == name:
+                return rig
+        raise KeyError("No rig named " + name)
+
+    def connect(self):
+        for rig in self.rigs:
+            rig.connect()
+
+    def disconnect(self):
+        for rig in self.rigs:
+            rig.disconnect()
+        self.rigs = []
+        if self.eventLoop:
+            self.eventLoop.close()
+            self.eventLoop = None
+
+    def isRunning(self):
+        return any(rig.isRunning() for rig in self.rigs)
+
+    def wait(self, timeout):
+        """
+        Wait until no rig is running or timeout seconds elapsed.
+        Returns True if none is running.
+        """
+        deadline = time.monotonic() + timeout
+        while self.isRunning():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def summary(self):
+        return "\n".join(rig.summary() for rig in self.rigs)
@@ -0,0 +1,286 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Subject store (SubjectConfig.json)
+#
+
+import json
+import os
+import threading
+from ControlRoomLib.UtilFileLock import UtilFileLock
+
+
+class ControlRoomSubjectStore():
+    """
+    Subjects and their experiment sessions, as kept in SubjectConfig.json:
+    {"<num>": {"acronym": ..., "experiments": [{"datetime": ..., "sequence": [...]}]}}
+    A session may also hold its "calibration" (see UtilCalibration).
+
+    Several stations may share the file (e.g. on network storage). Each
+    change is a record-level update made under an exclusive lock
+    (SubjectConfig.json.lock), applied to the latest content, so no
+    station overwrites another's edits. A change is appended to the
+    change log (SubjectConfig.json.changes, one JSON line with the
+    subject's new record) rather than rewriting the file, and refresh()
+    reads the log from where this store left off: both cost the size of
+    the changed records, not of the store. Once the log outgrows a
+    fraction of the file, a change folds it into the file (compact()).
+    Until then SubjectConfig.json alone is behind: read it through this
+    class. Rigs running on their own threads share one store, so reads
+    and changes are also serialized in process.
+    """
+
+    def __init__(self, path, lockTimeout=10.0, compactSize=65536):
+        self._path = path
+        self._logPath = path + ".changes"
+        self._lock = UtilFileLock(path + ".lock", lockTimeout)
+        self._threadLock = threading.RLock()
+        self._compactSize = compactSize
+        self._stamp = None
+        self._logStamp = None
+        self._logOffset = 0
+        self._subjectConfig = {}
+        # Subjects other stations changed since the last refresh(), and
+        # a count of all the changes seen
+        self._changed = set()
+        self.generation = 0
+        self.load()
+        self._changed = set()
+
+    def _fileStamp(self):
+        st = os.stat(self._path)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _logFileStamp(self):
+        """
+        (inode, size) of the change log, None if there is none.
+        """
+        try:
+            st = os.stat(self._logPath)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size
+
+    def _readLog(self):
+        """
+        Apply the complete change log lines past the read offset. Returns
+        the numbers of the subjects they changed.
+        """
+        try:
+            f = open(self._logPath, "rb")
+        except FileNotFoundError:
+            self._logStamp = None
+            return set()
+        with f:
+            ino = os.fstat(f.fileno()).st_ino
+            f.seek(self._logOffset)
+            data = f.read()
+        # A line without its newline is a change being appended (or torn)
+        data = data[:data.rfind(b"\n") + 1]
+        changed = set()
+        for line in data.splitlines():
+            record = json.loads(line)
+            if record["subject"] is None:
+                self._subjectConfig.pop(record["num"], None)
+            else:
+                self._subjectConfig[record["num"]] = record["subject"]
+            changed.add(record["num"])
+        self._logOffset += len(data)
+        self._logStamp = (ino, self._logOffset)
+        return changed
+
+    def load(self):
+        """
+        (Re)read the file and its change log. Returns the numbers of the
+        subjects added, removed or changed since the last read.
+        """
+        with self._threadLock:
+            stamp = self._fileStamp()
+            with open(self._path) as f:
+                previous, self._subjectConfig = self._subjectConfig, json.load(f)
+            self._stamp = stamp
+            self._logOffset = 0
+            self._readLog()
+            config = self._subjectConfig
+            changed = {num for num in set(config) | set(previous) \
+                if config.get(num) != previous.get(num)}
+            self._noteChanged(changed)
+            return changed
+
+    def _noteChanged(self, changed):
+        if changed:
+            self.generation += 1
+            self._changed |= changed
+
+    def _reloadIfChanged(self):
+        """
+        Catch up with the other stations: nothing if neither the file nor
+        the log changed, the new log lines if only the log grew, a full
+        reload if the file or the log was replaced (compacted) meanwhile.
+        """
+        try:
+            stamp = self._fileStamp()
+        except FileNotFoundError:
+            return
+        logStamp = self._logFileStamp()
+        replaced = self._logStamp is not None and \
+            (logStamp is None or logStamp[0] != self._logStamp[0] or logStamp[1] < self._logOffset)
+        if stamp != self._stamp or replaced:
+            self.load()
+        elif logStamp and logStamp[1] > self._logOffset:
+            self._noteChanged(self._readLog())
+
+    def refresh(self):
+        """
+        Catch up with the file and its change log if they changed since
+        they were last read or written here. Returns the numbers of the
+        subjects other stations changed since the last call, empty if none.
+        """
+        with self._threadLock:
+            self._reloadIfChanged()
+            changed, self._changed = self._changed, set()
+            return changed
+
+    def _update(self, change):
+        """
+        Apply change(subjects) to the latest content, all under the lock,
+        and append the record of the subject it changed to the change log.
+        change returns (subject number, result); returns the result.
+        """
+        with self._threadLock, self._lock:
+            self._reloadIfChanged()
+            num, res = change(self._subjectConfig)
+            line = json.dumps({"num": num, "subject": self._subjectConfig.get(num)}).encode() + b"\n"
+            with open(self._logPath, "ab") as f:
+                # Drop the torn line of a station that died while appending
+                f.truncate(self._logOffset)
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+                ino = os.fstat(f.fileno()).st_ino
+            self._logOffset += len(line)
+            self._logStamp = (ino, self._logOffset)
+            self.generation += 1
+            if self._logOffset > max(self._compactSize, self._stamp[1] // 4):
+                self.compact()
+        return res
+
+    def compact(self):
+        """
+        Write the current content to SubjectConfig.json (atomically
+        replaced) and start an empty change log.
+        """
+        with self._threadLock, self._lock:
+            self._reloadIfChanged()
+            tmp = self._path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._subjectConfig, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._path)
+            with open(self._logPath + ".tmp", "wb") as f:
+                os.fsync(f.fileno())
+            os.replace(self._logPath + ".tmp", self._logPath)
+            self._stamp = self._fileStamp()
+            self._logOffset = 0
+            self._logStamp = self._logFileStamp()
+
+    def changeLogPath(self):
+        return self._logPath
+
+    def path(self):
+        return self._path
+
+    def subjects(self):
+        return self._subjectConfig
+
+    def acronymList(self):
+        """
+        ["ACR_<num>", ...] as shown in the subject picker.
+        """
+        with self._threadLock:
+            return [self._subjectConfig[i]["acronym"] + "_" + i for i in self._subjectConfig.keys()]
+
+    def experiments(self, subjectNum):
+        return self._subjectConfig[subjectNum]["experiments"]
+
+    def sequence(self, subjectNum, timestamp):
+        with self._threadLock:
+            for e in self.experiments(subjectNum):
+                if e["datetime"] == timestamp:
+                    return e["sequence"]
+            return None
+
+    def calibration(self, subjectNum, timestamp):
+        """
+        Calibration of a session as stored (UtilCalibration.toDict()),
+        None if it has none.
+        """
+        with self._threadLock:
+            for e in self._subjectConfig.get(subjectNum, {}).get("experiments", []):
+                if e["datetime"] == timestamp:
+                    return e.get("calibration")
+            return None
+
+    def addSubject(self, acr):
+        """
+        Add a subject with the next free number, returns "ACR_<num>".
+        """
+        def change(subjects):
+            subjectNum = str(max([int(i) for i in subjects.keys()] + [0]) + 1)
+            subjects[subjectNum] = {"acronym": acr, "experiments": []}
+            return subjectNum, acr + "_" + subjectNum
+        return self._update(change)
+
+    def startExperiment(self, subjectNum, timestamp):
+        self._update(lambda subjects: (subjectNum, \
+            subjects[subjectNum]["experiments"].append({"datetime": timestamp, "sequence": []})))
+
+    def setSequence(self, subjectNum, timestamp, sequence):
+        """
+        Set the sequence of a session, creating the session if needed.
+        """
+        def change(subjects):
+            experiments = subjects[subjectNum]["experiments"]
+            for e in experiments:
+                if e["datetime"] == timestamp:
+                    e["sequence"] = sequence
+                    break
+            else:
+                experiments.append({"datetime": timestamp, "sequence": sequence})
+            return subjectNum, None
+        self._update(change)
+
+    def setCalibration(self, subjectNum, timestamp, calibration):
+        """
+        Store the calibration (a dict) of an existing session.
+        """
+        def change(subjects):
+            for e in subjects[subjectNum]["experiments"]:
+                if e["datetime"] == timestamp:
+                    e["calibration"] = calibration
+                    return subjectNum, None
+            raise ValueError("No session " + timestamp + " of subject " + subjectNum)
+        self._update(change)
@@ -0,0 +1,151 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Trial index over the subject store and the recording files
+#
+
+import collections
+import os
+import re
+
+from ControlRoomLib import ControlRoomProtocol as protocol
+from ControlRoomLib.UtilRecordArchive import recordingDataSpan
+
+# aktrack-ros names a recording after the trial start command fields,
+# <timestamp>_<subject num>_<trial>, a _<n> suffix for repeats
+RECORDING_PATTERN = re.compile(r"(\d{14})_(\d+)_(VP[A-Z]-[A-Za-z0-9-]+?)(?:_(\d+))?\.(csv|akrec)$")
+
+# One performed (or planned) trial. index is the position in the session
+# sequence; path is None while no recording was found.
+TrialEntry = collections.namedtuple("TrialEntry", \
+    ["subject", "acronym", "session", "index", "trial", "paradigm", "path"])
+
+
+def parseRecordingName(name):
+    """
+    (timestamp, subject num, trial, repeat) of a recording file name,
+    None if it does not follow the convention.
+    """
+    m = RECORDING_PATTERN.search(name)
+    if not m or m.group(3) not in protocol.TRIALS:
+        return None
+    return m.group(1), m.group(2), m.group(3), int(m.group(4) or 0)
+
+
+class ControlRoomTrialIndex():
+    """
+    Every trial of every session in the subject store, joined with the
+    recordings found in the given directories. Occurrences of a repeated
+    trial are matched to its recordings in order. Entries are bucketed by
+    trial, subject, session and paradigm so a query only touches its
+    smallest bucket. refresh() rescans only if the store file, its change
+    log or one of the recording directories (their top level) changed.
+    """
+
+    def __init__(self, store, recordingDirs=()):
+        self._store = store
+        self._dirs = list(recordingDirs)
+        self._stamp = None
+        self.entries = []
+        self.refresh()
+
+    def _currentStamp(self):
+        paths = [self._store.path(), self._store.changeLogPath()] + self._dirs
+        return [os.stat(p).st_mtime_ns if os.path.exists(p) else None for p in paths]
+
+    def refresh(self, force=False):
+        stamp = self._currentStamp()
+        if stamp == self._stamp and not force:
+            return False
+        self._stamp = stamp
+        self._build()
+        return True
+
+    def _scanRecordings(self):
+        """
+        {(timestamp, subject, trial): [path, ...]} in repeat order,
+        archives preferred over CSV files of the same recording.
+        """
+        found = {}
+        for d in self._dirs:
+            if not os.path.isdir(d):
+                continue
+            for root, dirs, files in os.walk(d):
+                for name in files:
+                    parsed = parseRecordingName(name)
+                    if not parsed:
+                        continue
+                    key, rep = parsed[:3], parsed[3]
+                    path = os.path.join(root, name)
+                    previous = found.setdefault(key, {}).get(rep)
+                    if previous is None or path.endswith(".akrec"):
+                        found[key][rep] = path
+        return {key: [reps[r] for r in sorted(reps)] for key, reps in found.items()}
+
+    def _build(self):
+        recordings = self._scanRecordings()
+        self.entries = []
+        self._buckets = collections.defaultdict(list)
+        for num, subject in self._store.subjects().items():
+            for e in subject["experiments"]:
+                seen = collections.Counter()
+                for index, trial in enumerate(e["sequence"]):
+                    paths = recordings.get((e["datetime"], num, trial), [])
+                    path = paths[seen[trial]] if seen[trial] < len(paths) else None
+                    seen[trial] += 1
+                    entry = TrialEntry(num, subject["acronym"], e["datetime"], index, trial, \
+                        protocol.paradigmOf(trial), path)
+                    self.entries.append(entry)
+                    for key in (("trial", trial), ("subject", num), ("session", e["datetime"]), \
+                            ("paradigm", entry.paradigm)):
+                        self._buckets[key].append(entry)
+
+    def query(self, trial=None, subject=None, session=None, paradigm=None, recorded=None):
+        """
+        Entries matching all given fields (subject is the subject number),
+        in store order. recorded=True/False keeps entries with/without a
+        recording.
+        """
+        keys = [k for k in (("trial", trial), ("subject", subject), ("session", session), \
+            ("paradigm", paradigm)) if k[1] is not None]
+        candidates = min([self._buckets.get(k, []) for k in keys], key=len) if keys else self.entries
+        res = []
+        for entry in candidates:
+            if (trial is None or entry.trial == trial) and \
+                    (subject is None or entry.subject == subject) and \
+                    (session is None or entry.session == session) and \
+                    (paradigm is None or entry.paradigm == paradigm) and \
+                    (recorded is None or (entry.path is not None) == recorded):
+                res.append(entry)
+        return res
+
+    def recordings(self, **kwargs):
+        """
+        [(path, offset, size), ...] of the recorded entries matching
+        query(**kwargs): the byte range of each trial's rows in its file
+        (see UtilRecordArchive.recordingDataSpan). aktrack-ros writes one
+        file per trial, so a range covers the file's data section.
+        """
+        return [(e.path,) + recordingDataSpan(e.path) for e in self.query(recorded=True, **kwargs)]
@@ -0,0 +1,213 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Tracker to board calibration
+#
+# A calibration is one 3x3 matrix C taking recorded tracker coordinates
+# (x, y in m, homogeneous) to board coordinates (mm): affine (last row
+# 0, 0, 1) or a homography. Live poses arrive in the board convention of
+# an uncalibrated setup, RECORDING_TO_BOARD applied, so they are mapped
+# with C RECORDING_TO_BOARD^-1, identity without calibration.
+#
+# It is fitted from VPC trials: at its onset the dot leaves the fixation
+# point at a constant speed (deg/s) along the trial direction, the
+# tracked position follows it. Speed, fixation point and onset are
+# stimulus parameters of aktrack-screen the recordings do not carry; the
+# caller gives them.
+#
+
+import math
+import time
+import numpy as np
+
+# Mapping of an uncalibrated setup (what replay always did)
+RECORDING_TO_BOARD = np.array([[-1000.0, 0.0, 0.0], [0.0, -1000.0, 0.0], [0.0, 0.0, 1.0]])
+
+CALIBRATION_MODELS = ["affine", "homography"]
+
+# VPC dot direction on the board
+VPC_DIRECTIONS = {"VPC-L": (-1.0, 0.0), "VPC-R": (1.0, 0.0), "VPC-U": (0.0, 1.0), "VPC-D": (0.0, -1.0)}
+
+# Board mm per degree of visual angle at a 1 m viewing distance
+DEFAULT_MM_PER_DEGREE = 1000.0 * math.tan(math.radians(1.0))
+
+
+def applyMatrix(m, xy):
+    """
+    Map (N, 2) points with a 3x3 homogeneous matrix, in one pass.
+    """
+    xy = np.asarray(xy, dtype=float)
+    out = xy @ m[:2, :2].T + m[:2, 2]
+    if m[2, 0] or m[2, 1] or m[2, 2] != 1.0:
+        w = xy @ m[2, :2] + m[2, 2]
+        out /= w[:, None]
+    return out
+
+
+class UtilCalibration():
+    """
+    Calibration matrix C with its live counterpart precomputed. apply()
+    maps whole recordings, livePoint() one live pose with six multiply-
+    adds (two more and a division for a homography).
+    """
+
+    def __init__(self, matrix=None, info=None):
+        self.matrix = np.array(RECORDING_TO_BOARD if matrix is None else matrix, dtype=float)
+        self.info = dict(info) if info else {}
+        self.live = self.matrix @ np.linalg.inv(RECORDING_TO_BOARD)
+        self.live /= self.live[2, 2]
+        (a, b, c), (d, e, f), (g, h, i) = self.live.tolist()
+        self._live = (a, b, c, d, e, f)
+        self._projective = (g, h, i) != (0.0, 0.0, 1.0)
+        self._liveW = (g, h, i)
+
+    def isDefault(self):
+        return np.allclose(self.matrix, RECORDING_TO_BOARD)
+
+    def apply(self, xy):
+        """
+        Board positions (N, 2) of recorded tracker positions (N, 2).
+        """
+        return applyMatrix(self.matrix, xy)
+
+    def applyLive(self, xy):
+        """
+        Board positions (N, 2) of live poses (N, 2), e.g. a timeline batch.
+        """
+        return applyMatrix(self.live, xy)
+
+    def livePoint(self, x, y):
+        a, b, c, d, e, f = self._live
+        if not self._projective:
+            return a * x + b * y + c, d * x + e * y + f
+        g, h, i = self._liveW
+        w = g * x + h * y + i
+        return (a * x + b * y + c) / w, (d * x + e * y + f) / w
+
+    def report(self):
+        if "model" not in self.info:
+            return "not calibrated" if self.isDefault() else "custom matrix"
+        return "%s, rms %.1f mm over %d VPC trials (%s)" % (self.info["model"], self.info["rms"], \
+            len(self.info["trials"]), self.info.get("fitted", ""))
+
+    def toDict(self):
+        res = dict(self.info)
+        res["matrix"] = self.matrix.tolist()
+        return res
+
+    @classmethod
+    def fromDict(cls, d):
+        if not d:
+            return cls()
+        info = {k: v for k, v in d.items() if k != "matrix"}
+        return cls(d["matrix"], info)
+
+
+def vpcTargets(t, trial, speed, fixation, mmPerDegree=DEFAULT_MM_PER_DEGREE):
+    """
+    Board positions (N, 2) of the dot of a VPC trial moving at speed
+    deg/s from fixation, at times t (s since its onset).
+    """
+    u = np.asarray(VPC_DIRECTIONS[trial])
+    return np.asarray(fixation, dtype=float) + np.outer(np.asarray(t) * speed * mmPerDegree, u)
+
+
+def _fitAffine(src, dst):
+    a = np.column_stack([src, np.ones(src.shape[0])])
+    sol, _, _, _ = np.linalg.lstsq(a, dst, rcond=None)
+    m = np.eye(3)
+    m[:2, :] = sol.T
+    return m
+
+
+def _normalizer(p):
+    c = p.mean(axis=0)
+    s = math.sqrt(2.0) / max(np.sqrt(((p - c) ** 2).sum(axis=1)).mean(), 1e-12)
+    return np.array([[s, 0.0, -s * c[0]], [0.0, s, -s * c[1]], [0.0, 0.0, 1.0]])
+
+
+def _fitHomography(src, dst):
+    """
+    Normalized DLT: least squares over all correspondences through the
+    SVD of the 2N x 9 system.
+    """
+    ts, td = _normalizer(src), _normalizer(dst)
+    s = applyMatrix(ts, src)
+    d = applyMatrix(td, dst)
+    n = s.shape[0]
+    a = np.zeros((2 * n, 9))
+    a[0::2, 0:2] = s
+    a[0::2, 2] = 1.0
+    a[0::2, 6:8] = -d[:, 0:1] * s
+    a[0::2, 8] = -d[:, 0]
+    a[1::2, 3:5] = s
+    a[1::2, 5] = 1.0
+    a[1::2, 6:8] = -d[:, 1:2] * s
+    a[1::2, 8] = -d[:, 1]
+    h = np.linalg.svd(a)[2][-1].reshape(3, 3)
+    m = np.linalg.inv(td) @ h @ ts
+    return m / m[2, 2]
+
+
+def fitCalibration(trials, speed, fixation, onset, model="affine", mmPerDegree=DEFAULT_MM_PER_DEGREE, skip=0.5):
+    """
+    Fit a calibration to VPC trials [(trial, data), ...], data rows
+    (t, x, y, ...) as recorded, whose dot moved at speed deg/s from
+    fixation (board mm). onset is the time from the first recorded
+    sample of a trial to the dot leaving fixation (s), one for all
+    trials or a sequence with one per trial. Samples before the onset
+    and the skip seconds after it (pursuit onset) are left out. Returns
+    a UtilCalibration whose info has the model, the rms error (mm), the
+    trials used and the stimulus parameters.
+    """
+    if model not in CALIBRATION_MODELS:
+        raise ValueError("Unknown calibration model " + str(model))
+    trials = list(trials)
+    onsets = [float(i) for i in onset] if np.ndim(onset) else [float(onset)] * len(trials)
+    if len(onsets) != len(trials):
+        raise ValueError("Expected one onset per trial, got " + str(len(onsets)) + " for " + \
+            str(len(trials)) + " trials")
+    src, dst, used = [], [], []
+    for (trial, data), trialOnset in zip(trials, onsets):
+        data = np.asarray(data, dtype=float)
+        if trial not in VPC_DIRECTIONS or data.shape[0] == 0:
+            continue
+        t = data[:, 0] - data[0, 0] - trialOnset
+        keep = t >= skip
+        src.append(data[keep, 1:3])
+        dst.append(vpcTargets(t[keep], trial, speed, fixation, mmPerDegree))
+        used.append(trial)
+    # Opposite directions only (L and R, or U and D) leave the other
+    # axis undetermined
+    if {VPC_DIRECTIONS[trial][0] != 0.0 for trial in used} != {True, False}:
+        raise ValueError("A calibration needs VPC trials in a horizontal (L, R) and a vertical (U, D) direction")
+    src, dst = np.concatenate(src), np.concatenate(dst)
+    if np.linalg.matrix_rank(np.column_stack([src, np.ones(src.shape[0])])) < 3:
+        raise ValueError("The tracked positions of the VPC trials lie on a line, cannot calibrate")
+    m = _fitAffine(src, dst) if model == "affine" else _fitHomography(src, dst)
+    rms = float(np.sqrt(np.mean(np.sum((applyMatrix(m, src) - dst) ** 2, axis=1))))
+    return UtilCalibration(m, {"model": model, "rms": rms, "trials": used, "samples": int(src.shape[0]), \
+        "speed": speed, "fixation": list(fixation), "onset": onsets, "mmPerDegree": mmPerDegree, \
+        "fitted": time.strftime("%m%d%Y%H%M%S")})
@@ -0,0 +1,229 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Raw datagram capture (.akcap) and player
+#
+# Layout: header | record | record | ...
+#   header   b"AKCAP1\0\0", wall clock time of the capture start (f8)
+#   record   time since the start (i8, ns), channel id (u1), size (u2),
+#            then size bytes: the datagram, or for channel id 255 the
+#            JSON definition {"id", "name", "ip", "port"} of a channel
+#            (the local address its datagrams were received on)
+# Records are appended as datagrams arrive, a capture cut short (e.g. a
+# crash) reads up to its last complete record.
+#
+
+import json
+import socket
+import struct
+import threading
+import time
+
+CAPTURE_EXT = ".akcap"
+
+_MAGIC = b"AKCAP1\0\0"
+_HEADER = struct.Struct("<8sd")
+_RECORD = struct.Struct("<qBH")
+_DEFINITION = 255
+
+
+class UtilCaptureWriter():
+    """
+    Appends every datagram handed to record() with a perf_counter_ns
+    timestamp. Channels are named ("<connection>.<socket>") and defined in
+    the file on first use.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "wb", buffering=1 << 16)
+        self._file.write(_HEADER.pack(_MAGIC, time.time()))
+        self._t0 = time.perf_counter_ns()
+        self._channels = {}
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def channel(self, name, ip, port):
+        """
+        Id of the channel name, defined with its local address on first use.
+        """
+        with self._lock:
+            cid = self._channels.get(name)
+            if cid is None:
+                cid = len(self._channels)
+                if cid >= _DEFINITION:
+                    raise ValueError("Too many capture channels")
+                self._channels[name] = cid
+                body = json.dumps({"id": cid, "name": name, "ip": ip, "port": port}).encode("UTF-8")
+                self._file.write(_RECORD.pack(time.perf_counter_ns() - self._t0, _DEFINITION, len(body)) + body)
+            return cid
+
+    def record(self, cid, data):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(_RECORD.pack(time.perf_counter_ns() - self._t0, cid, len(data)))
+            self._file.write(data)
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+class UtilCapture():
+    """
+    A capture file read back: channels {id: definition}, started (wall
+    clock) and the records as (t in seconds, channel id, datagram).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.channels = {}
+        with open(path, "rb") as f:
+            magic, self.started = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(path + " is not a capture file")
+        # One pass for the channel definitions
+        for t, cid, data in self.records():
+            pass
+
+    def records(self, channels=None):
+        """
+        Iterate over the datagrams in capture order, those of the named
+        channels only if given.
+        """
+        with open(self.path, "rb") as f:
+            f.seek(_HEADER.size)
+            while True:
+                head = f.read(_RECORD.size)
+                if len(head) < _RECORD.size:
+                    return
+                t, cid, size = _RECORD.unpack(head)
+                data = f.read(size)
+                if len(data) < size:
+                    return
+                if cid == _DEFINITION:
+                    definition = json.loads(data.decode("UTF-8"))
+                    self.channels[definition["id"]] = definition
+                    continue
+                if channels is None or self.channels[cid]["name"] in channels:
+                    yield t * 1e-9, cid, data
+
+    def summary(self):
+        """
+        {channel name: {"datagrams", "bytes", "t_first", "t_last"}}
+        """
+        res = {}
+        for t, cid, data in self.records():
+            s = res.setdefault(self.channels[cid]["name"], \
+                {"datagrams": 0, "bytes": 0, "t_first": t, "t_last": t})
+            s["datagrams"] += 1
+            s["bytes"] += len(data)
+            s["t_last"] = t
+        return res
+
+
+class UtilCapturePlayer():
+    """
+    Re-sends the datagrams of a capture to the addresses they were
+    received on (a wildcard address becomes 127.0.0.1), or to targets
+    {channel name: (ip, port)}, keeping the captured timing divided by
+    speed (None: as fast as possible). Sends are scheduled on absolute
+    times from the start, sleeping and then spinning for the last
+    millisecond, so timing errors do not add up over a long capture.
+    Runs in the calling thread (play) or in its own (start/stop).
+    """
+
+    def __init__(self, capture, speed=1.0, channels=None, targets=None):
+        self.capture = capture
+        self.speed = speed
+        self.channels = channels
+        self.targets = dict(targets) if targets else {}
+        self.sent = 0
+        self.maxLag = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _address(self, cid):
+        definition = self.capture.channels[cid]
+        if definition["name"] in self.targets:
+            return self.targets[definition["name"]]
+        ip = definition["ip"]
+        return ("127.0.0.1" if ip in ("", "0.0.0.0") else ip, definition["port"])
+
+    def play(self):
+        """
+        Send the whole capture, returns {"sent", "duration", "max_lag"}.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        addresses = {}
+        t0 = None
+        start = time.perf_counter()
+        try:
+            for t, cid, data in self.capture.records(self.channels):
+                if self._stop.is_set():
+                    break
+                if t0 is None:
+                    t0 = t
+                if self.speed:
+                    due = start + (t - t0) / self.speed
+                    wait = due - time.perf_counter()
+                    if wait > 0.001:
+                        time.sleep(wait - 0.001)
+                    while time.perf_counter() < due:
+                        pass
+                    lag = time.perf_counter() - due
+                    if lag > self.maxLag:
+                        self.maxLag = lag
+                address = addresses.get(cid)
+                if address is None:
+                    address = addresses[cid] = self._address(cid)
+                try:
+                    sock.sendto(data, address)
+                except OSError:
+                    continue
+                self.sent += 1
+        finally:
+            sock.close()
+        return {"sent": self.sent, "duration": time.perf_counter() - start, "max_lag": self.maxLag}
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.play, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.join()
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def isPlaying(self):
+        return self._thread is not None and self._thread.is_alive()
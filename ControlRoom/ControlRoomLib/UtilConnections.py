@@ -27,15 +27,22 @@ SOFTWARE.
 #
 
 import socket
-import slicer
+import time
+from ControlRoomLib.UtilMetrics import metrics
+from ControlRoomLib.UtilSlicerFuncs import errorDisplay
 
 
 class UtilConnections():
     """
     Connection class.
     Blocking send and receive
+
+    Counters <metricsName>.commands.sent, .commands.timeouts, .received
+    (datagrams on the blocking port) and .flushed go to UtilMetrics.
     """
 
+    metricsName = "udp"
+
     def __init__(self, sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send):
 
         self._sock_ip_receive = sock_ip_receive
@@ -46,12 +53,33 @@ class UtilConnections():
         self._sock_receive = None
         self._sock_send = None
 
+        self._eventLoop = None
+
+        self._receiveTimeout = 0.5
+        # monotonic time of the last datagram seen from the peer, and
+        # round trip time of the last command (read by UtilHealthMonitor)
+        self._lastActivity = None
+        self._lastRoundTrip = None
+        self._sentAt = None
+        # UtilCaptureWriter recording every received datagram, and the
+        # capture channel ids of the receive sockets
+        self._capture = None
+        self._captureIds = {}
+
     def setup(self):
         self._sock_receive = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._sock_send = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._sock_receive.bind(
             (self._sock_ip_receive, self._sock_port_receive))
-        self._sock_receive.settimeout(0.5)
+        self._sock_receive.settimeout(self._receiveTimeout)
+
+    def registerEventLoop(self, eventLoop):
+        """
+        Attach the connection to a shared UtilEventLoop.
+        Blocking connections have nothing to watch, subclasses with
+        asynchronous sockets register them here.
+        """
+        self._eventLoop = eventLoop
 
     def clear(self):
         if self._sock_receive:
@@ -59,18 +87,96 @@ class UtilConnections():
         if self._sock_send:
             self._sock_send.close()
 
-    def utilSendCommand(self, msg, errorMsg="Failed to send command ", res=False):
+    def setCapture(self, writer, name):
+        """
+        Record every datagram received from now on into writer (a
+        UtilCaptureWriter, None stops), on channel <name>.receive.
+        """
+        self._captureIds = {}
+        if writer:
+            self._captureIds["receive"] = writer.channel(name + ".receive", \
+                self._sock_ip_receive, self._sock_port_receive)
+        self._capture = writer
+
+    def reconnect(self):
+        """
+        Close and re-create the sockets (rebinding the receive ports).
+        """
+        self.clear()
+        self.setup()
+
+    def reconnectCommand(self):
+        """
+        Re-create the command sockets only (rebinding the blocking receive
+        port). A stream socket of a subclass is left as is, with the
+        datagrams queued on it.
+        """
+        UtilConnections.clear(self)
+        UtilConnections.setup(self)
+
+    def flushReceive(self):
+        """
+        Discard datagrams already waiting on the blocking receive socket,
+        e.g. late heartbeat replies, so they are not taken as the response
+        to the next command. Returns the number discarded.
+        """
+        n = 0
+        self._sock_receive.setblocking(False)
+        try:
+            while True:
+                data = self._sock_receive.recv(2048)
+                if self._capture:
+                    self._capture.record(self._captureIds["receive"], data)
+                n += 1
+        except OSError:
+            pass
+        finally:
+            self._sock_receive.settimeout(self._receiveTimeout)
+        if n:
+            self._lastActivity = time.monotonic()
+            metrics.count(self.metricsName + ".received", n)
+            metrics.count(self.metricsName + ".flushed", n)
+        return n
+
+    def prepareCommand(self, msg):
+        """
+        Encode a command ahead of sending it with sendPrepared().
+        """
         if len(msg) > 2048:
             raise RuntimeError("Command contains too many characters.")
+        return msg.encode('UTF-8')
+
+    def sendPrepared(self, payload):
+        """
+        Send an encoded command without waiting for its response, which
+        awaitResponse() then collects.
+        """
+        self.flushReceive()
+        self._sentAt = time.monotonic()
+        self._sock_send.sendto(payload, (self._sock_ip_send, self._sock_port_send))
+        metrics.count(self.metricsName + ".commands.sent")
+
+    def awaitResponse(self):
         try:
-            self._sock_send.sendto(
-                msg.encode('UTF-8'), (self._sock_ip_send, self._sock_port_send))
-            try:
-                data = self._sock_receive.recvfrom(2048)
-            except socket.error:
-                raise RuntimeError("Command response timedout")
+            data = self._sock_receive.recvfrom(2048)
+        except socket.error:
+            metrics.count(self.metricsName + ".commands.timeouts")
+            raise RuntimeError("Command response timedout")
+        if self._capture:
+            self._capture.record(self._captureIds["receive"], data[0])
+        metrics.count(self.metricsName + ".received")
+        self._lastActivity = time.monotonic()
+        self._lastRoundTrip = self._lastActivity - self._sentAt
+        metrics.observe("utilSendCommand", self._lastRoundTrip)
+        return data
+
+    def utilSendCommand(self, msg, errorMsg="Failed to send command ", res=False):
+        payload = self.prepareCommand(msg)
+        try:
+            self.sendPrepared(payload)
+            data = self.awaitResponse()
         except Exception as e:
-            slicer.util.errorDisplay(errorMsg+str(e))
+            errorDisplay(errorMsg+str(e))
             import traceback
             traceback.print_exc()
             raise
@@ -81,5 +187,29 @@ class UtilConnections():
         try:
             data = self._sock_receive.recvfrom(2048)
         except socket.error:
+            metrics.count(self.metricsName + ".commands.timeouts")
             raise RuntimeError("Command response timedout")
-        return data[0].decode('UTF-8')
\ No newline at end of file
+        if self._capture:
+            self._capture.record(self._captureIds["receive"], data[0])
+        metrics.count(self.metricsName + ".received")
+        return data[0].decode('UTF-8')
+
+
+def utilSendCommands(commands, errorMsg="Failed to send command "):
+    """
+    Send [(connection, payload), ...] (payloads from prepareCommand) back
+    to back, then collect the responses: the commands go out within
+    microseconds of each other instead of one round trip apart.
+    """
+    try:
+        t0 = time.monotonic()
+        for conn, payload in commands:
+            conn.sendPrepared(payload)
+        metrics.observe("utilSendCommands.dispatch", time.monotonic() - t0)
+        for conn, payload in commands:
+            conn.awaitResponse()
+    except Exception as e:
+        errorDisplay(errorMsg+str(e))
+        import traceback
+        traceback.print_exc()
+        raise
@@ -23,19 +23,38 @@ SOFTWARE.
 """
 
 import socket
-import qt
+import time
+import traceback
 from ControlRoomLib.UtilConnections import UtilConnections
+from ControlRoomLib.UtilMetrics import metrics
+from ControlRoomLib.UtilReceivePolicy import UtilReceivePolicyQueued
 
 class UtilConnectionsWtNnBlcRcv(UtilConnections):
     """
     Connection class that has an additional non-blocking receive
-    socket (using qt Timer in Slicer since Slicer is single threaded)
+    socket. The socket is watched by a shared UtilEventLoop and is only
+    read when data arrives (Slicer is single threaded, so on the GUI the
+    loop is driven by Qt socket notifiers).
+
+    What is handed over is decided by a UtilReceivePolicy: lossless and
+    in order by default, or latest value wins for high rate streams.
+    The kernel buffer is sized by rcvBufSize so bursts are not cut short
+    before the policy sees them. At most maxDrain datagrams are read per
+    callback; the rest wait for the next one (the socket stays readable),
+    so a flooding stream cannot starve the GUI thread.
 
     Received data is handled by overriding self.handleReceivedData()
+    datagramsCallback(datagrams), if set, gets every datagram of a drain
+    before the policy decides, e.g. to keep a full-rate history next to a
+    latest-wins display path.
+
+    Counters <metricsName>.stream.received, .stream.ignored (while not
+    receiving) and, from the policy, .stream.dropped go to UtilMetrics.
     """
 
-    def __init__(self, sock_ip_receive_nnblc, sock_port_receive_nnblc, packetInterval, \
-            sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send):
+    def __init__(self, sock_ip_receive_nnblc, sock_port_receive_nnblc, \
+            sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send, \
+            receivePolicy=None, rcvBufSize=262144, maxDrain=256):
         super().__init__(sock_ip_receive, sock_port_receive, sock_ip_send, sock_port_send)
 
         self._sock_ip_receive_nnblc = sock_ip_receive_nnblc
@@ -45,24 +64,51 @@ class UtilConnectionsWtNnBlcRcv(UtilConnections):
         self._flag_receiving_nnblc = False
 
         self._data_buff = None
+        self.datagramsCallback = None
 
-        self._packetInterval = packetInterval
+        self._receivePolicy = receivePolicy if receivePolicy else UtilReceivePolicyQueued()
+        self._receivePolicy.metricsName = self.metricsName + ".stream"
+        self._rcvBufSize = rcvBufSize
+        self._maxDrain = maxDrain
 
     def setup(self):
         super().setup()
         self._sock_receive_nnblc = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        # set buffer size to 1 if want data to be time sensitive
-        self._sock_receive_nnblc.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1)
+        self._sock_receive_nnblc.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self._rcvBufSize)
         self._sock_receive_nnblc.bind(\
             (self._sock_ip_receive_nnblc, self._sock_port_receive_nnblc))
-        # self._sock_receive_nnblc.settimeout(0.1/1000)
         self._sock_receive_nnblc.setblocking(0)
+        if self._eventLoop:
+            self._eventLoop.register(self._sock_receive_nnblc, self.receiveCallBack)
+
+    def registerEventLoop(self, eventLoop):
+        super().registerEventLoop(eventLoop)
+        if self._sock_receive_nnblc:
+            eventLoop.register(self._sock_receive_nnblc, self.receiveCallBack)
 
     def clear(self):
-        super().clear()
         self._flag_receiving_nnblc = False
         if self._sock_receive_nnblc:
+            if self._eventLoop:
+                self._eventLoop.unregister(self._sock_receive_nnblc)
             self._sock_receive_nnblc.close()
+        super().clear()
+
+    def setCapture(self, writer, name):
+        """
+        As UtilConnections.setCapture, the non-blocking socket on channel
+        <name>.stream. Datagrams are recorded as read, before the receive
+        policy, so a capture also has what the policy drops.
+        """
+        super().setCapture(writer, name)
+        if writer:
+            self._captureIds["stream"] = writer.channel(name + ".stream", \
+                self._sock_ip_receive_nnblc, self._sock_port_receive_nnblc)
+
+    def reconnect(self):
+        flag = self._flag_receiving_nnblc
+        super().reconnect()
+        self._flag_receiving_nnblc = flag
 
     def handleReceivedData(self):
         """
@@ -70,12 +116,55 @@ class UtilConnectionsWtNnBlcRcv(UtilConnections):
         """
         return
 
-    def receiveTimerCallBack(self):
-        if self._flag_receiving_nnblc:
+    @metrics.timed("receiveCallBack")
+    def receiveCallBack(self):
+        """
+        Called by the event loop when the non-blocking socket is readable.
+        Drains up to maxDrain pending datagrams into the receive policy,
+        then hands over what the policy keeps.
+        """
+        policy = self._receivePolicy
+        received = policy.received
+        capture = self._capture
+        accepted = [] if self.datagramsCallback else None
+        ignored = 0
+        for i in range(self._maxDrain):
+            try:
+                data = self._sock_receive_nnblc.recv(2048)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                # ICMP port unreachable is reported this way on Windows
+                continue
+            except OSError:
+                break
+            if capture:
+                capture.record(self._captureIds["stream"], data)
+            if self._flag_receiving_nnblc:
+                policy.push(data)
+                if accepted is not None:
+                    accepted.append(data)
+            else:
+                ignored += 1
+        if policy.received != received:
+            self._lastActivity = time.monotonic()
+            metrics.count(policy.metricsName + ".received", policy.received - received)
+        if ignored:
+            metrics.count(policy.metricsName + ".ignored", ignored)
+        if accepted:
+            try:
+                self.datagramsCallback(accepted)
+            except Exception:
+                traceback.print_exc()
+        for data in policy.pop():
+            self._data_buff = data
             try:
-                # self._data_buff = self._sock_receive_nnblc.recvfrom(256)
-                self._data_buff = self._sock_receive_nnblc.recv(2048)
                 self.handleReceivedData()
-                qt.QTimer.singleShot(self._packetInterval+1, self.receiveTimerCallBack)
-            except:
-                qt.QTimer.singleShot(self._packetInterval+1, self.receiveTimerCallBack)
\ No newline at end of file
+            except Exception:
+                traceback.print_exc()
+
+    def receiveStats(self):
+        """
+        Received / handled / dropped counters of the non-blocking channel.
+        """
+        return self._receivePolicy.stats()
@@ -0,0 +1,297 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Event loop
+#
+
+import heapq
+import itertools
+import selectors
+import socket
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future
+
+
+class UtilEventLoop():
+    """
+    Shared I/O multiplexer for the component connections.
+    Sockets are registered with a callback that is only invoked when
+    the socket becomes readable, so nothing is polled at a fixed interval.
+
+    Subclasses decide how readiness is waited for (selectors or Qt).
+    One-shot timers (callLater) are provided for delayed notifications.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+
+    def register(self, sock, callback):
+        """
+        Call callback() whenever sock has data to read.
+        The socket is expected to be non-blocking.
+        """
+        fd = sock.fileno()
+        if fd in self._handlers:
+            self.unregister(sock)
+        self._handlers[fd] = (sock, callback)
+        self._watch(sock, callback)
+
+    def unregister(self, sock):
+        fd = sock.fileno()
+        if fd < 0:
+            # Socket already closed, look it up by object instead
+            for key, (s, _) in list(self._handlers.items()):
+                if s is sock:
+                    fd = key
+                    break
+        if fd in self._handlers:
+            self._unwatch(fd)
+            del self._handlers[fd]
+
+    def callLater(self, delay, callback):
+        """
+        Call callback() once, delay seconds from now.
+        """
+        raise NotImplementedError
+
+    def isRegistered(self, sock):
+        return any(s is sock for s, _ in self._handlers.values())
+
+    def close(self):
+        for fd in list(self._handlers.keys()):
+            self._unwatch(fd)
+        self._handlers = {}
+
+    def _watch(self, sock, callback):
+        raise NotImplementedError
+
+    def _unwatch(self, fd):
+        raise NotImplementedError
+
+
+class UtilEventLoopSelector(UtilEventLoop):
+    """
+    Event loop backed by the selectors module.
+    Used for headless sessions, scripts and tests. The caller drives it
+    with runOnce() or run().
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._selector = selectors.DefaultSelector()
+        self._running = False
+        self._timers = []
+        self._timerSeq = itertools.count()
+
+    def _watch(self, sock, callback):
+        self._selector.register(sock.fileno(), selectors.EVENT_READ, callback)
+
+    def _unwatch(self, fd):
+        try:
+            self._selector.unregister(fd)
+        except (KeyError, ValueError):
+            pass
+
+    def callLater(self, delay, callback):
+        heapq.heappush(self._timers, (time.monotonic() + delay, next(self._timerSeq), callback))
+
+    def runOnce(self, timeout=None):
+        """
+        Wait at most timeout seconds (forever if None) and dispatch every
+        ready callback and due timer. Returns the number dispatched.
+        """
+        if self._timers:
+            untilTimer = max(self._timers[0][0] - time.monotonic(), 0)
+            timeout = untilTimer if timeout is None else min(timeout, untilTimer)
+        if self._handlers:
+            events = self._selector.select(timeout)
+        else:
+            events = []
+            if timeout is None:
+                # Nothing registered that could ever wake us up
+                return 0
+            time.sleep(timeout)
+        for key, _ in events:
+            key.data()
+        n = len(events)
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, callback = heapq.heappop(self._timers)
+            callback()
+            n += 1
+        return n
+
+    def run(self, duration=None, until=None):
+        """
+        Dispatch events until stop() is called, until() returns True, or
+        until duration seconds have elapsed if given.
+        """
+        self._running = True
+        deadline = None if duration is None else time.monotonic() + duration
+        while self._running and not (until and until()):
+            if not self._handlers and not self._timers:
+                break
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+            self.runOnce(timeout)
+        self._running = False
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        super().close()
+        self._selector.close()
+
+
+class UtilEventLoopThread(UtilEventLoopSelector):
+    """
+    Selector event loop dispatching on a thread of its own, from start()
+    until close(). Everything registered with it runs on that thread;
+    other threads hand work over with callSoon() (fire and forget) or
+    call() (waits for the result), which wake the loop through a socket
+    pair. Blocking calls made on the loop (e.g. awaitResponse) hold up
+    this loop only.
+    """
+
+    def __init__(self, name=None):
+        super().__init__()
+        self._name = name
+        self._thread = None
+        self._closing = False
+        self._pending = deque()
+        self._wakeRead, self._wakeWrite = socket.socketpair()
+        self._wakeRead.setblocking(False)
+        self._wakeWrite.setblocking(False)
+        self.register(self._wakeRead, self._runPending)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, name=self._name, daemon=True)
+        self._thread.start()
+
+    def isLoopThread(self):
+        return threading.current_thread() is self._thread
+
+    def callSoon(self, callback):
+        """
+        Call callback() on the loop thread as soon as it is free.
+        Safe to call from any thread.
+        """
+        self._pending.append(callback)
+        try:
+            self._wakeWrite.send(b"\0")
+        except (BlockingIOError, OSError):
+            # Already woken (pipe full) or closing
+            pass
+
+    def call(self, callback, *args):
+        """
+        Run callback(*args) on the loop thread and return its result
+        (raising what it raised). Runs it right away on the loop thread
+        itself, or if the loop was not started.
+        """
+        if self._thread is None or self.isLoopThread():
+            return callback(*args)
+        future = Future()
+        def run():
+            try:
+                future.set_result(callback(*args))
+            except BaseException as e:
+                future.set_exception(e)
+        self.callSoon(run)
+        return future.result()
+
+    def callLater(self, delay, callback):
+        if self._thread is None or self.isLoopThread():
+            super().callLater(delay, callback)
+        else:
+            self.callSoon(lambda: super(UtilEventLoopThread, self).callLater(delay, callback))
+
+    def _runPending(self):
+        try:
+            while self._wakeRead.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while self._pending:
+            callback = self._pending.popleft()
+            try:
+                callback()
+            except Exception:
+                traceback.print_exc()
+
+    def _serve(self):
+        while not self._closing:
+            try:
+                self.runOnce()
+            except Exception:
+                traceback.print_exc()
+
+    def close(self):
+        """
+        Stop the thread after the callback running now, then close.
+        """
+        if self._thread and not self.isLoopThread():
+            self.callSoon(lambda: setattr(self, "_closing", True))
+            self._thread.join()
+        self._closing = True
+        super().close()
+        self._wakeRead.close()
+        self._wakeWrite.close()
+
+
+class UtilEventLoopQt(UtilEventLoop):
+    """
+    Event loop backed by QSocketNotifier, for use on the Slicer GUI thread.
+    Qt's own event loop waits on the sockets, so nothing is polled; the
+    only timers are the one-shot callLater() ones (QTimer.singleShot).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._notifiers = {}
+
+    def _watch(self, sock, callback):
+        import qt
+        notifier = qt.QSocketNotifier(sock.fileno(), qt.QSocketNotifier.Read)
+        notifier.connect('activated(int)', lambda fd: callback())
+        notifier.setEnabled(True)
+        self._notifiers[sock.fileno()] = notifier
+
+    def callLater(self, delay, callback):
+        import qt
+        qt.QTimer.singleShot(int(delay * 1000), callback)
+
+    def _unwatch(self, fd):
+        notifier = self._notifiers.pop(fd, None)
+        if notifier:
+            notifier.setEnabled(False)
+            notifier.deleteLater()
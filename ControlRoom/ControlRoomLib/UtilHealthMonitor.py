@@ -0,0 +1,202 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Connection health
+#
+
+import time
+from collections import deque
+
+
+class UtilLinkHealth():
+    """
+    Health state of one link (one UtilConnections instance).
+    """
+
+    UNKNOWN = "unknown"
+    UP = "up"
+    DOWN = "down"
+
+    def __init__(self, name, connection, heartbeatMsg=None):
+        self.name = name
+        self.connection = connection
+        self.heartbeatMsg = heartbeatMsg
+        self.status = UtilLinkHealth.UNKNOWN
+        self.rtts = deque(maxlen=256)
+        self.missed = 0
+        self.reconnects = 0
+        # The peer answered a heartbeat at least once (so implements it)
+        self.heartbeatAnswered = False
+        self._heartbeatSentAt = None
+        self._lastActivitySeen = None
+        self._watchedSocket = None
+
+    def rttPercentile(self, q):
+        """
+        q-th percentile (0-100) of the recent round trip times in seconds,
+        None if no sample yet.
+        """
+        if not self.rtts:
+            return None
+        s = sorted(self.rtts)
+        return s[min(len(s)-1, int(round(q / 100.0 * (len(s)-1))))]
+
+    def summary(self):
+        p50, p99 = self.rttPercentile(50), self.rttPercentile(99)
+        if p50 is None:
+            return self.name + ": " + self.status
+        return "%s: %s (rtt p50 %.1f ms, p99 %.1f ms)" % \
+            (self.name, self.status, p50 * 1000.0, p99 * 1000.0)
+
+
+class UtilHealthMonitor():
+    """
+    Keeps rolling RTT samples of each link and, for links added with a
+    heartbeat message (opt-in, the peer must implement it), sends
+    lightweight heartbeats and re-creates the command sockets of a link
+    that went silent.
+
+    Nothing here blocks: heartbeats are fire-and-forget UDP sends and
+    replies are picked up through the shared UtilEventLoop. tick() is
+    driven by the caller (a Qt timer on the GUI, or a script).
+    Any traffic from the peer (command replies, streamed data) counts as
+    a sign of life, so busy links are not sent heartbeats at all.
+    Missed heartbeats only count once the peer has answered one: a peer
+    that answers commands but not heartbeats is never reconnected. A
+    reconnect leaves the stream socket of a link alone, so datagrams
+    queued on it (e.g. trial events) are not lost.
+    """
+
+    def __init__(self, eventLoop, interval=1.0, maxMissed=3):
+        self._eventLoop = eventLoop
+        self._interval = interval
+        self._maxMissed = maxMissed
+        self._links = []
+        self.statusCallback = None
+
+    def addLink(self, name, connection, heartbeatMsg=None):
+        link = UtilLinkHealth(name, connection, heartbeatMsg)
+        self._links.append(link)
+        self._watch(link)
+        return link
+
+    def links(self):
+        return self._links
+
+    def clear(self):
+        for link in self._links:
+            self._unwatch(link)
+        self._links = []
+
+    def tick(self):
+        """
+        One monitoring step. Call every `interval` seconds.
+        """
+        now = time.monotonic()
+        changed = False
+        for link in self._links:
+            changed |= self._updateLink(link, now)
+        if self.statusCallback:
+            self.statusCallback(self.summary(), changed)
+
+    def summary(self):
+        return "\n".join(link.summary() for link in self._links)
+
+    def _updateLink(self, link, now):
+        conn = link.connection
+        previous = link.status
+
+        if conn._lastRoundTrip is not None:
+            # Command round trips are RTT samples too
+            link.rtts.append(conn._lastRoundTrip)
+            conn._lastRoundTrip = None
+
+        if conn._lastActivity is not None and conn._lastActivity != link._lastActivitySeen:
+            # Heard from the peer since last tick
+            link._lastActivitySeen = conn._lastActivity
+            link._heartbeatSentAt = None
+            link.missed = 0
+            link.status = UtilLinkHealth.UP
+        elif link._heartbeatSentAt is not None and link.heartbeatAnswered:
+            link.missed += 1
+            if link.missed >= self._maxMissed:
+                link.status = UtilLinkHealth.DOWN
+                self._reconnect(link)
+
+        if link.heartbeatMsg is not None and \
+                (link._lastActivitySeen is None or now - link._lastActivitySeen >= self._interval):
+            self._sendHeartbeat(link, now)
+
+        return link.status != previous
+
+    def _sendHeartbeat(self, link, now):
+        try:
+            link.connection._sock_send.sendto(link.heartbeatMsg.encode('UTF-8'), \
+                (link.connection._sock_ip_send, link.connection._sock_port_send))
+            link._heartbeatSentAt = now
+        except OSError:
+            link._heartbeatSentAt = now
+
+    def _onReadable(self, link):
+        sock = link.connection._sock_receive
+        sock.setblocking(False)
+        try:
+            while True:
+                sock.recv(2048)
+                now = time.monotonic()
+                if link._heartbeatSentAt is not None:
+                    link.rtts.append(now - link._heartbeatSentAt)
+                    link._heartbeatSentAt = None
+                    link.heartbeatAnswered = True
+                link.connection._lastActivity = now
+        except OSError:
+            pass
+        finally:
+            sock.settimeout(link.connection._receiveTimeout)
+
+    def _reconnect(self, link):
+        # Back off: only retry every maxMissed missed heartbeats
+        if link.missed % self._maxMissed:
+            return
+        print("[AKTRACK INFO] Link " + link.name + " is down, reconnecting.")
+        self._unwatch(link)
+        try:
+            link.connection.reconnectCommand()
+            link.reconnects += 1
+        except OSError:
+            import traceback
+            traceback.print_exc()
+        self._watch(link)
+
+    def _watch(self, link):
+        sock = link.connection._sock_receive
+        if sock:
+            self._eventLoop.register(sock, lambda: self._onReadable(link))
+            link._watchedSocket = sock
+
+    def _unwatch(self, link):
+        if link._watchedSocket:
+            self._eventLoop.unregister(link._watchedSocket)
+            link._watchedSocket = None
@@ -0,0 +1,123 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Occupancy heatmap of the board plane
+#
+
+import math
+import numpy as np
+from ControlRoomLib.UtilRecordArchive import recordingBlocks
+from ControlRoomLib.UtilReplay import boardPositions
+
+
+def _heatColors():
+    """
+    256 RGBA entries, black-red-yellow-white, transparent at zero.
+    """
+    level = np.linspace(0.0, 1.0, 256)
+    lut = np.empty((256, 4), dtype=np.uint8)
+    lut[:, 0] = np.clip(level * 3.0, 0, 1) * 255
+    lut[:, 1] = np.clip(level * 3.0 - 1.0, 0, 1) * 255
+    lut[:, 2] = np.clip(level * 3.0 - 2.0, 0, 1) * 255
+    lut[:, 3] = np.clip(level * 4.0, 0, 1) * 200
+    lut[0, 3] = 0
+    return lut
+
+
+class UtilHeatmap():
+    """
+    Preallocated 2D histogram of positions on the board plane, counts[iy, ix]
+    over bins of binSize mm covering extent (xmin, xmax, ymin, ymax), mm,
+    the board bounds of the scene. Positions outside it are counted in
+    `outside` only. Updates are in place: add() per pose, addBatch() binned
+    vectorized.
+    """
+
+    _lut = _heatColors()
+
+    def __init__(self, extent, binSize=5.0):
+        self.extent = tuple(float(i) for i in extent)
+        self.binSize = float(binSize)
+        xmin, xmax, ymin, ymax = self.extent
+        self.shape = (int(math.ceil((ymax - ymin) / binSize)), int(math.ceil((xmax - xmin) / binSize)))
+        self.counts = np.zeros(self.shape)
+        self._flat = self.counts.reshape(-1)
+        self._levels = np.empty(self.counts.size)
+        self.total = 0
+        self.outside = 0
+
+    def clear(self):
+        self.counts.fill(0)
+        self.total = 0
+        self.outside = 0
+
+    def add(self, x, y):
+        ix = int((x - self.extent[0]) // self.binSize)
+        iy = int((y - self.extent[2]) // self.binSize)
+        self.total += 1
+        if 0 <= ix < self.shape[1] and 0 <= iy < self.shape[0]:
+            self.counts[iy, ix] += 1
+        else:
+            self.outside += 1
+
+    def addBatch(self, x, y):
+        ix = np.floor((np.asarray(x) - self.extent[0]) / self.binSize).astype(np.intp)
+        iy = np.floor((np.asarray(y) - self.extent[2]) / self.binSize).astype(np.intp)
+        inside = (ix >= 0) & (ix < self.shape[1]) & (iy >= 0) & (iy < self.shape[0])
+        flat = iy[inside] * self.shape[1] + ix[inside]
+        self.total += ix.shape[0]
+        self.outside += ix.shape[0] - flat.shape[0]
+        if flat.shape[0] > self.counts.size // 16:
+            self._flat += np.bincount(flat, minlength=self.counts.size)
+        else:
+            np.add.at(self._flat, flat, 1)
+
+    def addPositions(self, positions):
+        """
+        Rows of board positions (x, y, ...).
+        """
+        self.addBatch(positions[:, 0], positions[:, 1])
+
+    def addRecording(self, path, calibration=None):
+        """
+        Accumulate a recorded (t, x, y) file, an archive or a CSV file, block
+        by block (see recordingBlocks, and boardPositions for calibration).
+        """
+        for block in recordingBlocks(path):
+            self.addPositions(boardPositions(block, calibration))
+
+    def rgba(self, out):
+        """
+        Write the heatmap as RGBA (rows of 4 uint8, x fastest) into out,
+        log-scaled to the densest bin.
+        """
+        peak = self.counts.max()
+        if peak <= 0:
+            out[:] = 0
+            return out
+        np.log1p(self._flat, out=self._levels)
+        self._levels *= 255.0 / math.log1p(peak)
+        out[:] = self._lut[self._levels.astype(np.uint8)]
+        return out
@@ -0,0 +1,47 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Message decoding
+#
+
+def parsePoseMsg(data):
+    """
+    Decode a "__msg_pose_<f>_<f>_..." tracker datagram (str) into floats.
+    Returns None for any other message.
+    """
+    if data.startswith("__msg_pose_"):
+        return [float(i) for i in data[11:].split("_")]
+    return None
+
+
+def parseGazeMsg(data):
+    """
+    Decode a "__msg_gaze_<t>_<x>_<y>[_<t>_<x>_<y>...]" goggle datagram
+    (bytes) into a flat list of floats, several samples per datagram
+    allowed. Returns None for any other message.
+    """
+    if data.startswith(b"__msg_gaze_"):
+        return [float(i) for i in data[11:].split(b"_")]
+    return None
@@ -0,0 +1,222 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Metrics
+#
+
+import functools
+import json
+import threading
+import time
+from collections import deque
+
+
+class UtilHistogram():
+    """
+    Count, sum and max of every observation, plus a bounded reservoir of
+    the most recent ones for percentiles.
+    """
+
+    def __init__(self, maxlen=4096):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=maxlen)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.recent.append(value)
+
+    def percentile(self, q):
+        if not self.recent:
+            return None
+        s = sorted(self.recent)
+        return s[min(len(s)-1, int(round(q / 100.0 * (len(s)-1))))]
+
+    def summary(self):
+        return {"count": self.count, \
+            "mean": self.total / self.count if self.count else None, \
+            "p50": self.percentile(50), "p99": self.percentile(99), "max": self.max}
+
+
+class _UtilSpan():
+
+    __slots__ = ("_metrics", "_name", "_t0")
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.observe(self._name, time.perf_counter() - self._t0)
+        return False
+
+
+class _UtilNullSpan():
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _UtilNullSpan()
+
+
+class UtilMetrics():
+    """
+    Counters, histograms and timing spans for the hot paths.
+    Disabled by default; while disabled every call returns after a single
+    attribute check. Timings are recorded in seconds.
+
+    Profiling (cProfile and tracemalloc) is toggled separately since it
+    slows everything down.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._counters = {}
+        self._histograms = {}
+        self._profiler = None
+        # Rigs record from their own event loop threads
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = UtilHistogram()
+            hist.observe(value)
+
+    def span(self, name):
+        """
+        with metrics.span("name"): ... records the duration of the block.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _UtilSpan(self, name)
+
+    def timed(self, name):
+        """
+        Decorator recording the duration of every call under name.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                t0 = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - t0)
+            return wrapper
+        return decorator
+
+    def isProfiling(self):
+        return self._profiler is not None
+
+    def startProfiling(self):
+        import cProfile
+        import tracemalloc
+        if self._profiler:
+            return
+        self._profiler = cProfile.Profile()
+        tracemalloc.start()
+        self._profiler.enable()
+
+    def stopProfiling(self, path=None, top=15):
+        """
+        Stop profiling. Writes the cProfile stats to path (pstats format)
+        if given and returns a text report of the top functions and
+        allocation sites.
+        """
+        import io
+        import pstats
+        import tracemalloc
+        if not self._profiler:
+            return ""
+        self._profiler.disable()
+        if path:
+            self._profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(top)
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        out.write("\nTop allocations:\n")
+        for stat in snapshot.statistics("lineno")[:top]:
+            out.write(str(stat) + "\n")
+        self._profiler = None
+        return out.getvalue()
+
+    def snapshot(self):
+        with self._lock:
+            return {"counters": dict(self._counters), \
+                "histograms": {k: v.summary() for k, v in self._histograms.items()}}
+
+    def report(self):
+        """
+        Human readable summary, timings in microseconds.
+        """
+        lines = []
+        snapshot = self.snapshot()
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append("%s: %d" % (name, value))
+        for name, s in sorted(snapshot["histograms"].items()):
+            lines.append("%s: n=%d mean=%.1f p50=%.1f p99=%.1f max=%.1f us" % \
+                (name, s["count"], s["mean"] * 1e6, s["p50"] * 1e6, \
+                s["p99"] * 1e6, s["max"] * 1e6))
+        return "\n".join(lines)
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=4)
+
+
+# Shared instance used by the connections and the module
+metrics = UtilMetrics()
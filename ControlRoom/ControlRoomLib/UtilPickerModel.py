@@ -0,0 +1,125 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Model-backed combo box pickers
+#
+
+
+def itemsDiff(old, new):
+    """
+    (start, removed, inserted) turning the list old into new by replacing
+    old[start:start+removed] with inserted, the common head and tail left
+    alone. Appending or removing an entry touches that entry only.
+    """
+    n = min(len(old), len(new))
+    start = 0
+    while start < n and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < n - start and old[len(old)-1-end] == new[len(new)-1-end]:
+        end += 1
+    return start, len(old) - start - end, new[start:len(new)-end]
+
+
+class UtilPickerModel():
+    """
+    Items of a QComboBox held in a QStandardItemModel behind a
+    QSortFilterProxyModel. setItems() only inserts and removes the rows
+    that changed, setFilter() narrows the listed rows to those containing
+    a text (case insensitive) without touching the items or the
+    selection. The combo box does not measure its items and its popup
+    lays out the visible rows only, so thousands of entries stay
+    responsive.
+    """
+
+    def __init__(self, combo, minimumContentsLength=16):
+        import qt
+        self._qt = qt
+        self.combo = combo
+        self.model = qt.QStandardItemModel()
+        self.proxy = qt.QSortFilterProxyModel()
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterCaseSensitivity(qt.Qt.CaseInsensitive)
+        combo.setModel(self.proxy)
+        combo.sizeAdjustPolicy = qt.QComboBox.AdjustToMinimumContentsLengthWithIcon
+        combo.minimumContentsLength = minimumContentsLength
+        combo.view().uniformItemSizes = True
+        self._items = []
+        self._filter = ""
+
+    def items(self):
+        return list(self._items)
+
+    def setItems(self, items):
+        """
+        Show items (strings), in order. Returns True if anything changed.
+        """
+        items = list(items)
+        start, removed, inserted = itemsDiff(self._items, items)
+        if not removed and not inserted:
+            return False
+        if removed:
+            self.model.removeRows(start, removed)
+        for i, text in enumerate(inserted):
+            self.model.insertRow(start + i, self._qt.QStandardItem(text))
+        self._items = items
+        return True
+
+    def setFilter(self, text):
+        """
+        List the rows containing text, and the selected row whatever the
+        filter, so typing a filter never moves the selection. The row
+        numbers shifting under the selection are not signalled either.
+        """
+        self._filter = text
+        self._applyFilter(self.combo.currentText)
+
+    def _applyFilter(self, *pinned):
+        qt = self._qt
+        pattern = qt.QRegExp.escape(self._filter)
+        if self._filter:
+            for text in pinned:
+                if text:
+                    pattern += "|^" + qt.QRegExp.escape(text) + "$"
+        blocked = self.combo.blockSignals(True)
+        try:
+            self.proxy.setFilterRegExp(pattern)
+        finally:
+            self.combo.blockSignals(blocked)
+
+    def setCurrentText(self, text):
+        """
+        Select text, listing it alongside the filtered rows if the filter
+        hides it. Returns False if text is not an item.
+        """
+        index = self.combo.findText(text)
+        if index < 0 and text in self._items:
+            # The selection stays listed until it moves
+            self._applyFilter(self.combo.currentText, text)
+            index = self.combo.findText(text)
+        if index < 0:
+            return False
+        self.combo.setCurrentIndex(index)
+        return True
@@ -0,0 +1,150 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Streaming tracker pose filters
+#
+
+import math
+
+# Selectable by name (parameter "PoseFilter")
+POSE_FILTERS = ["none", "oneeuro", "kalman", "predict"]
+
+
+class UtilPoseFilter():
+    """
+    Filters the first `dims` values of each pose (the board plane
+    position), the rest is passed through. update() is O(1) in time and
+    memory per sample; t is the receive time in seconds.
+    """
+
+    def __init__(self, dims=2):
+        self._dims = dims
+        self.reset()
+
+    def reset(self):
+        self._tPrev = None
+
+    def update(self, t, pose):
+        dt = None if self._tPrev is None else max(t - self._tPrev, 1e-6)
+        self._tPrev = t
+        out = list(pose)
+        for i in range(self._dims):
+            out[i] = self._filterAxis(i, dt, pose[i])
+        return out
+
+    def _filterAxis(self, i, dt, x):
+        return x
+
+
+class UtilPoseFilterOneEuro(UtilPoseFilter):
+    """
+    One-euro filter (Casiez et al. 2012): a low-pass whose cutoff rises
+    with speed, smooth at rest and little lag when moving.
+    """
+
+    def __init__(self, minCutoff=1.0, beta=0.1, dCutoff=1.0, dims=2):
+        self._minCutoff = minCutoff
+        self._beta = beta
+        self._dCutoff = dCutoff
+        super().__init__(dims)
+
+    def reset(self):
+        super().reset()
+        self._x = [None] * self._dims
+        self._dx = [0.0] * self._dims
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def _filterAxis(self, i, dt, x):
+        if dt is None or self._x[i] is None:
+            self._x[i] = x
+            return x
+        a = self._alpha(self._dCutoff, dt)
+        self._dx[i] += a * ((x - self._x[i]) / dt - self._dx[i])
+        a = self._alpha(self._minCutoff + self._beta * abs(self._dx[i]), dt)
+        self._x[i] += a * (x - self._x[i])
+        return self._x[i]
+
+
+class UtilPoseFilterKalman(UtilPoseFilter):
+    """
+    Constant-velocity Kalman filter per axis, white acceleration noise
+    q (processNoise) and measurement variance r (measurementNoise).
+    A non-zero horizon (s) outputs the position extrapolated that far
+    ahead, compensating transport and display latency.
+    """
+
+    def __init__(self, processNoise=1e4, measurementNoise=1.0, horizon=0.0, dims=2):
+        self._q = processNoise
+        self._r = measurementNoise
+        self.horizon = horizon
+        super().__init__(dims)
+
+    def reset(self):
+        super().reset()
+        # State (position, velocity) and covariance (p00, p01, p11) per axis
+        self._s = [None] * self._dims
+
+    def _filterAxis(self, i, dt, z):
+        s = self._s[i]
+        if dt is None or s is None:
+            self._s[i] = [z, 0.0, self._r, 0.0, self._q]
+            return z
+        x, v, p00, p01, p11 = s
+        # Predict
+        q = self._q
+        x += v * dt
+        p00 += dt * (2 * p01 + dt * p11) + q * dt**3 / 3
+        p01 += dt * p11 + q * dt**2 / 2
+        p11 += q * dt
+        # Update
+        S = p00 + self._r
+        k0, k1 = p00 / S, p01 / S
+        y = z - x
+        x += k0 * y
+        v += k1 * y
+        p11 -= k1 * p01
+        p01 *= 1 - k0
+        p00 *= 1 - k0
+        s[:] = x, v, p00, p01, p11
+        return x + v * self.horizon
+
+
+def makePoseFilter(name):
+    """
+    Filter for one of POSE_FILTERS, None for "none".
+    """
+    if name == "oneeuro":
+        return UtilPoseFilterOneEuro()
+    if name == "kalman":
+        return UtilPoseFilterKalman()
+    if name == "predict":
+        return UtilPoseFilterKalman(horizon=0.03)
+    if name in ("none", "", None):
+        return None
+    raise ValueError("Unknown pose filter: " + str(name))
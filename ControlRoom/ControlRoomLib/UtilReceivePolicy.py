@@ -0,0 +1,113 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Receive policies
+#
+
+from collections import deque
+from ControlRoomLib.UtilMetrics import metrics
+
+
+class UtilReceivePolicy():
+    """
+    Decides which received datagrams of a non-blocking channel are handed
+    to the handler. Datagrams are pushed as they are drained from the
+    socket, then popped once the socket is empty.
+
+    Keeps count of what was received, handled and dropped. Drops are
+    also counted in UtilMetrics as <metricsName>.dropped (the connection
+    sets metricsName).
+    """
+
+    metricsName = "receive"
+
+    def __init__(self):
+        self.received = 0
+        self.handled = 0
+        self.dropped = 0
+
+    def push(self, data):
+        raise NotImplementedError
+
+    def pop(self):
+        """
+        Return the datagrams to handle, oldest first.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        return {"received": self.received, "handled": self.handled, "dropped": self.dropped}
+
+
+class UtilReceivePolicyLatest(UtilReceivePolicy):
+    """
+    Latest value wins. Of a burst, only the newest datagram is handled and
+    the superseded ones are counted as dropped. Meant for streams where
+    only the current value matters (tracker pose).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._latest = None
+
+    def push(self, data):
+        self.received += 1
+        if self._latest is not None:
+            self.dropped += 1
+            metrics.count(self.metricsName + ".dropped")
+        self._latest = data
+
+    def pop(self):
+        if self._latest is None:
+            return ()
+        data, self._latest = self._latest, None
+        self.handled += 1
+        return (data,)
+
+
+class UtilReceivePolicyQueued(UtilReceivePolicy):
+    """
+    Lossless, in order. Every datagram is handled. The queue is bounded
+    only to protect memory if the handler stalls; overflow is counted
+    as dropped. Meant for control and event channels (screen events).
+    """
+
+    def __init__(self, maxlen=4096):
+        super().__init__()
+        self._queue = deque()
+        self._maxlen = maxlen
+
+    def push(self, data):
+        self.received += 1
+        if len(self._queue) >= self._maxlen:
+            self._queue.popleft()
+            self.dropped += 1
+            metrics.count(self.metricsName + ".dropped")
+        self._queue.append(data)
+
+    def pop(self):
+        queue, self._queue = self._queue, deque()
+        self.handled += len(queue)
+        return queue
@@ -0,0 +1,249 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Chunked, compressed recording archive (.akrec)
+#
+# Layout: header | chunk 0 | chunk 1 | ... | index | trailer
+#   header   b"AKREC1\0\0", columns (u4), chunk rows (u4)
+#   chunk    zlib of: per column a decimal scale k (i1), then the columns
+#            as zigzagged deltas of int64 (value * 10**k when that is
+#            exact, e.g. CSV data, the float64 bits otherwise), byte-
+#            shuffled (all first bytes, then all second bytes, ...)
+#   index    per chunk: t first, t last (f8), offset, size, rows (i8)
+#   trailer  index offset (u8), chunk count (u4), b"AKIDX1\0\0"
+# The first column is the timestamp and must not decrease.
+#
+
+import itertools
+import os
+import struct
+import zlib
+import numpy as np
+
+ARCHIVE_EXT = ".akrec"
+
+_MAGIC = b"AKREC1\0\0"
+_MAGIC_INDEX = b"AKIDX1\0\0"
+_HEADER = struct.Struct("<8sII")
+_TRAILER = struct.Struct("<QI8s")
+_INDEX_DTYPE = np.dtype([("t0", "<f8"), ("t1", "<f8"), ("offset", "<i8"), ("size", "<i8"), ("rows", "<i8")])
+
+
+def _encodeChunk(block, level):
+    scales = np.full(block.shape[1], -1, dtype=np.int8)
+    ints = np.empty((block.shape[1], block.shape[0]), dtype=np.int64)
+    for c in range(block.shape[1]):
+        col = np.ascontiguousarray(block[:, c], dtype="<f8")
+        ints[c] = col.view("<i8")
+        with np.errstate(over="ignore", invalid="ignore"):
+            for k in range(10):
+                q = np.round(col * 10.0**k)
+                if np.all(np.abs(q) < 2**52) and np.array_equal(q / 10.0**k, col):
+                    scales[c] = k
+                    ints[c] = q.astype(np.int64)
+                    break
+    deltas = np.diff(ints, axis=1, prepend=0)
+    zigzag = (deltas << 1) ^ (deltas >> 63)
+    shuffled = np.ascontiguousarray(zigzag.view(np.uint8).reshape(-1, 8).T)
+    return zlib.compress(scales.tobytes() + shuffled.tobytes(), level)
+
+
+def _decodeChunk(payload, rows, columns):
+    raw = zlib.decompress(payload)
+    scales = np.frombuffer(raw[:columns], dtype=np.int8)
+    shuffled = np.frombuffer(raw[columns:], dtype=np.uint8).reshape(8, -1)
+    zigzag = np.ascontiguousarray(shuffled.T).view("<u8").reshape(columns, rows)
+    ints = np.cumsum(((zigzag >> 1) ^ (0 - (zigzag & 1))).view(np.int64), axis=1)
+    data = np.empty((rows, columns))
+    for c in range(columns):
+        data[:, c] = ints[c] / 10.0**scales[c] if scales[c] >= 0 else ints[c].view("<f8")
+    return data
+
+
+class UtilRecordArchiveWriter():
+    """
+    Appends rows to a new archive, one compressed chunk every chunkRows
+    rows. The index is written by close(); an archive that was not closed
+    cannot be opened.
+    """
+
+    def __init__(self, path, columns, chunkRows=4096, level=6):
+        self._path = path
+        self._columns = columns
+        self._chunkRows = chunkRows
+        self._level = level
+        self._pending = []
+        self._pendingRows = 0
+        self._index = []
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(_MAGIC, columns, chunkRows))
+
+    def append(self, row):
+        self.extend([row])
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=float).reshape(-1, self._columns)
+        self._pending.append(rows)
+        self._pendingRows += rows.shape[0]
+        if self._pendingRows >= self._chunkRows:
+            block = np.concatenate(self._pending)
+            n = block.shape[0] - block.shape[0] % self._chunkRows
+            for i in range(0, n, self._chunkRows):
+                self._writeChunk(block[i:i+self._chunkRows])
+            self._pending = [block[n:]]
+            self._pendingRows = block.shape[0] - n
+
+    def _writeChunk(self, block):
+        payload = _encodeChunk(block, self._level)
+        self._index.append((block[0, 0], block[-1, 0], self._file.tell(), len(payload), block.shape[0]))
+        self._file.write(payload)
+
+    def close(self):
+        if not self._file:
+            return
+        if self._pendingRows:
+            self._writeChunk(np.concatenate(self._pending))
+        self._pending = []
+        offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=_INDEX_DTYPE).tobytes())
+        self._file.write(_TRAILER.pack(offset, len(self._index), _MAGIC_INDEX))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class UtilRecordArchive():
+    """
+    Read access to an archive. Opening reads the header and the chunk
+    index only; chunk(i) decompresses a single chunk, so seeking in a long
+    recording costs one index search and one chunk.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        with open(path, "rb") as f:
+            magic, self.columns, self.chunkRows = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(path + " is not a recording archive")
+            f.seek(-_TRAILER.size, 2)
+            offset, count, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+            if magic != _MAGIC_INDEX:
+                raise ValueError(path + " has no chunk index (not closed?)")
+            f.seek(offset)
+            self.index = np.frombuffer(f.read(count * _INDEX_DTYPE.itemsize), dtype=_INDEX_DTYPE)
+        self.t_min = float(self.index["t0"][0]) if count else 0.0
+        self.t_max = float(self.index["t1"][-1]) if count else 0.0
+
+    def chunkCount(self):
+        return self.index.shape[0]
+
+    def rows(self):
+        return int(self.index["rows"].sum())
+
+    def chunkAt(self, t):
+        """
+        Index of the chunk holding the last row at or before t.
+        """
+        return max(int(np.searchsorted(self.index["t0"], t, side='right')) - 1, 0)
+
+    def chunk(self, i):
+        """
+        Rows of chunk i (decompressed; safe to call from a worker thread).
+        """
+        entry = self.index[i]
+        with open(self._path, "rb") as f:
+            f.seek(int(entry["offset"]))
+            payload = f.read(int(entry["size"]))
+        return _decodeChunk(payload, int(entry["rows"]), self.columns)
+
+    def read(self, t0=None, t1=None):
+        """
+        Rows with t0 <= t < t1, decompressing only the chunks involved.
+        """
+        first = 0 if t0 is None else self.chunkAt(t0)
+        last = self.chunkCount() if t1 is None else \
+            int(np.searchsorted(self.index["t0"], t1, side='left'))
+        if last <= first:
+            return np.zeros((0, self.columns))
+        data = np.concatenate([self.chunk(i) for i in range(first, last)])
+        lo = 0 if t0 is None else int(np.searchsorted(data[:, 0], t0, side='left'))
+        hi = data.shape[0] if t1 is None else int(np.searchsorted(data[:, 0], t1, side='left'))
+        return data[lo:hi]
+
+
+def csvToArchive(csvPath, archivePath=None, chunkRows=4096, level=6):
+    """
+    Convert a recorded CSV (numeric, timestamp first) to an archive,
+    streaming chunkRows lines at a time. Returns the archive path.
+    """
+    if archivePath is None:
+        archivePath = csvPath.rsplit(".", 1)[0] + ARCHIVE_EXT
+    writer = None
+    for block in recordingBlocks(csvPath, chunkRows):
+        if writer is None:
+            writer = UtilRecordArchiveWriter(archivePath, block.shape[1], chunkRows, level)
+        writer.extend(block)
+    if writer is None:
+        raise ValueError(csvPath + " is empty")
+    writer.close()
+    return archivePath
+
+
+def recordingDataSpan(path):
+    """
+    (offset, size) in bytes of the rows of a recording: the chunks of an
+    archive (header, index and trailer excluded), the whole of a CSV file.
+    """
+    if path.endswith(ARCHIVE_EXT):
+        index = UtilRecordArchive(path).index
+        if not index.shape[0]:
+            return _HEADER.size, 0
+        start = int(index["offset"][0])
+        return start, int(index["offset"][-1] + index["size"][-1]) - start
+    return 0, os.path.getsize(path)
+
+
+def recordingBlocks(path, chunkRows=4096):
+    """
+    Rows of a recording, an archive (.akrec) or a CSV file, as a sequence
+    of 2D blocks: archive chunks as stored, CSV files chunkRows lines at a
+    time, so a recording of any length is read in bounded memory.
+    """
+    if path.endswith(ARCHIVE_EXT):
+        archive = UtilRecordArchive(path)
+        for i in range(archive.chunkCount()):
+            yield archive.chunk(i)
+        return
+    with open(path) as f:
+        while True:
+            lines = list(itertools.islice(f, chunkRows))
+            if not lines:
+                break
+            yield np.loadtxt(lines, delimiter=",", ndmin=2)
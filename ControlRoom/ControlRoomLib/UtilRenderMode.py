@@ -0,0 +1,151 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Low-latency render mode for the live indicator
+#
+
+import time
+from collections import deque
+
+from ControlRoomLib.UtilMetrics import UtilHistogram, metrics
+
+
+class UtilFrameRate():
+    """
+    Frames per second over the last window seconds, and the render cost
+    of each frame.
+    """
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self._frames = deque()
+        self.frameTime = UtilHistogram(maxlen=1024)
+
+    def tick(self, cost, t=None):
+        t = time.perf_counter() if t is None else t
+        self._frames.append(t)
+        self.frameTime.observe(cost)
+
+    def fps(self, t=None):
+        t = time.perf_counter() if t is None else t
+        while self._frames and self._frames[0] < t - self.window:
+            self._frames.popleft()
+        return len(self._frames) / self.window
+
+    def report(self):
+        s = self.frameTime.summary()
+        if not s["count"]:
+            return "no frames"
+        return "%.0f fps, frame %.2f ms (p99 %.2f ms)" % (self.fps(), s["p50"] * 1000.0, s["p99"] * 1000.0)
+
+
+class UtilRenderMode():
+    """
+    While active the layout is the 3D view alone, the slice views are
+    paused, the models given to enter() are hidden from the slice views
+    (no slice intersection pipelines) and the 3D view's box and axis
+    labels are off. The caller updates its transforms and then calls
+    requestRender(), which renders the 3D view at once, or at most
+    maxFps times a second (pending requests coalesce into one render).
+    leave() restores everything.
+    """
+
+    def __init__(self, maxFps=120.0):
+        self.active = False
+        self.maxFps = maxFps
+        self.frameRate = UtilFrameRate()
+        self._view = None
+        self._lastRender = 0.0
+        self._pending = False
+        self._saved = None
+
+    def enter(self, displayNodes=()):
+        import slicer
+        if self.active:
+            return
+        layoutManager = slicer.app.layoutManager()
+        saved = {"layout": layoutManager.layout, "paused": [], "visibility2D": []}
+        layoutManager.setLayout(slicer.vtkMRMLLayoutNode.SlicerLayoutOneUp3DView)
+        for name in layoutManager.sliceViewNames():
+            view = layoutManager.sliceWidget(name).sliceView()
+            view.setRenderPaused(True)
+            saved["paused"].append(view)
+        for displayNode in displayNodes:
+            saved["visibility2D"].append((displayNode, displayNode.GetVisibility2D()))
+            displayNode.SetVisibility2D(False)
+        self._view = layoutManager.threeDWidget(0).threeDView()
+        viewNode = self._view.mrmlViewNode()
+        saved["view"] = (viewNode, viewNode.GetBoxVisible(), viewNode.GetAxisLabelsVisible())
+        viewNode.SetBoxVisible(False)
+        viewNode.SetAxisLabelsVisible(False)
+        self._saved = saved
+        self.frameRate = UtilFrameRate()
+        self.active = True
+
+    def leave(self):
+        import slicer
+        if not self.active:
+            return
+        self.active = False
+        saved = self._saved
+        for view in saved["paused"]:
+            view.setRenderPaused(False)
+        for displayNode, visible in saved["visibility2D"]:
+            displayNode.SetVisibility2D(visible)
+        viewNode, box, labels = saved["view"]
+        viewNode.SetBoxVisible(box)
+        viewNode.SetAxisLabelsVisible(labels)
+        slicer.app.layoutManager().setLayout(saved["layout"])
+        self._view = None
+        self._saved = None
+
+    def requestRender(self):
+        """
+        Render the 3D view for the latest state, returns False if the mode
+        is not active (the caller falls back to the normal refresh).
+        """
+        if not self.active:
+            return False
+        if self._pending:
+            return True
+        wait = self._lastRender + 1.0 / self.maxFps - time.perf_counter()
+        if wait <= 0:
+            self._render()
+        else:
+            import qt
+            self._pending = True
+            qt.QTimer.singleShot(int(wait * 1000) + 1, self._render)
+        return True
+
+    def _render(self):
+        self._pending = False
+        if not self.active:
+            return
+        t0 = time.perf_counter()
+        self._view.forceRender()
+        t1 = time.perf_counter()
+        self._lastRender = t1
+        self.frameRate.tick(t1 - t0, t1)
+        metrics.observe("render.frame", t1 - t0)
@@ -0,0 +1,154 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Replay
+#
+
+import queue
+import threading
+import numpy as np
+from ControlRoomLib.UtilCalibration import UtilCalibration
+from ControlRoomLib.UtilRecordArchive import ARCHIVE_EXT, UtilRecordArchive
+
+DEFAULT_CALIBRATION = UtilCalibration()
+
+
+def boardPositions(data, calibration=None):
+    """
+    Board positions (mm) of recorded (t, x, y) rows (m), mapped with
+    calibration (a UtilCalibration, the uncalibrated mapping if None).
+    """
+    positions = np.zeros((data.shape[0], 3))
+    positions[:, 0:2] = (calibration or DEFAULT_CALIBRATION).apply(data[:, 1:3])
+    return positions
+
+
+class UtilReplayData():
+    """
+    Recorded tracker data (t, x, y) prepared for replay.
+    Board positions are computed once for the whole recording, so a frame
+    is a binary search plus a row lookup.
+    """
+
+    def __init__(self, data, playspeed=1.0, calibration=None):
+        data = np.asarray(data, dtype=float)[:, 0:3] # t, x, y
+        self._t = data[:, 0] / float(playspeed)
+        self._positions = boardPositions(data, calibration)
+        self.t_max = np.max(self._t)
+
+    @staticmethod
+    def open(path, playspeed=1.0, calibration=None):
+        """
+        Replay of a recording, an archive (.akrec) or a CSV file.
+        """
+        if path.endswith(ARCHIVE_EXT):
+            return UtilReplayArchive(UtilRecordArchive(path), playspeed, calibration=calibration)
+        return UtilReplayData.fromCsv(path, playspeed, calibration)
+
+    @classmethod
+    def fromCsv(cls, path, playspeed=1.0, calibration=None):
+        data = np.loadtxt(path, delimiter=",", usecols=(0, 1, 2), ndmin=2)
+        return cls(data, playspeed, calibration)
+
+    def indexAt(self, t):
+        """
+        Index of the last sample at or before t (first sample if t is before it).
+        """
+        return max(int(np.searchsorted(self._t, t, side='right')) - 1, 0)
+
+    def positionAt(self, t):
+        return self._positions[self.indexAt(t)]
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return self._t.shape[0]
+
+
+class UtilReplayArchive():
+    """
+    Replay of a recording archive, same interface as UtilReplayData.
+    Only the chunk under the cursor is held decompressed, plus the next
+    `ahead` ones, which a worker thread decompresses ahead of playback.
+    """
+
+    def __init__(self, archive, playspeed=1.0, ahead=2, calibration=None):
+        self._archive = archive
+        self._playspeed = float(playspeed)
+        self._calibration = calibration
+        self._ahead = ahead
+        self._chunks = {}
+        self._lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._current = -1
+        self.t_max = archive.t_max / self._playspeed
+        self._worker = threading.Thread(target=self._prefetch, daemon=True)
+        self._worker.start()
+
+    def _load(self, i):
+        data = self._archive.chunk(i)
+        return data[:, 0] / self._playspeed, boardPositions(data, self._calibration)
+
+    def _prefetch(self):
+        while True:
+            i = self._requests.get()
+            if i is None:
+                return
+            with self._lock:
+                if i in self._chunks or not self._current <= i <= self._current + self._ahead:
+                    continue
+            chunk = self._load(i)
+            with self._lock:
+                if self._current <= i <= self._current + self._ahead:
+                    self._chunks[i] = chunk
+
+    def _chunk(self, i):
+        with self._lock:
+            chunk = self._chunks.get(i)
+        if chunk is None:
+            chunk = self._load(i)
+        if i != self._current:
+            with self._lock:
+                self._current = i
+                self._chunks[i] = chunk
+                for k in [k for k in self._chunks if not i <= k <= i + self._ahead]:
+                    del self._chunks[k]
+            for k in range(i + 1, min(i + self._ahead + 1, self._archive.chunkCount())):
+                self._requests.put(k)
+        return chunk
+
+    def positionAt(self, t):
+        t_chunk, positions = self._chunk(self._archive.chunkAt(t * self._playspeed))
+        return positions[max(int(np.searchsorted(t_chunk, t, side='right')) - 1, 0)]
+
+    def close(self):
+        """
+        Stop the prefetch worker.
+        """
+        self._requests.put(None)
+
+    def __len__(self):
+        return self._archive.rows()
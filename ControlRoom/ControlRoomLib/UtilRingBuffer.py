@@ -0,0 +1,81 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Ring buffer
+#
+
+import numpy as np
+
+
+class UtilRingBuffer():
+    """
+    Fixed capacity ring of numeric rows, preallocated once. When full,
+    the oldest rows are overwritten. written counts every row ever added.
+    """
+
+    def __init__(self, capacity, columns):
+        self._data = np.zeros((capacity, columns))
+        self._capacity = capacity
+        self.written = 0
+
+    def append(self, row):
+        self._data[self.written % self._capacity] = row
+        self.written += 1
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=float).reshape(-1, self._data.shape[1])
+        n = rows.shape[0]
+        if n >= self._capacity:
+            rows = rows[-self._capacity:]
+            self.written += n - self._capacity
+            n = self._capacity
+        start = self.written % self._capacity
+        first = min(n, self._capacity - start)
+        self._data[start:start+first] = rows[:first]
+        self._data[:n-first] = rows[first:]
+        self.written += n
+
+    def latest(self):
+        """
+        Newest row (a view), None if empty.
+        """
+        if not self.written:
+            return None
+        return self._data[(self.written - 1) % self._capacity]
+
+    def recent(self, n=None):
+        """
+        The newest n rows (all held rows if None), oldest first, as a copy.
+        """
+        held = len(self)
+        n = held if n is None else min(n, held)
+        idx = np.arange(self.written - n, self.written) % self._capacity
+        return self._data[idx]
+
+    def clear(self):
+        self.written = 0
+
+    def __len__(self):
+        return min(self.written, self._capacity)
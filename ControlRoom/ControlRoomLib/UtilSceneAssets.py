@@ -0,0 +1,146 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Scene assets (board and tracker indicator meshes)
+#
+
+import numpy as np
+
+_STL_TRIANGLE = np.dtype([("normal", "<f4", 3), ("vertices", "<f4", (3, 3)), ("attributes", "<u2")])
+
+# Render-ready meshes, loaded and processed once per process,
+# keyed by (path, maxTriangles)
+_polyDataCache = {}
+
+
+def loadRenderMesh(path, maxTriangles=20000):
+    """
+    Read an STL once per process and keep a render-optimized copy:
+    triangulated, decimated down to about maxTriangles and with point
+    normals computed. Returns the cached vtkPolyData (do not modify it).
+    """
+    key = (path, maxTriangles)
+    polyData = _polyDataCache.get(key)
+    if polyData is not None:
+        return polyData
+
+    import vtk
+    reader = vtk.vtkSTLReader()
+    reader.SetFileName(path)
+    triangles = vtk.vtkTriangleFilter()
+    triangles.SetInputConnection(reader.GetOutputPort())
+    triangles.Update()
+    output = triangles.GetOutputPort()
+    nCells = triangles.GetOutput().GetNumberOfCells()
+    if maxTriangles and nCells > maxTriangles:
+        decimate = vtk.vtkQuadricDecimation()
+        decimate.SetInputConnection(output)
+        decimate.SetTargetReduction(1.0 - float(maxTriangles) / nCells)
+        output = decimate.GetOutputPort()
+    normals = vtk.vtkPolyDataNormals()
+    normals.SetInputConnection(output)
+    normals.SplittingOff()
+    normals.Update()
+
+    polyData = vtk.vtkPolyData()
+    polyData.DeepCopy(normals.GetOutput())
+    _polyDataCache[key] = polyData
+    return polyData
+
+
+def stlBounds(path):
+    """
+    (xmin, xmax, ymin, ymax, zmin, zmax) of an STL file, binary or ASCII,
+    read without VTK (as vtkPolyData.GetBounds() gives it).
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    count = int(np.frombuffer(data, "<u4", 1, 80)[0]) if len(data) >= 84 else -1
+    if len(data) == 84 + count * _STL_TRIANGLE.itemsize:
+        points = np.frombuffer(data, _STL_TRIANGLE, count, 84)["vertices"].reshape(-1, 3)
+    else:
+        points = np.array([line.split()[1:4] for line in data.decode("ascii", "replace").splitlines() \
+            if line.strip().startswith("vertex")], dtype=float).reshape(-1, 3)
+    if not points.shape[0]:
+        raise ValueError(path + " has no triangles")
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    return tuple(float(v) for pair in zip(lo, hi) for v in pair)
+
+
+class UtilSceneAssets():
+    """
+    Creates model nodes from the cached meshes. Nodes share the cached
+    mesh data (shallow copy), so adding them again after a scene clear
+    costs neither file I/O nor mesh processing.
+    """
+
+    def __init__(self, configPath, maxTriangles=20000):
+        self._configPath = configPath
+        self._maxTriangles = maxTriangles
+
+    def preload(self, names):
+        for name in names:
+            loadRenderMesh(self._configPath + name, self._maxTriangles)
+
+    def addModel(self, name, color, nodeName=None):
+        return self._addPolyData(loadRenderMesh(self._configPath + name, self._maxTriangles), \
+            color, nodeName if nodeName else name.rsplit(".", 1)[0])
+
+    def addSphere(self, radius, color, nodeName):
+        key = ("sphere", radius)
+        polyData = _polyDataCache.get(key)
+        if polyData is None:
+            import vtk
+            sphere = vtk.vtkSphereSource()
+            sphere.SetRadius(radius)
+            sphere.Update()
+            polyData = _polyDataCache[key] = sphere.GetOutput()
+        return self._addPolyData(polyData, color, nodeName)
+
+    def addPlane(self, extent, z, nodeName):
+        """
+        Rectangle (xmin, xmax, ymin, ymax) at height z, texture coordinates
+        running along x and y.
+        """
+        key = ("plane", tuple(extent), z)
+        polyData = _polyDataCache.get(key)
+        if polyData is None:
+            import vtk
+            plane = vtk.vtkPlaneSource()
+            plane.SetOrigin(extent[0], extent[2], z)
+            plane.SetPoint1(extent[1], extent[2], z)
+            plane.SetPoint2(extent[0], extent[3], z)
+            plane.Update()
+            polyData = _polyDataCache[key] = plane.GetOutput()
+        return self._addPolyData(polyData, (1,1,1), nodeName)
+
+    def _addPolyData(self, cached, color, nodeName):
+        import slicer, vtk
+        polyData = vtk.vtkPolyData()
+        polyData.ShallowCopy(cached)
+        modelNode = slicer.modules.models.logic().AddModel(polyData)
+        modelNode.SetName(nodeName)
+        modelNode.GetDisplayNode().SetColor(*color)
+        return modelNode
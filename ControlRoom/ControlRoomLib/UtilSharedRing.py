@@ -0,0 +1,208 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Shared memory ring of numeric rows, single producer / single consumer
+#
+# Layout of the segment:
+#   0   b"AKSHM1\0\0"
+#   8   capacity (u4), columns (u4)
+#   16  rows published so far (u8), written last by the producer
+#   24  generation (u8), random per segment, so a reader can tell the
+#       segment under the name was replaced
+#   64  capacity slots of: sequence (u8), columns f8
+# Row n goes to slot n % capacity. The producer sets the slot sequence to
+# 2n+1 while writing the row and to 2n+2 once it is complete, then
+# publishes n+1. A reader copies the row between two reads of the
+# sequence and keeps it only if both are 2n+2 (a seqlock), so it never
+# blocks the producer and never sees a torn row. Reading is plain memory
+# access: no system call, no decoding.
+#
+
+import os
+from multiprocessing import shared_memory
+import numpy as np
+
+_MAGIC = b"AKSHM1\0\0"
+_SLOTS_OFFSET = 64
+
+# Segments created by writers of this process
+_created = set()
+
+
+def _views(buf, capacity, columns):
+    head = np.ndarray((1,), dtype="<u8", buffer=buf, offset=16)
+    slots = np.ndarray((capacity,), dtype=[("seq", "<u8"), ("row", "<f8", (columns,))], \
+        buffer=buf, offset=_SLOTS_OFFSET)
+    return head, slots
+
+
+def _attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix" and name not in _created:
+        # The producer owns the segment: do not let this process's
+        # resource tracker unlink it when the reader exits
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+    return shm
+
+
+def sharedRingSize(capacity, columns):
+    return _SLOTS_OFFSET + capacity * 8 * (columns + 1)
+
+
+class UtilSharedRingWriter():
+    """
+    Producer side. Creates the named segment (replacing a stale one left
+    by a crashed producer) and unlinks it on close.
+    """
+
+    def __init__(self, name, capacity=1024, columns=4):
+        size = sharedRingSize(capacity, columns)
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created.add(name)
+        self.name = name
+        self.capacity = capacity
+        self.columns = columns
+        buf = self._shm.buf
+        buf[0:8] = _MAGIC
+        buf[8:16] = np.array([capacity, columns], dtype="<u4").tobytes()
+        buf[24:32] = os.urandom(8)
+        self._head, self._slots = _views(buf, capacity, columns)
+        self._head[0] = 0
+        self._seq = self._slots["seq"]
+        self._rows = self._slots["row"]
+        self.written = 0
+
+    def append(self, row):
+        n = self.written
+        i = n % self.capacity
+        self._seq[i] = 2 * n + 1
+        self._rows[i] = row
+        self._seq[i] = 2 * n + 2
+        self.written = n + 1
+        self._head[0] = n + 1
+
+    def close(self):
+        if self._shm is None:
+            return
+        self._head = self._slots = self._seq = self._rows = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+        _created.discard(self.name)
+
+
+class UtilSharedRingReader():
+    """
+    Consumer side, attached to the segment of a running producer
+    (FileNotFoundError until there is one). latest() is for display,
+    read() hands over every row in order as long as the reader keeps up
+    within capacity rows.
+    """
+
+    def __init__(self, name, retries=8):
+        self._shm = _attach(name)
+        buf = self._shm.buf
+        if bytes(buf[0:8]) != _MAGIC:
+            self._shm.close()
+            raise ValueError(name + " is not a shared ring")
+        self.generation = bytes(buf[24:32])
+        self.capacity, self.columns = [int(i) for i in np.frombuffer(buf, dtype="<u4", count=2, offset=8)]
+        self._head, self._slots = _views(buf, self.capacity, self.columns)
+        self._seq = self._slots["seq"]
+        self._rows = self._slots["row"]
+        self._retries = retries
+        self.name = name
+
+    @property
+    def written(self):
+        return int(self._head[0])
+
+    def latest(self):
+        """
+        (index, row copy) of the newest complete row, None if there is none.
+        """
+        for attempt in range(self._retries):
+            n = int(self._head[0])
+            if n == 0:
+                return None
+            i = (n - 1) % self.capacity
+            seq = int(self._seq[i])
+            row = self._rows[i].copy()
+            if seq == 2 * n and int(self._seq[i]) == seq:
+                return n - 1, row
+        return None
+
+    def read(self, since):
+        """
+        (first index, rows) of the complete rows from index since on, as a
+        copy. Rows overwritten before the reader got to them are skipped,
+        the first index tells how many.
+        """
+        n = int(self._head[0])
+        # Leave the slot the producer may be rewriting next
+        since = max(since, n - self.capacity + 1, 0)
+        if since >= n:
+            return since, np.empty((0, self.columns))
+        idx = np.arange(since, n) % self.capacity
+        seq = self._seq[idx].copy()
+        rows = self._rows[idx]
+        valid = (seq == 2 * np.arange(since, n, dtype=np.uint64) + 2) & (self._seq[idx] == seq)
+        if not valid.all():
+            # Rows before the last torn or overwritten one are as stale
+            skip = int(np.nonzero(~valid)[0][-1]) + 1
+            return since + skip, rows[skip:]
+        return since, rows
+
+    def isCurrent(self):
+        """
+        False if the segment was unlinked or replaced (e.g. the producer
+        restarted) since the reader attached. Opens the name again, so
+        meant to be called now and then, e.g. when no row came for a while.
+        """
+        try:
+            shm = _attach(self.name)
+        except FileNotFoundError:
+            return False
+        try:
+            return bytes(shm.buf[0:8]) == _MAGIC and bytes(shm.buf[24:32]) == self.generation
+        finally:
+            shm.close()
+
+    def close(self):
+        if self._shm is None:
+            return
+        self._head = self._slots = self._seq = self._rows = None
+        self._shm.close()
+        self._shm = None
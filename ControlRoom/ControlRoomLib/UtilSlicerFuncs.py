@@ -18,8 +18,11 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import vtk, math, slicer, json
+# Helpers only call methods of the vtkMatrix4x4 they are given,
+# so importing this module does not load vtk or slicer.
 
+import sys
+import threading
 
 def setTranslation(p, T):
     T.SetElement(0,3,p[0])
@@ -39,4 +42,15 @@ def setRotation(rotm, T):
 
 def setTransform(rotm, p, T):
     setRotation(rotm, T)
-    setTranslation(p, T)
\ No newline at end of file
+    setTranslation(p, T)
+
+def errorDisplay(msg):
+    """
+    Show msg in a Slicer error popup, or print it when running headless
+    or off the GUI thread (e.g. from a rig's event loop thread).
+    """
+    slicer = sys.modules.get("slicer")
+    if hasattr(slicer, "util") and threading.current_thread() is threading.main_thread():
+        slicer.util.errorDisplay(msg)
+    else:
+        print("[AKTRACK ERROR] " + msg)
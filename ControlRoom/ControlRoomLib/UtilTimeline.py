@@ -0,0 +1,184 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Timeline of the tracker, gaze and event streams
+#
+
+import time
+import numpy as np
+
+
+class UtilTimelineStream():
+    """
+    Fixed capacity columnar stream: a timestamp column and value columns.
+
+    Each row is written twice, at i and i+capacity of arrays twice the
+    capacity, so the last `capacity` rows are always contiguous: window
+    queries are a binary search on the timestamps and return views, never
+    copies. Timestamps must not decrease.
+    """
+
+    def __init__(self, capacity, columns):
+        self._capacity = capacity
+        self._t = np.zeros(2 * capacity)
+        self._v = np.zeros((2 * capacity, columns))
+        self.written = 0
+
+    def append(self, t, row):
+        i = self.written % self._capacity
+        self._t[i] = self._t[i + self._capacity] = t
+        self._v[i] = self._v[i + self._capacity] = row
+        self.written += 1
+
+    def extend(self, t, rows):
+        t = np.asarray(t, dtype=float)
+        rows = np.asarray(rows, dtype=float).reshape(t.shape[0], -1)
+        if t.shape[0] > self._capacity:
+            self.written += t.shape[0] - self._capacity
+            t, rows = t[-self._capacity:], rows[-self._capacity:]
+        idx = (self.written + np.arange(t.shape[0])) % self._capacity
+        self._t[idx] = self._t[idx + self._capacity] = t
+        self._v[idx] = self._v[idx + self._capacity] = rows
+        self.written += t.shape[0]
+
+    def _span(self):
+        n = min(self.written, self._capacity)
+        end = self.written % self._capacity
+        if self.written > self._capacity or end == 0 and self.written:
+            end += self._capacity
+        return end - n, end
+
+    def times(self):
+        start, end = self._span()
+        return self._t[start:end]
+
+    def values(self):
+        start, end = self._span()
+        return self._v[start:end]
+
+    def tail(self, n):
+        """
+        Last n rows (at most the retained ones), as (times, values) views.
+        """
+        start, end = self._span()
+        start = max(start, end - n)
+        return self._t[start:end], self._v[start:end]
+
+    def window(self, t0, t1):
+        """
+        Rows with t0 <= t < t1, as (times, values) views.
+        """
+        start, end = self._span()
+        t = self._t[start:end]
+        i0 = int(np.searchsorted(t, t0, side='left'))
+        i1 = int(np.searchsorted(t, t1, side='left'))
+        return t[i0:i1], self._v[start+i0:start+i1]
+
+    def resample(self, times):
+        """
+        Values linearly interpolated at times (held at the ends).
+        Returns an array of len(times) x columns.
+        """
+        t, v = self.times(), self.values()
+        times = np.asarray(times, dtype=float)
+        out = np.empty((times.shape[0], v.shape[1]))
+        if t.shape[0] == 0:
+            out.fill(np.nan)
+            return out
+        for c in range(v.shape[1]):
+            out[:, c] = np.interp(times, t, v[:, c])
+        return out
+
+    def sampleAndHold(self, times):
+        """
+        Last value at or before each of times (NaN before the first one),
+        for event-like streams that must not be interpolated.
+        """
+        t, v = self.times(), self.values()
+        idx = np.searchsorted(t, np.asarray(times, dtype=float), side='right') - 1
+        if t.shape[0] == 0:
+            return np.full((idx.shape[0], v.shape[1]), np.nan)
+        out = v[np.maximum(idx, 0)].copy()
+        out[idx < 0] = np.nan
+        return out
+
+    def __len__(self):
+        return min(self.written, self._capacity)
+
+
+class UtilTimeline():
+    """
+    Named streams on one monotonic clock (time.monotonic seconds).
+    Event streams keep one code column; labels are mapped to codes
+    through eventCode()/eventLabel().
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self._codes = {}
+        self._labels = []
+
+    def addStream(self, name, columns, capacity=100000):
+        self._streams[name] = UtilTimelineStream(capacity, columns)
+        return self._streams[name]
+
+    def stream(self, name):
+        return self._streams[name]
+
+    def names(self):
+        return list(self._streams.keys())
+
+    def ingest(self, name, row, t=None):
+        self._streams[name].append(time.monotonic() if t is None else t, row)
+
+    def ingestEvent(self, name, label, t=None):
+        self.ingest(name, (self.eventCode(label),), t)
+
+    def eventCode(self, label):
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self._labels)
+            self._labels.append(label)
+        return code
+
+    def eventLabel(self, code):
+        return self._labels[int(code)]
+
+    def window(self, name, t0, t1):
+        return self._streams[name].window(t0, t1)
+
+    def clock(self, t0, t1, rate):
+        """
+        Common clock from t0 to t1 at rate Hz.
+        """
+        return np.arange(t0, t1, 1.0 / rate)
+
+    def synchronized(self, names, times, events=()):
+        """
+        {name: values at times} for each stream: interpolated, or held
+        for the streams listed in events.
+        """
+        return {name: self._streams[name].sampleAndHold(times) if name in events \
+            else self._streams[name].resample(times) for name in names}
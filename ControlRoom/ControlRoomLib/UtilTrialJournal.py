@@ -0,0 +1,132 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Trial journal
+#
+
+import json
+import os
+import time
+
+
+class UtilTrialJournal():
+    """
+    Append-only journal of session transitions (trial start, stop,
+    complete, sequence applied). Every record carries the full session
+    state, so recovery only needs the last record: restore reads a small
+    block from the end of the file, whatever its length.
+
+    Records are flushed to the OS on every append (enough to survive a
+    Slicer crash) and fsync'ed in batches, every fsyncEvery records or
+    fsyncInterval seconds, to bound what a power loss can take.
+    """
+
+    TAIL_BLOCK = 4096
+
+    def __init__(self, path, fsyncEvery=8, fsyncInterval=2.0, maxBytes=1 << 20):
+        self._path = path
+        self._fsyncEvery = fsyncEvery
+        self.fsyncInterval = fsyncInterval
+        self._maxBytes = maxBytes
+        self._file = None
+        self._unsynced = 0
+        self._lastSync = time.monotonic()
+        self._seq = 0
+
+    def open(self):
+        last = self.last()
+        self._seq = last["seq"] + 1 if last else 0
+        if os.path.exists(self._path) and os.path.getsize(self._path) > self._maxBytes:
+            self._compact(last)
+        self._file = open(self._path, "a")
+        if self._file.tell() > 0:
+            with open(self._path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a line torn by a crash so the next record is intact
+                    self._file.write("\n")
+
+    def close(self):
+        if self._file:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def append(self, event, state):
+        """
+        Journal an event with a snapshot of the session state (dict of str).
+        """
+        record = {"seq": self._seq, "time": time.time(), "event": event}
+        record.update(state)
+        self._seq += 1
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self._fsyncEvery or \
+                time.monotonic() - self._lastSync >= self.fsyncInterval:
+            self.sync()
+        return record
+
+    def sync(self):
+        if self._file and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._lastSync = time.monotonic()
+
+    def last(self):
+        """
+        Last complete record, or None. Reads at most a few KB from the
+        end of the file; a torn last line (crash mid-write) is skipped.
+        """
+        if not os.path.exists(self._path):
+            return None
+        with open(self._path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            block = self.TAIL_BLOCK
+            while True:
+                start = max(0, size - block)
+                f.seek(start)
+                lines = f.read(size - start).split(b"\n")
+                if start > 0:
+                    # First line may be cut by the block boundary
+                    lines = lines[1:]
+                for line in reversed(lines):
+                    try:
+                        return json.loads(line.decode("UTF-8"))
+                    except ValueError:
+                        continue
+                if start == 0:
+                    return None
+                block *= 2
+
+    def _compact(self, last):
+        tmp = self._path + ".tmp"
+        with open(tmp, "w") as f:
+            if last:
+                f.write(json.dumps(last) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path)
@@ -0,0 +1,252 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Stand-ins for aktrack-screen, aktrack-ros and the goggle service
+#
+
+import abc
+import json
+import socket
+import threading
+import time
+from ControlRoomLib.UtilSharedRing import UtilSharedRingWriter
+
+
+class LoopbackPeer():
+    """
+    Local stand-in for a remote component (screen, tracker or goggle).
+    It listens where a connection sends its commands, answers each of them
+    on the connection's blocking receive port, and can push datagrams to
+    the connection's non-blocking port. Runs on its own thread so blocking
+    utilSendCommand calls made from the caller's thread are answered.
+    """
+
+    def __init__(self, listen_ip, listen_port, reply_ip, reply_port, \
+            data_ip=None, data_port=None, reply=b"ack"):
+
+        self._listen_ip = listen_ip
+        self._listen_port = listen_port
+        self._reply_ip = reply_ip
+        self._reply_port = reply_port
+        self._data_ip = data_ip
+        self._data_port = data_port
+        self._reply = reply
+
+        self._sock_listen = None
+        self._sock_send = None
+        self._thread = None
+        self._running = False
+
+        self.receivedCommands = []
+
+    @classmethod
+    def forConnection(cls, connection, **kwargs):
+        """
+        Build a peer mirroring the addresses of a UtilConnections
+        (or UtilConnectionsWtNnBlcRcv) instance.
+        """
+        data_port = getattr(connection, "_sock_port_receive_nnblc", None)
+        return cls(connection._sock_ip_send, connection._sock_port_send, \
+            "127.0.0.1", connection._sock_port_receive, \
+            "127.0.0.1" if data_port else None, data_port, **kwargs)
+
+    def start(self):
+        self._sock_listen = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock_listen.bind((self._listen_ip, self._listen_port))
+        self._sock_listen.settimeout(0.1)
+        self._sock_send = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._sock_listen:
+            self._sock_listen.close()
+        if self._sock_send:
+            self._sock_send.close()
+
+    def handleCommand(self, msg):
+        """
+        Return the reply for a received command, or None to stay silent.
+        Override to emulate a specific component.
+        """
+        return self._reply
+
+    def sendData(self, data):
+        """
+        Push a datagram to the connection's non-blocking receive port.
+        """
+        if isinstance(data, str):
+            data = data.encode('UTF-8')
+        self._sock_send.sendto(data, (self._data_ip, self._data_port))
+
+    def _serve(self):
+        while self._running:
+            try:
+                msg, _ = self._sock_listen.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            msg = msg.decode('UTF-8')
+            self.receivedCommands.append(msg)
+            reply = self.handleCommand(msg)
+            if reply is not None:
+                if isinstance(reply, str):
+                    reply = reply.encode('UTF-8')
+                self._sock_send.sendto(reply, (self._reply_ip, self._reply_port))
+
+
+
+class ScreenSimulator(LoopbackPeer):
+    """
+    aktrack-screen stand-in. Acknowledges every JSON command and reports
+    a trialStop event ("trialcomplete") trialDuration seconds after a
+    trialcommand, or right away ("trialstop") on a trialstopcommand.
+    """
+
+    def __init__(self, *args, trialDuration=0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._trialDuration = trialDuration
+        self.trialsStarted = []
+
+    def handleCommand(self, msg):
+        comm = json.loads(msg)
+        if comm["commandtype"] == "trialcommand":
+            self.trialsStarted.append(comm["commandcontent"])
+            if self._trialDuration is not None:
+                threading.Timer(self._trialDuration, self.sendTrialStop, ("trialcomplete",)).start()
+        elif comm["commandtype"] == "trialstopcommand":
+            self.sendTrialStop("trialstop")
+        return b"ack"
+
+    def sendTrialStop(self, content):
+        if self._running:
+            self.sendData(json.dumps({"commandtype":"trialStop", "commandcontent":content}))
+
+
+class StreamingSimulator(LoopbackPeer, metaclass=abc.ABCMeta):
+    """
+    Peer that also streams datagrams (built by makeDatagram) to the
+    connection's non-blocking port at a given rate, on its own thread.
+    Subclasses define makeDatagram.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._streamThread = None
+        self._streaming = False
+        self.datagramsSent = 0
+
+    @abc.abstractmethod
+    def makeDatagram(self, i):
+        """
+        Payload of the i-th streamed datagram (bytes or str).
+        """
+
+    def emit(self, i):
+        self.sendData(self.makeDatagram(i))
+
+    def startStreaming(self, rate, duration=None):
+        self._streaming = True
+        self._streamThread = threading.Thread(target=self._stream, args=(rate, duration), daemon=True)
+        self._streamThread.start()
+
+    def stopStreaming(self):
+        self._streaming = False
+        if self._streamThread:
+            self._streamThread.join()
+            self._streamThread = None
+
+    def _stream(self, rate, duration):
+        period = 1.0 / rate
+        t0 = time.perf_counter()
+        nextSend = t0
+        while self._streaming:
+            now = time.perf_counter()
+            if duration is not None and now - t0 >= duration:
+                break
+            if now < nextSend:
+                time.sleep(min(nextSend - now, 0.001))
+                continue
+            self.emit(self.datagramsSent)
+            self.datagramsSent += 1
+            nextSend += period
+        self._streaming = False
+
+
+class TrackerSimulator(StreamingSimulator):
+    """
+    aktrack-ros stand-in. Acknowledges the 16 character commands and
+    streams "__msg_pose_x_y_z_tsend" datagrams at a given rate.
+    tsend is time.perf_counter() at send, usable for one-way latency when
+    sender and receiver share the host.
+    """
+
+    def makeDatagram(self, i):
+        x = 0.01 * (i % 100)
+        return "__msg_pose_%.6f_%.6f_%.6f_%.9f" % (x, -x, 0.0, time.perf_counter())
+
+
+class TrackerSharedMemorySimulator(TrackerSimulator):
+    """
+    aktrack-ros stand-in on the same host: commands over UDP as
+    TrackerSimulator, poses (x, y, z, tsend) published to the shared
+    memory ring ringName instead of the UDP stream.
+    """
+
+    def __init__(self, *args, ringName="aktrack-pose", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ring = UtilSharedRingWriter(ringName)
+
+    def emit(self, i):
+        x = 0.01 * (i % 100)
+        self.ring.append((x, -x, 0.0, time.perf_counter()))
+
+    def stop(self):
+        self.stopStreaming()
+        super().stop()
+        self.ring.close()
+
+
+class GoggleSimulator(StreamingSimulator):
+    """
+    Goggle service stand-in. Acknowledges the single character commands
+    ('1'-'4' start/stop VPB recordings, '0' heartbeat) and streams
+    "__msg_gaze_t_x_y" samples, t being time.perf_counter() at send.
+    """
+
+    def makeDatagram(self, i):
+        x = 0.5 * (i % 200)
+        return "__msg_gaze_%.9f_%.3f_%.3f" % (time.perf_counter(), x, -x)
+
+    def handleCommand(self, msg):
+        if msg not in ("0", "1", "2", "3", "4"):
+            return None
+        return b"ack"
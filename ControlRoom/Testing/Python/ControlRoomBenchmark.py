@@ -0,0 +1,414 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# Benchmark harness, runs headless:
+#   python ControlRoomBenchmark.py receive --rate 1000 --duration 5
+#   python ControlRoomBenchmark.py shm --rate 1000 --duration 5
+#   python ControlRoomBenchmark.py gaze --rate 500 --duration 5
+#   python ControlRoomBenchmark.py trial --iterations 200
+#   python ControlRoomBenchmark.py replay --samples 100000
+#   python ControlRoomBenchmark.py filter --rate 500 --lag 0.03
+#   python ControlRoomBenchmark.py capture --file session.akcap --speed 0
+#   python ControlRoomBenchmark.py rigs --rigs 4 --rate 500 [--thread-per-rig]
+#
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from ControlRoomLib.ControlRoomConnections import ControlRoomConnectionsGoggle, ControlRoomConnectionsTracker
+from ControlRoomLib.UtilCapture import UtilCapture, UtilCapturePlayer
+from ControlRoomLib.UtilConnections import UtilConnections
+from ControlRoomLib.UtilConnectionsWtNnBlcRcv import UtilConnectionsWtNnBlcRcv
+from ControlRoomLib.UtilEventLoop import UtilEventLoopSelector
+from ControlRoomLib.UtilMetrics import metrics
+from ControlRoomLib.UtilMessages import parsePoseMsg
+from ControlRoomLib.UtilPoseFilter import makePoseFilter
+from ControlRoomLib.UtilReceivePolicy import UtilReceivePolicyLatest, UtilReceivePolicyQueued
+from ControlRoomLib.UtilReplay import UtilReplayData
+from ControlRoomLib.ControlRoomRigs import ControlRoomRigs
+from ControlRoomLib.UtilSharedRing import UtilSharedRingReader
+from AktrackSimulators import ScreenSimulator, TrackerSimulator, TrackerSharedMemorySimulator, GoggleSimulator
+
+
+def percentiles(samples):
+    if len(samples) == 0:
+        return {"p50_ms": None, "p99_ms": None}
+    a = np.asarray(samples) * 1000.0
+    return {"p50_ms": float(np.percentile(a, 50)), "p99_ms": float(np.percentile(a, 99))}
+
+
+class BenchTrackerConnections(UtilConnectionsWtNnBlcRcv):
+    """
+    Tracker connection decoding poses the way ControlRoomConnectionsTracker
+    does, recording the latency of each handled pose.
+    """
+
+    def setup(self):
+        super().setup()
+        self.latencies = []
+
+    def handleReceivedData(self):
+        pose = parsePoseMsg(self._data_buff.decode("UTF-8"))
+        self.latencies.append(time.perf_counter() - pose[3])
+
+
+def benchReceive(args):
+    policy = UtilReceivePolicyLatest() if args.policy == "latest" else UtilReceivePolicyQueued()
+    base = args.port
+    conn = BenchTrackerConnections("127.0.0.1", base, "127.0.0.1", base+1, "127.0.0.1", base+2, \
+        receivePolicy=policy)
+    loop = UtilEventLoopSelector()
+    conn.registerEventLoop(loop)
+    conn.setup()
+    conn._flag_receiving_nnblc = True
+    tracker = TrackerSimulator.forConnection(conn)
+    tracker.start()
+    try:
+        t0 = time.perf_counter()
+        tracker.startStreaming(args.rate, args.duration)
+        loop.run(args.duration + 0.2)
+        elapsed = time.perf_counter() - t0
+        tracker.stopStreaming()
+    finally:
+        tracker.stop()
+        conn.clear()
+        loop.close()
+    stats = conn.receiveStats()
+    res = {
+        "scenario": "receive", "policy": args.policy, "rate": args.rate,
+        "sent": tracker.datagramsSent, "received": stats["received"], "handled": stats["handled"],
+        "policy_dropped": stats["dropped"],
+        "kernel_lost": tracker.datagramsSent - stats["received"],
+        "loss": 1.0 - stats["received"] / max(tracker.datagramsSent, 1),
+        "packets_per_s": stats["received"] / min(elapsed, args.duration)}
+    res.update(percentiles(conn.latencies))
+    return res
+
+
+def benchSharedMemory(args):
+    """
+    The receive scenario through the shared memory ring: poses polled
+    every args.poll seconds, as the engine does.
+    """
+    tracker = TrackerSharedMemorySimulator("127.0.0.1", args.port, "127.0.0.1", args.port+1, \
+        ringName="aktrack-bench-" + str(args.port))
+    reader = UtilSharedRingReader(tracker.ring.name)
+    latencies = []
+    received = 0
+    cursor = 0
+    try:
+        tracker.startStreaming(args.rate, args.duration)
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < args.duration + 0.2:
+            first, rows = reader.read(cursor)
+            if rows.shape[0]:
+                cursor = first + rows.shape[0]
+                received += rows.shape[0]
+                latencies.append(time.perf_counter() - rows[-1, 3])
+            time.sleep(args.poll)
+        tracker.stopStreaming()
+    finally:
+        reader.close()
+        tracker.ring.close()
+    res = {"scenario": "shm", "rate": args.rate, "poll": args.poll, "sent": tracker.datagramsSent, \
+        "received": received, "loss": 1.0 - received / max(tracker.datagramsSent, 1)}
+    res.update(percentiles(latencies))
+    return res
+
+
+def benchGaze(args):
+    base = args.port
+    conn = ControlRoomConnectionsGoggle("127.0.0.1", base, "127.0.0.1", base+1, "127.0.0.1", base+2)
+    latencies = []
+    conn.gazeCallback = lambda samples: latencies.append(time.perf_counter() - samples[0])
+    loop = UtilEventLoopSelector()
+    conn.registerEventLoop(loop)
+    conn.setup()
+    conn._flag_receiving_nnblc = True
+    goggle = GoggleSimulator.forConnection(conn)
+    goggle.start()
+    metrics.reset()
+    metrics.enabled = True
+    try:
+        goggle.startStreaming(args.rate, args.duration)
+        loop.run(args.duration + 0.2)
+        goggle.stopStreaming()
+    finally:
+        metrics.enabled = False
+        goggle.stop()
+        conn.clear()
+        loop.close()
+    decode = metrics.snapshot()["histograms"].get("goggle.handleReceivedData", {})
+    res = {"scenario": "gaze", "rate": args.rate, "sent": goggle.datagramsSent, \
+        "buffered": conn.gazeBuffer.written, \
+        "loss": 1.0 - conn.gazeBuffer.written / max(goggle.datagramsSent, 1), \
+        "decode_mean_us": decode["mean"] * 1e6 if decode.get("mean") else None}
+    res.update(percentiles(latencies))
+    return res
+
+
+def benchTrial(args):
+    base = args.port
+    screen = UtilConnections("127.0.0.1", base+10, "127.0.0.1", base+11)
+    tracker = UtilConnections("127.0.0.1", base+20, "127.0.0.1", base+21)
+    goggle = UtilConnections("127.0.0.1", base+30, "127.0.0.1", base+31)
+    peers = [ScreenSimulator.forConnection(screen, trialDuration=None), \
+        TrackerSimulator.forConnection(tracker), GoggleSimulator.forConnection(goggle)]
+    for c in (screen, tracker, goggle):
+        c.setup()
+    for p in peers:
+        p.start()
+    latencies = []
+    try:
+        for i in range(args.iterations):
+            t0 = time.perf_counter()
+            goggle.utilSendCommand('1')
+            tracker.utilSendCommand("start_trialxxxxx_00000000000000_0_VPB-hfixed;")
+            screen.utilSendCommand(json.dumps({"commandtype":"trialcommand", "commandcontent":"VPB-hfixed"}))
+            latencies.append(time.perf_counter() - t0)
+    finally:
+        for p in peers:
+            p.stop()
+        for c in (screen, tracker, goggle):
+            c.clear()
+    res = {"scenario": "trial", "iterations": args.iterations}
+    res.update(percentiles(latencies))
+    return res
+
+
+def benchReplay(args):
+    t0 = time.perf_counter()
+    if args.file:
+        data = UtilReplayData.open(args.file)
+    else:
+        t = np.arange(args.samples) / 120.0
+        data = UtilReplayData(np.column_stack([t, np.sin(t) * 0.1, np.cos(t) * 0.1]))
+    openTime = time.perf_counter() - t0
+    try:
+        import vtk
+        from ControlRoomLib.UtilSlicerFuncs import setTranslation
+        matrix = vtk.vtkMatrix4x4()
+    except ImportError:
+        matrix = None
+    frames = np.random.default_rng(0).uniform(0, data.t_max, args.frames)
+    if args.sequential:
+        frames.sort()
+    costs = []
+    for t in frames:
+        t0 = time.perf_counter()
+        p = data.positionAt(t)
+        if matrix is not None:
+            setTranslation(p, matrix)
+        costs.append(time.perf_counter() - t0)
+    data.close()
+    res = {"scenario": "replay", "samples": len(data), "frames": args.frames, "sequential": args.sequential, \
+        "open_ms": openTime * 1000.0, "includes_vtk": matrix is not None}
+    res.update(percentiles(costs))
+    return res
+
+
+def benchFilter(args):
+    """
+    Pose filter per-sample cost and error on a noisy synthetic sweep, both
+    against the current position and the position args.lag seconds ahead
+    (what a display args.lag behind the tracker should show).
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(0, args.duration, 1.0 / args.rate)
+    truth = 50.0 * np.sin(2 * np.pi * 0.5 * t)
+    meas = truth + rng.normal(0, args.noise, t.shape[0])
+    shift = int(round(args.lag * args.rate))
+    settle = int(args.rate)
+    res = {"scenario": "filter", "rate": args.rate, "noise": args.noise, "lag": args.lag}
+    for name in ("none", "oneeuro", "kalman", "predict"):
+        f = makePoseFilter(name)
+        out = np.empty(t.shape[0])
+        t0 = time.perf_counter()
+        for i in range(t.shape[0]):
+            out[i] = f.update(t[i], [meas[i], meas[i]])[0] if f else meas[i]
+        cost = (time.perf_counter() - t0) / t.shape[0]
+        res[name] = {"us_per_sample": cost * 1e6, \
+            "rms": float(np.sqrt(np.mean((out - truth)[settle:] ** 2))), \
+            "rms_ahead": float(np.sqrt(np.mean((out[settle:-shift] - truth[settle+shift:]) ** 2)))}
+    return res
+
+
+def benchCapture(args):
+    """
+    Real traffic through the receive and parse path: the tracker and gaze
+    streams of a capture played at args.speed (0: as fast as possible)
+    into tracker and goggle connections.
+    """
+    base = args.port
+    tracker = ControlRoomConnectionsTracker("127.0.0.1", base, "127.0.0.1", base+1, "127.0.0.1", base+2)
+    goggle = ControlRoomConnectionsGoggle("127.0.0.1", base+10, "127.0.0.1", base+11, "127.0.0.1", base+12)
+    poses = []
+    tracker.poseCallback = poses.append
+    goggle.gazeCallback = lambda samples: None
+    loop = UtilEventLoopSelector()
+    for conn in (tracker, goggle):
+        conn.registerEventLoop(loop)
+        conn.setup()
+        conn._flag_receiving_nnblc = True
+    player = UtilCapturePlayer(UtilCapture(args.file), args.speed or None, \
+        ["tracker.stream", "goggle.stream"], \
+        {"tracker.stream": ("127.0.0.1", base), "goggle.stream": ("127.0.0.1", base+10)})
+    metrics.reset()
+    metrics.enabled = True
+    try:
+        t0 = time.perf_counter()
+        player.start()
+        while player.isPlaying():
+            loop.run(0.05)
+        loop.run(0.2)
+        elapsed = time.perf_counter() - t0
+    finally:
+        metrics.enabled = False
+        player.stop()
+        for conn in (tracker, goggle):
+            conn.clear()
+        loop.close()
+    histograms = metrics.snapshot()["histograms"]
+    stats = tracker.receiveStats()
+    res = {"scenario": "capture", "speed": args.speed, "sent": player.sent, \
+        "max_lag_ms": player.maxLag * 1000.0, "elapsed_s": elapsed, \
+        "tracker_received": stats["received"], "tracker_handled": len(poses), \
+        "gaze_buffered": goggle.gazeBuffer.written}
+    for name in ("receiveCallBack", "goggle.handleReceivedData"):
+        if name in histograms:
+            res[name + "_p99_us"] = histograms[name]["p99"] * 1e6
+    return res
+
+
+def _openFds():
+    return len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else None
+
+
+def benchRigs(args):
+    """
+    Per-rig overhead of ControlRoomRigs: threads and file descriptors
+    added per rig, and the latency of the poses every rig's tracker
+    streams at once, on one shared loop thread or a thread per rig.
+    """
+    configDir = tempfile.mkdtemp(prefix="aktrack-bench-")
+    with open(os.path.join(configDir, "SubjectConfig.json"), "w") as f:
+        json.dump({}, f)
+    ports = iter(range(args.port, args.port + 9 * args.rigs))
+    configs = [dict({"name": "rig%d" % i}, **{c: {e: "127.0.0.1:%d" % next(ports) \
+        for e in ("send", "receive", "stream")} for c in ("screen", "tracker", "goggle")}) \
+        for i in range(args.rigs)]
+    rigsPath = os.path.join(configDir, "rigs.json")
+    with open(rigsPath, "w") as f:
+        json.dump({"rigs": configs}, f)
+    threads0, fds0 = threading.active_count(), _openFds()
+    rigs = ControlRoomRigs(configDir + os.sep, threadPerRig=args.thread_per_rig)
+    rigs.load(rigsPath)
+    rigs.connect()
+    threads, fds = threading.active_count() - threads0, _openFds()
+    latencies = [[] for rig in rigs.rigs]
+    trackers = []
+    try:
+        for rig, samples in zip(rigs.rigs, latencies):
+            rig.engine.poseCallback = lambda pose, samples=samples: \
+                samples.append(time.perf_counter() - pose[3])
+            tracker = TrackerSimulator.forConnection(rig.engine._connections_tracker)
+            tracker.start()
+            trackers.append(tracker)
+        for tracker in trackers:
+            tracker.startStreaming(args.rate, args.duration)
+        time.sleep(args.duration + 0.2)
+        for tracker in trackers:
+            tracker.stopStreaming()
+    finally:
+        for tracker in trackers:
+            tracker.stop()
+        rigs.disconnect()
+    res = {"scenario": "rigs", "rigs": args.rigs, "thread_per_rig": args.thread_per_rig, \
+        "rate": args.rate, "threads_per_rig": threads / args.rigs, \
+        "fds_per_rig": (fds - fds0) / args.rigs if fds is not None else None, \
+        "sent": sum(t.datagramsSent for t in trackers), "handled": sum(len(l) for l in latencies)}
+    res.update(percentiles([x for l in latencies for x in l]))
+    return res
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ControlRoom benchmarks")
+    parser.add_argument("--port", type=int, default=28000, help="first local UDP port to use")
+    parser.add_argument("--output", help="append the JSON result to this file")
+    sub = parser.add_subparsers(dest="scenario", required=True)
+    p = sub.add_parser("receive", help="tracker pose receive throughput and latency")
+    p.add_argument("--rate", type=float, default=500.0, help="poses per second")
+    p.add_argument("--duration", type=float, default=5.0, help="seconds")
+    p.add_argument("--policy", choices=["latest", "queued"], default="latest")
+    p = sub.add_parser("shm", help="tracker pose throughput and latency through shared memory")
+    p.add_argument("--rate", type=float, default=500.0, help="poses per second")
+    p.add_argument("--duration", type=float, default=5.0, help="seconds")
+    p.add_argument("--poll", type=float, default=0.016, help="poll interval (s), the engine polls at display rate")
+    p = sub.add_parser("gaze", help="goggle gaze stream ingest")
+    p.add_argument("--rate", type=float, default=500.0, help="samples per second")
+    p.add_argument("--duration", type=float, default=5.0, help="seconds")
+    p = sub.add_parser("trial", help="trial start dispatch latency")
+    p.add_argument("--iterations", type=int, default=200)
+    p = sub.add_parser("replay", help="replay per-frame cost")
+    p.add_argument("--file", help="recorded CSV or .akrec archive, synthetic data if omitted")
+    p.add_argument("--samples", type=int, default=100000)
+    p.add_argument("--frames", type=int, default=10000)
+    p.add_argument("--sequential", action="store_true", help="frames in playback order instead of random seeks")
+    p = sub.add_parser("filter", help="pose filter cost, smoothing and prediction error")
+    p.add_argument("--rate", type=float, default=500.0, help="poses per second")
+    p.add_argument("--duration", type=float, default=10.0, help="seconds")
+    p.add_argument("--noise", type=float, default=1.0, help="measurement noise std (mm)")
+    p.add_argument("--lag", type=float, default=0.03, help="display latency to compensate (s)")
+    p = sub.add_parser("capture", help="captured traffic through the receive and parse path")
+    p.add_argument("--file", required=True, help="capture file (.akcap)")
+    p.add_argument("--speed", type=float, default=0.0, help="times the captured rate, 0 for as fast as possible")
+    p = sub.add_parser("rigs", help="per-rig overhead and pose latency of several rigs at once")
+    p.add_argument("--rigs", type=int, default=4)
+    p.add_argument("--rate", type=float, default=500.0, help="poses per second and rig")
+    p.add_argument("--duration", type=float, default=5.0, help="seconds")
+    p.add_argument("--thread-per-rig", action="store_true", help="a loop thread per rig instead of a shared one")
+    args = parser.parse_args(argv)
+
+    res = {"receive": benchReceive, "shm": benchSharedMemory, "gaze": benchGaze, "trial": benchTrial, \
+        "replay": benchReplay, "filter": benchFilter, "capture": benchCapture, \
+        "rigs": benchRigs}[args.scenario](args)
+    print(json.dumps(res, indent=2))
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(res) + "\n")
+    return res
+
+
+if __name__ == "__main__":
+    main()
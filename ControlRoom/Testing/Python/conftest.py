@@ -0,0 +1,91 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+#
+# pytest setup: ControlRoomLib and the simulators importable from the tests
+# (run python -m pytest Testing/Python from the ControlRoom directory),
+# and the fixtures shared by the tests
+#
+
+import json
+import os
+import socket
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ControlRoomLib.ControlRoomEngine import ControlRoomEngine
+
+SUBJECT_CONFIG = {"21": {"acronym": "T", "experiments": [{"datetime": "11152022151111", \
+    "sequence": ["VPC-U", "VPC-D", "VPB-hfixed"]}]}}
+
+
+def _freePorts(n):
+    socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for i in range(n)]
+    for sock in socks:
+        sock.bind(("127.0.0.1", 0))
+    ports = [sock.getsockname()[1] for sock in socks]
+    for sock in socks:
+        sock.close()
+    return ports
+
+
+@pytest.fixture
+def freePorts():
+    """
+    freePorts(n): n local UDP ports that are free right now.
+    """
+    return _freePorts
+
+
+@pytest.fixture
+def terminalIPPort(freePorts):
+    """
+    A "TerminalIPPort" of nine free local ports.
+    """
+    return "\n".join("127.0.0.1:%d" % port for port in freePorts(9))
+
+
+@pytest.fixture
+def subjectConfig(tmp_path):
+    """
+    Config directory whose SubjectConfig.json holds subject T_21 with
+    session 11152022151111 (VPC-U, VPC-D, VPB-hfixed).
+    """
+    with open(str(tmp_path / "SubjectConfig.json"), "w") as f:
+        json.dump(SUBJECT_CONFIG, f)
+    return str(tmp_path) + "/"
+
+
+@pytest.fixture
+def engine(subjectConfig):
+    """
+    Engine on subjectConfig, not connected; disconnected afterwards.
+    """
+    engine = ControlRoomEngine(subjectConfig)
+    yield engine
+    engine.disconnect()
+    engine.eventLoop().close()
@@ -0,0 +1,118 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import time
+import pytest
+from ControlRoomLib.ControlRoomAutopilot import ControlRoomAutopilot
+from AktrackSimulators import LoopbackPeer, ScreenSimulator
+
+
+@pytest.fixture
+def engine(engine, terminalIPPort):
+    engine.setTerminalIPPort(terminalIPPort)
+    engine.useGoggles = False
+    engine.openSession("T_21", "11152022151111")
+    engine.connect()
+    return engine
+
+
+def _peers(engine, trialDuration=0.05, screen=None):
+    if screen is None:
+        screen = ScreenSimulator.forConnection(engine._connections_screendot, trialDuration=trialDuration)
+    tracker = LoopbackPeer.forConnection(engine._connections_tracker)
+    screen.start()
+    tracker.start()
+    return screen, tracker
+
+
+def _runUntil(engine, autopilot, states, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while autopilot.state not in states and time.monotonic() < deadline:
+        engine.eventLoop().run(0.05)
+
+
+def test_completed_trial_moves_on(engine):
+    peers = _peers(engine)
+    try:
+        autopilot = ControlRoomAutopilot(engine)
+        autopilot.start(trials=1)
+        _runUntil(engine, autopilot, ("done",))
+        assert autopilot.state == "done"
+        assert engine.parameter("TrialIndex") == "1"
+        assert peers[0].trialsStarted == ["VPC-U"]
+    finally:
+        for peer in peers:
+            peer.stop()
+
+
+def test_timeout_pauses_on_the_trial(engine):
+    # The screen never reports the end of the trial
+    peers = _peers(engine, trialDuration=None)
+    try:
+        autopilot = ControlRoomAutopilot(engine)
+        autopilot.start(interval=0.6, trialTimeout=0.2)
+        _runUntil(engine, autopilot, ("paused",))
+        assert autopilot.state == "paused"
+        # The "trialstop" answering the stop does not start anything
+        engine.eventLoop().run(1.0)
+        assert autopilot.state == "paused"
+        assert engine.parameter("TrialIndex") == "0"
+        assert peers[0].trialsStarted == ["VPC-U"]
+    finally:
+        for peer in peers:
+            peer.stop()
+
+
+def test_screen_stop_pauses_on_the_trial(engine):
+    peers = _peers(engine, trialDuration=None)
+    try:
+        autopilot = ControlRoomAutopilot(engine)
+        autopilot.start(interval=0.6)
+        assert autopilot.state == "running"
+        peers[0].sendTrialStop("trialstop")
+        _runUntil(engine, autopilot, ("paused",))
+        engine.eventLoop().run(1.0)
+        assert autopilot.state == "paused"
+        assert engine.parameter("TrialIndex") == "0"
+        assert peers[0].trialsStarted == ["VPC-U"]
+    finally:
+        for peer in peers:
+            peer.stop()
+
+
+def test_failed_start_is_reported(engine):
+    # The screen does not answer
+    peers = _peers(engine, screen=LoopbackPeer.forConnection(engine._connections_screendot, reply=None))
+    engine._connections_screendot._sock_receive.settimeout(0.2)
+    try:
+        autopilot = ControlRoomAutopilot(engine)
+        states = []
+        autopilot.stateCallback = states.append
+        autopilot.start()
+        assert autopilot.state == "failed"
+        assert states == ["failed"]
+        assert engine.parameter("TrialIndex") == "0"
+    finally:
+        for peer in peers:
+            peer.stop()
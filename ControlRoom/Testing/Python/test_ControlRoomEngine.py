@@ -0,0 +1,124 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import socket
+import time
+import numpy as np
+import pytest
+from ControlRoomLib.UtilSharedRing import UtilSharedRingWriter
+from test_UtilCalibration import FIXATION, ONSET, SPEED, _vpcTrials
+
+
+def test_gaze_stamps_never_go_back(engine, monkeypatch):
+    clock = iter([100.0, 100.001, 100.002])
+    monkeypatch.setattr(time, "monotonic", lambda: next(clock))
+    # Second datagram delivered fast, its earlier samples would land
+    # before the first datagram's last one
+    engine.onGaze([0.0, 1, 1, 0.004, 2, 2, 0.008, 3, 3])
+    engine.onGaze([0.012, 4, 4, 0.016, 5, 5, 0.020, 6, 6])
+    # Goggle clock reset
+    engine.onGaze([0.0, 7, 7, 0.004, 8, 8])
+    t = engine.timeline.stream("gaze").times()
+    assert np.all(np.diff(t) >= 0)
+    assert t[-1] == pytest.approx(100.002)
+    assert engine.timeline.stream("gaze").values()[:, 0].tolist() == [1, 2, 3, 4, 5, 6, 7, 8]
+
+
+
+def test_tracker_ring_replaced_or_stalled(engine, terminalIPPort):
+    name = "aktest_engine_%d" % os.getpid()
+    engine.setTerminalIPPort(terminalIPPort)
+    engine.connect()
+    engine._trackerRingStall = 0.1
+    tracker = engine._connections_tracker
+    poses = []
+    engine.poseCallback = lambda pose: poses.append(pose[0])
+    writer = UtilSharedRingWriter(name, columns=4)
+    loop = engine.eventLoop()
+    try:
+        engine.setTrackerSharedMemory(name)
+        loop.run(0.05)
+        assert not tracker._flag_receiving_nnblc
+        writer.append((1, 0, 0, 0))
+        loop.run(0.05)
+        assert poses == [1]
+        # Stalled producer: UDP meanwhile, back to the ring with its rows
+        loop.run(0.2)
+        assert tracker._flag_receiving_nnblc
+        writer.append((2, 0, 0, 0))
+        loop.run(0.05)
+        assert poses == [1, 2] and not tracker._flag_receiving_nnblc
+        # Producer restarted: the new segment is attached
+        writer.close()
+        writer = UtilSharedRingWriter(name, columns=4)
+        loop.run(0.3)
+        writer.append((3, 0, 0, 0))
+        loop.run(0.05)
+        assert poses == [1, 2, 3] and not tracker._flag_receiving_nnblc
+    finally:
+        writer.close()
+
+
+def test_timeline_gets_every_udp_pose(engine, terminalIPPort):
+    engine.setTerminalIPPort(terminalIPPort)
+    engine.connect()
+    shown = []
+    engine.poseCallback = shown.append
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        # A burst: the indicator gets the newest pose only
+        for i in range(20):
+            sender.sendto(("__msg_pose_%d_%d_0_0" % (i, -i)).encode(), \
+                ("127.0.0.1", engine._connections_tracker._sock_port_receive_nnblc))
+        time.sleep(0.05)
+        engine.eventLoop().run(0.05)
+        values = engine.timeline.stream("tracker").values()
+        assert values[:, 0].tolist() == list(range(20))
+        assert values[:, 1].tolist() == [-i for i in range(20)]
+        assert len(shown) < 20 and shown[-1][0] == 19
+    finally:
+        sender.close()
+
+
+def test_fitted_calibration_waits_for_acceptance(engine, tmp_path):
+    engine.store.setSequence("21", "11152022151111", ["VPC-L", "VPC-U"])
+    engine.openSession("T_21", "11152022151111")
+    m = np.array([[-980.0, 15.0, 3.0], [-10.0, -1020.0, -7.0], [0.0, 0.0, 1.0]])
+    recordings = tmp_path / "recordings"
+    recordings.mkdir()
+    for trial, data in _vpcTrials(m, ("VPC-L", "VPC-U")):
+        np.savetxt(str(recordings / ("11152022151111_21_" + trial + ".csv")), data, delimiter=",")
+    calibration = engine.fitCalibration([str(recordings)], SPEED, FIXATION, ONSET)
+    assert np.allclose(calibration.matrix, m)
+    # Nothing is mapped with it until the operator accepts it
+    assert engine.store.calibration("21", "11152022151111") is None
+    assert engine.calibration.isDefault()
+    engine.discardCalibration()
+    with pytest.raises(ValueError):
+        engine.acceptCalibration()
+    engine.fitCalibration([str(recordings)], SPEED, FIXATION, ONSET)
+    assert engine.acceptCalibration() is not None
+    assert np.allclose(engine.calibration.matrix, m)
+    assert np.allclose(engine.sessionCalibration("21", "11152022151111").matrix, m)
@@ -0,0 +1,63 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import numpy as np
+import pytest
+from ControlRoomLib.ControlRoomExport import exportTrial, trialExportPath
+from ControlRoomLib.ControlRoomTrialIndex import TrialEntry
+
+FORMATS = [("parquet", "pyarrow"), ("hdf5", "h5py")]
+
+
+def _entry(path):
+    return TrialEntry("21", "T", "11152022151111", 0, "VPC-U", "VPC", str(path))
+
+
+def _writeCsv(path, rows, badLine=None):
+    with open(str(path), "w") as f:
+        for i in range(rows):
+            f.write("%d,%d,%d\n" % (i, 2 * i, 3 * i) if i != badLine else "x,y\n")
+
+
+@pytest.mark.parametrize("fmt,module", FORMATS)
+def test_export_trial(tmp_path, fmt, module):
+    pytest.importorskip(module)
+    _writeCsv(tmp_path / "rec.csv", 100)
+    row = exportTrial(_entry(tmp_path / "rec.csv"), str(tmp_path / "out"), fmt, chunkRows=32)
+    assert (row["rows"], row["t_min"], row["t_max"]) == (100, 0.0, 99.0)
+
+
+@pytest.mark.parametrize("fmt,module", FORMATS)
+def test_failed_export_leaves_nothing(tmp_path, fmt, module):
+    pytest.importorskip(module)
+    # The second block of the recording cannot be read, after the
+    # first one was written
+    _writeCsv(tmp_path / "rec.csv", 5000, badLine=4500)
+    entry = _entry(tmp_path / "rec.csv")
+    outDir = str(tmp_path / "out")
+    with pytest.raises(ValueError):
+        exportTrial(entry, outDir, fmt, chunkRows=1000)
+    path = trialExportPath(outDir, entry, fmt)
+    assert os.listdir(os.path.dirname(path)) == []
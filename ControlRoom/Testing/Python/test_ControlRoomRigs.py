@@ -0,0 +1,144 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import threading
+import time
+import pytest
+from ControlRoomLib.ControlRoomRigConfig import ControlRoomRigConfig, loadRigConfigs
+from ControlRoomLib.ControlRoomRigs import ControlRoomRigs
+from ControlRoomLib.UtilEventLoop import UtilEventLoopThread
+from AktrackSimulators import LoopbackPeer
+
+
+def _rigsFile(tmp_path, names, freePorts):
+    configs = []
+    for name in names:
+        ports = iter(freePorts(9))
+        configs.append(dict({"name": name}, **{c: {e: "127.0.0.1:%d" % next(ports) \
+            for e in ("send", "receive", "stream")} for c in ("screen", "tracker", "goggle")}))
+    path = str(tmp_path / "rigs.json")
+    with open(path, "w") as f:
+        json.dump({"rigs": configs}, f)
+    return path, configs
+
+
+@pytest.fixture
+def rigs(tmp_path, request, freePorts):
+    with open(str(tmp_path / "SubjectConfig.json"), "w") as f:
+        json.dump({}, f)
+    path, configs = _rigsFile(tmp_path, ("slow", "fast"), freePorts)
+    rigs = ControlRoomRigs(str(tmp_path) + "/", threadPerRig=getattr(request, "param", False))
+    rigs.load(path)
+    rigs.connect()
+    yield rigs
+    rigs.disconnect()
+
+
+def test_loop_thread_call():
+    loop = UtilEventLoopThread("test")
+    loop.start()
+    try:
+        assert loop.call(lambda: loop.isLoopThread())
+        with pytest.raises(ValueError):
+            loop.call(int, "x")
+        fired = []
+        loop.callLater(0.01, lambda: fired.append(loop.isLoopThread()))
+        deadline = time.monotonic() + 1.0
+        while not fired and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert fired == [True]
+    finally:
+        loop.close()
+
+
+def test_rigs_share_one_loop_thread(rigs):
+    slow, fast = rigs.rig("slow"), rigs.rig("fast")
+    assert slow.eventLoop is fast.eventLoop is rigs.eventLoop
+    names = [t.name for t in threading.enumerate()]
+    assert names.count("rigs") == 1 and not any(n.startswith("rig-") for n in names)
+    peers = [LoopbackPeer.forConnection(rig.engine._connections_screendot) for rig in (slow, fast)]
+    for peer in peers:
+        peer.start()
+    try:
+        for rig in (slow, fast):
+            conn = rig.engine._connections_screendot
+            assert rig.eventLoop.call(lambda: conn.utilSendCommand("hello", res=True))[0] == b"ack"
+    finally:
+        for peer in peers:
+            peer.stop()
+    loop = rigs.eventLoop
+    rigs.disconnect()
+    assert rigs.eventLoop is None and not loop._thread.is_alive()
+
+
+def test_rig_ports_checked_against_station(tmp_path, freePorts):
+    path, configs = _rigsFile(tmp_path, ("a", "b"), freePorts)
+    station = ControlRoomRigConfig.fromDict(dict(configs[0], name="the station"))
+    with pytest.raises(ValueError, match="the station and rig a"):
+        loadRigConfigs(path, station)
+    assert [c.name for c in loadRigConfigs(path)] == ["a", "b"]
+    configs[1]["tracker"]["stream"] = configs[0]["goggle"]["receive"]
+    with open(path, "w") as f:
+        json.dump({"rigs": configs}, f)
+    with pytest.raises(ValueError, match="rig a and rig b"):
+        loadRigConfigs(path)
+
+    with open(str(tmp_path / "SubjectConfig.json"), "w") as f:
+        json.dump({}, f)
+    rigs = ControlRoomRigs(str(tmp_path) + "/")
+    with pytest.raises(ValueError, match="the station"):
+        rigs.load(path, ControlRoomRigConfig.fromDict(dict(configs[1], name="x")).terminalIPPort())
+    assert rigs.rigs == [] and rigs.eventLoop is None
+
+
+@pytest.mark.parametrize("rigs", [True], indirect=True)
+def test_silent_peer_stalls_its_rig_only(rigs):
+    slow, fast = rigs.rig("slow"), rigs.rig("fast")
+    slowScreen = slow.engine._connections_screendot
+    fastScreen = fast.engine._connections_screendot
+    silent = LoopbackPeer.forConnection(slowScreen, reply=None)
+    peer = LoopbackPeer.forConnection(fastScreen)
+    silent.start()
+    peer.start()
+    try:
+        slow.eventLoop.call(slowScreen._sock_receive.settimeout, 1.0)
+        timedOut = []
+        def sendSlow():
+            try:
+                slowScreen.utilSendCommand("hello")
+            except RuntimeError:
+                timedOut.append(True)
+        slow.eventLoop.callSoon(sendSlow)
+        time.sleep(0.1)
+        t0 = time.monotonic()
+        data = fast.eventLoop.call(lambda: fastScreen.utilSendCommand("hello", res=True))
+        assert data[0] == b"ack"
+        assert time.monotonic() - t0 < 0.5
+        assert not timedOut
+        slow.eventLoop.call(lambda: None)
+        assert timedOut == [True]
+    finally:
+        silent.stop()
+        peer.stop()
@@ -0,0 +1,123 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import pytest
+from ControlRoomLib.ControlRoomSubjectStore import ControlRoomSubjectStore
+
+
+@pytest.fixture
+def storePath(tmp_path):
+    path = str(tmp_path / "SubjectConfig.json")
+    with open(path, "w") as f:
+        json.dump({"1": {"acronym": "AA", "experiments": []}}, f)
+    return path
+
+
+def test_concurrent_edits_are_merged(storePath):
+    a, b = ControlRoomSubjectStore(storePath), ControlRoomSubjectStore(storePath)
+    assert a.addSubject("BB") == "BB_2"
+    # b has not seen BB_2, its edit still applies to the latest file
+    assert b.addSubject("CC") == "CC_3"
+    b.startExperiment("1", "01012024120000")
+    assert a.refresh() == {"1", "3"}
+    assert a.refresh() == set()
+    assert sorted(a.acronymList()) == ["AA_1", "BB_2", "CC_3"]
+    assert a.experiments("1") == [{"datetime": "01012024120000", "sequence": []}]
+    a.compact()
+    with open(storePath) as f:
+        assert set(json.load(f)) == {"1", "2", "3"}
+
+
+def test_set_sequence_creates_or_replaces_session(storePath):
+    store = ControlRoomSubjectStore(storePath)
+    store.setSequence("1", "01012024120000", ["VPC-U"])
+    store.setSequence("1", "01012024120000", ["VPC-D", "VPC-U"])
+    assert store.sequence("1", "01012024120000") == ["VPC-D", "VPC-U"]
+    assert store.sequence("1", "02022024120000") is None
+
+
+def test_lock_held_elsewhere_times_out(storePath):
+    holder = subprocess.Popen([sys.executable, "-c", \
+        "import sys, time; sys.path.insert(0, sys.argv[1]); " \
+        "from ControlRoomLib.UtilFileLock import UtilFileLock; " \
+        "lock = UtilFileLock(sys.argv[2]); lock.acquire(); print('held', flush=True); time.sleep(30)", \
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."), storePath + ".lock"], stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == "held"
+        store = ControlRoomSubjectStore(storePath, lockTimeout=0.2)
+        with pytest.raises(TimeoutError):
+            store.addSubject("BB")
+        with open(storePath) as f:
+            assert set(json.load(f)) == {"1"}
+    finally:
+        holder.kill()
+        holder.wait()
+
+
+def test_remote_changes_are_read_from_the_log(storePath, monkeypatch):
+    a, b = ControlRoomSubjectStore(storePath), ControlRoomSubjectStore(storePath)
+    with open(storePath) as f:
+        snapshot = f.read()
+    b.addSubject("BB")
+    b.setSequence("1", "01012024120000", ["VPC-U"])
+    # Neither the write nor the pickup touches the file itself
+    with open(storePath) as f:
+        assert f.read() == snapshot
+    monkeypatch.setattr(json, "load", lambda f: pytest.fail("full reload"))
+    generation = a.generation
+    assert a.refresh() == {"1", "2"}
+    assert a.generation == generation + 1
+    assert a.sequence("1", "01012024120000") == ["VPC-U"]
+    assert a.refresh() == set()
+
+
+def test_torn_log_line_is_dropped(storePath):
+    a, b = ControlRoomSubjectStore(storePath), ControlRoomSubjectStore(storePath)
+    a.addSubject("BB")
+    # A station died while appending its change
+    with open(a.changeLogPath(), "ab") as f:
+        f.write(b'{"num": "3", "subj')
+    assert b.refresh() == {"2"}
+    a.addSubject("CC")
+    assert b.refresh() == {"3"}
+    assert sorted(ControlRoomSubjectStore(storePath).acronymList()) == ["AA_1", "BB_2", "CC_3"]
+
+
+def test_log_is_compacted_into_the_file(storePath):
+    a = ControlRoomSubjectStore(storePath, compactSize=200)
+    b = ControlRoomSubjectStore(storePath)
+    for i in range(8):
+        a.addSubject("S")
+    assert os.path.getsize(a.changeLogPath()) < 200
+    with open(storePath) as f:
+        assert len(json.load(f)) > 1
+    # b sees the file and the log replaced and reloads both
+    assert b.refresh() == {str(i) for i in range(2, 10)}
+    assert sorted(b.subjects()) == sorted(a.subjects())
+    b.setSequence("9", "01012024120000", ["VPC-D"])
+    assert a.refresh() == {"9"}
@@ -0,0 +1,98 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+import numpy as np
+import pytest
+from ControlRoomLib.ControlRoomSubjectStore import ControlRoomSubjectStore
+from ControlRoomLib.ControlRoomTrialIndex import ControlRoomTrialIndex, parseRecordingName
+from ControlRoomLib.UtilRecordArchive import UtilRecordArchive, csvToArchive
+
+SESSION_A = "11152022151111"
+SESSION_B = "11162022090000"
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "SubjectConfig.json")
+    with open(path, "w") as f:
+        json.dump({
+            "21": {"acronym": "T", "experiments": [
+                {"datetime": SESSION_A, "sequence": ["VPC-U", "VPM-12-L", "VPC-U", "VPB-hfixed"]}]},
+            "22": {"acronym": "S", "experiments": [
+                {"datetime": SESSION_B, "sequence": ["VPM-12-L", "VPC-D"]}]},
+            }, f)
+    return ControlRoomSubjectStore(path)
+
+
+def _writeCsv(path, rows=10):
+    t = np.arange(rows) * 0.01
+    np.savetxt(path, np.column_stack([t, t, -t]), delimiter=",", fmt="%.2f")
+    return path
+
+
+def test_parse_recording_name():
+    assert parseRecordingName("11152022151111_21_VPM-12-L.csv") == ("11152022151111", "21", "VPM-12-L", 0)
+    assert parseRecordingName("11152022151111_21_VPC-U_2.csv") == ("11152022151111", "21", "VPC-U", 2)
+    assert parseRecordingName("/data/11152022151111_21_VPB-hfixed_1.akrec") == \
+        ("11152022151111", "21", "VPB-hfixed", 1)
+    assert parseRecordingName("11152022151111_21_VPC-U.txt") is None
+    assert parseRecordingName("11152022151111_21_VPX-U.csv") is None
+    assert parseRecordingName("notes.csv") is None
+
+
+def test_query_and_repeats(tmp_path, store):
+    rec = tmp_path / "recordings"
+    (rec / "sub").mkdir(parents=True)
+    _writeCsv(str(rec / ("%s_21_VPC-U.csv" % SESSION_A)))
+    _writeCsv(str(rec / "sub" / ("%s_21_VPC-U_1.csv" % SESSION_A)))
+    _writeCsv(str(rec / ("%s_22_VPM-12-L.csv" % SESSION_B)))
+    index = ControlRoomTrialIndex(store, [str(rec)])
+
+    assert [(e.subject, e.index) for e in index.query(trial="VPM-12-L")] == [("21", 1), ("22", 0)]
+    vpc = index.query(subject="21", paradigm="VPC")
+    assert [os.path.basename(e.path) for e in vpc] == \
+        ["%s_21_VPC-U.csv" % SESSION_A, "%s_21_VPC-U_1.csv" % SESSION_A]
+    assert [e.index for e in index.query(subject="21", recorded=False)] == [1, 3]
+    assert index.query(session=SESSION_B, trial="VPC-D", recorded=True) == []
+    assert index.query(subject="99") == []
+    assert len(index.query()) == 6
+
+
+def test_archive_preferred_and_spans(tmp_path, store):
+    rec = tmp_path / "recordings"
+    rec.mkdir()
+    csvPath = _writeCsv(str(rec / ("%s_22_VPM-12-L.csv" % SESSION_B)), rows=100)
+    index = ControlRoomTrialIndex(store, [str(rec)])
+    assert index.recordings(subject="22") == [(csvPath, 0, os.path.getsize(csvPath))]
+
+    archivePath = csvToArchive(csvPath, chunkRows=32)
+    assert index.refresh()
+    [(path, offset, size)] = index.recordings(subject="22")
+    assert path == archivePath
+    entries = UtilRecordArchive(path).index
+    assert offset == entries["offset"][0]
+    assert offset + size == entries["offset"][-1] + entries["size"][-1]
+    assert not index.refresh()
@@ -0,0 +1,107 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import numpy as np
+import pytest
+from ControlRoomLib.UtilCalibration import RECORDING_TO_BOARD, UtilCalibration, applyMatrix, \
+    fitCalibration, vpcTargets
+
+
+SPEED, FIXATION, ONSET = 2.0, (10.0, -5.0), 1.5
+
+
+def _vpcTrials(m, directions=("VPC-L", "VPC-R", "VPC-U", "VPC-D"), onsets=None):
+    """
+    Recorded VPC trials of a tracker whose true calibration is m, the dot
+    held on the fixation point until its onset.
+    """
+    trials = []
+    for i, trial in enumerate(directions):
+        onset = ONSET if onsets is None else onsets[i]
+        t = np.arange(0.0, onset + 4.0, 0.01)
+        xy = applyMatrix(np.linalg.inv(m), vpcTargets(np.maximum(t - onset, 0.0), trial, SPEED, FIXATION))
+        trials.append((trial, np.column_stack([t + 100.0, xy])))
+    return trials
+
+
+def test_affine_fit_recovers_the_matrix():
+    m = np.array([[-980.0, 15.0, 3.0], [-10.0, -1020.0, -7.0], [0.0, 0.0, 1.0]])
+    calibration = fitCalibration(_vpcTrials(m), SPEED, FIXATION, ONSET)
+    assert np.allclose(calibration.matrix, m)
+    assert calibration.info["rms"] < 1e-6
+    assert calibration.info["trials"] == ["VPC-L", "VPC-R", "VPC-U", "VPC-D"]
+    assert (calibration.info["speed"], calibration.info["onset"]) == (SPEED, [ONSET] * 4)
+
+
+def test_homography_fit_recovers_the_matrix():
+    m = np.array([[-980.0, 15.0, 3.0], [-10.0, -1020.0, -7.0], [0.02, -0.01, 1.0]])
+    calibration = fitCalibration(_vpcTrials(m), SPEED, FIXATION, ONSET, "homography")
+    assert np.allclose(calibration.matrix, m, rtol=1e-6, atol=1e-6)
+
+
+def test_stimulus_parameters_matter():
+    m = np.array([[-980.0, 15.0, 3.0], [-10.0, -1020.0, -7.0], [0.0, 0.0, 1.0]])
+    trials = _vpcTrials(m, onsets=[0.5, 1.0, 1.5, 2.0])
+    calibration = fitCalibration(trials, SPEED, FIXATION, [0.5, 1.0, 1.5, 2.0])
+    assert np.allclose(calibration.matrix, m)
+    # Onset taken as the first sample, or the wrong speed: the fit is off
+    assert fitCalibration(trials, SPEED, FIXATION, 0.0).info["rms"] > 1.0
+    assert not np.allclose(fitCalibration(trials, 1.0, FIXATION, [0.5, 1.0, 1.5, 2.0]).matrix, m)
+    with pytest.raises(ValueError):
+        fitCalibration(trials, SPEED, FIXATION, [0.5, 1.0])
+
+
+@pytest.mark.parametrize("directions", [("VPC-L", "VPC-R"), ("VPC-U", "VPC-D"), ("VPC-U",)])
+def test_one_axis_is_rejected(directions):
+    with pytest.raises(ValueError):
+        fitCalibration(_vpcTrials(RECORDING_TO_BOARD, directions), SPEED, FIXATION, ONSET)
+
+
+def test_collinear_positions_are_rejected():
+    # Both axes run, the tracker moved along one line all along
+    trials = [(trial, np.column_stack([data[:, 0], data[:, 1], data[:, 1]])) \
+        for trial, data in _vpcTrials(RECORDING_TO_BOARD)]
+    with pytest.raises(ValueError):
+        fitCalibration(trials, SPEED, FIXATION, ONSET)
+
+
+def test_default_is_the_uncalibrated_mapping():
+    calibration = UtilCalibration.fromDict(None)
+    assert calibration.isDefault()
+    xy = np.array([[0.01, -0.02], [0.1, 0.3]])
+    assert np.allclose(calibration.apply(xy), -1000.0 * xy)
+    # Live poses already have the uncalibrated mapping applied
+    assert np.allclose(calibration.applyLive(xy), xy)
+
+
+@pytest.mark.parametrize("m", [
+    np.array([[-980.0, 15.0, 3.0], [-10.0, -1020.0, -7.0], [0.0, 0.0, 1.0]]),
+    np.array([[-980.0, 15.0, 3.0], [-10.0, -1020.0, -7.0], [0.02, -0.01, 1.0]])])
+def test_live_point_matches_apply_live(m):
+    calibration = UtilCalibration.fromDict(UtilCalibration(m, {"model": "x"}).toDict())
+    xy = np.array([[12.0, -30.0], [-250.0, 80.0], [0.0, 0.0]])
+    expected = calibration.applyLive(xy)
+    assert np.allclose([calibration.livePoint(x, y) for x, y in xy], expected)
+    # Live poses are recorded positions mapped the uncalibrated way
+    assert np.allclose(expected, calibration.apply(applyMatrix(np.linalg.inv(RECORDING_TO_BOARD), xy)))
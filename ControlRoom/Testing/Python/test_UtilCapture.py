@@ -0,0 +1,76 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import socket
+from ControlRoomLib.UtilCapture import UtilCapture, UtilCapturePlayer, UtilCaptureWriter
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "session.akcap")
+    writer = UtilCaptureWriter(path)
+    tracker = writer.channel("tracker.stream", "0.0.0.0", 8083)
+    screen = writer.channel("screen.receive", "127.0.0.1", 8769)
+    assert writer.channel("tracker.stream", "0.0.0.0", 8083) == tracker
+    writer.record(tracker, b"pose_1")
+    writer.record(screen, b"ack")
+    writer.record(tracker, b"pose_2")
+    writer.close()
+    capture = UtilCapture(path)
+    assert [c["name"] for c in capture.channels.values()] == ["tracker.stream", "screen.receive"]
+    records = list(capture.records())
+    assert [data for t, cid, data in records] == [b"pose_1", b"ack", b"pose_2"]
+    assert [t for t, cid, data in records] == sorted(t for t, cid, data in records)
+    assert [data for t, cid, data in capture.records(["tracker.stream"])] == [b"pose_1", b"pose_2"]
+    assert capture.summary()["tracker.stream"]["datagrams"] == 2
+
+
+def test_truncated_capture_reads_complete_records(tmp_path):
+    path = str(tmp_path / "cut.akcap")
+    writer = UtilCaptureWriter(path)
+    cid = writer.channel("tracker.stream", "0.0.0.0", 8083)
+    writer.record(cid, b"pose_1")
+    writer.record(cid, b"pose_2")
+    writer.close()
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 3)
+    assert [data for t, cid, data in UtilCapture(path).records()] == [b"pose_1"]
+
+
+def test_player_resends_to_target(tmp_path):
+    path = str(tmp_path / "play.akcap")
+    writer = UtilCaptureWriter(path)
+    cid = writer.channel("tracker.stream", "0.0.0.0", 1)
+    for i in range(10):
+        writer.record(cid, b"pose_%d" % i)
+    writer.close()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(2.0)
+    try:
+        res = UtilCapturePlayer(UtilCapture(path), speed=None, \
+            targets={"tracker.stream": sock.getsockname()}).play()
+        assert res["sent"] == 10
+        assert [sock.recv(64) for i in range(10)] == [b"pose_%d" % i for i in range(10)]
+    finally:
+        sock.close()
@@ -0,0 +1,62 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import socket
+import pytest
+from ControlRoomLib.UtilConnectionsWtNnBlcRcv import UtilConnectionsWtNnBlcRcv
+
+
+class _Collector(UtilConnectionsWtNnBlcRcv):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.handled = []
+
+    def handleReceivedData(self):
+        self.handled.append(self._data_buff)
+
+
+@pytest.fixture
+def connection(freePorts):
+    ports = freePorts(3)
+    conn = _Collector("127.0.0.1", ports[0], "127.0.0.1", ports[1], "127.0.0.1", ports[2], maxDrain=4)
+    conn.setup()
+    conn._flag_receiving_nnblc = True
+    yield conn
+    conn.clear()
+
+
+def test_drain_is_capped_per_callback(connection):
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for i in range(10):
+            sender.sendto(str(i).encode(), ("127.0.0.1", connection._sock_port_receive_nnblc))
+        connection.receiveCallBack()
+        assert len(connection.handled) == 4
+        # The rest is read on the following callbacks, in order
+        for i in range(3):
+            connection.receiveCallBack()
+        assert [int(d) for d in connection.handled] == list(range(10))
+    finally:
+        sender.close()
@@ -0,0 +1,112 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import pytest
+from ControlRoomLib.UtilConnections import UtilConnections
+from ControlRoomLib.UtilConnectionsWtNnBlcRcv import UtilConnectionsWtNnBlcRcv
+from ControlRoomLib.UtilEventLoop import UtilEventLoopSelector
+from ControlRoomLib.UtilHealthMonitor import UtilHealthMonitor, UtilLinkHealth
+from AktrackSimulators import LoopbackPeer
+
+
+class CommandsOnlyPeer(LoopbackPeer):
+    """
+    Answers commands, ignores heartbeats (a peer without the heartbeat).
+    """
+
+    def handleCommand(self, msg):
+        return None if msg == "heartbeat" else b"ack"
+
+
+def _ticks(loop, monitor, n, interval):
+    for i in range(n):
+        loop.run(interval)
+        monitor.tick()
+
+
+@pytest.fixture
+def loop():
+    loop = UtilEventLoopSelector()
+    yield loop
+    loop.close()
+
+
+def test_peer_without_heartbeat_is_never_reconnected(loop, freePorts):
+    receive, send = freePorts(2)
+    conn = UtilConnections("127.0.0.1", receive, "127.0.0.1", send)
+    conn.setup()
+    peer = CommandsOnlyPeer.forConnection(conn)
+    peer.start()
+    try:
+        monitor = UtilHealthMonitor(loop, interval=0.02)
+        link = monitor.addLink("screen", conn, "heartbeat")
+        conn.utilSendCommand("command")
+        _ticks(loop, monitor, 15, 0.02)
+        assert link.reconnects == 0 and link.status != UtilLinkHealth.DOWN
+        assert not link.heartbeatAnswered
+        assert len(link.rtts) == 1
+    finally:
+        monitor.clear()
+        peer.stop()
+        conn.clear()
+
+
+def test_link_without_heartbeat_message_sends_nothing(loop, freePorts):
+    receive, send = freePorts(2)
+    conn = UtilConnections("127.0.0.1", receive, "127.0.0.1", send)
+    conn.setup()
+    peer = LoopbackPeer.forConnection(conn)
+    peer.start()
+    try:
+        monitor = UtilHealthMonitor(loop, interval=0.02)
+        monitor.addLink("tracker", conn)
+        _ticks(loop, monitor, 5, 0.02)
+        assert peer.receivedCommands == []
+    finally:
+        monitor.clear()
+        peer.stop()
+        conn.clear()
+
+
+def test_silent_peer_reconnects_command_sockets_only(loop, freePorts):
+    stream, receive, send = freePorts(3)
+    conn = UtilConnectionsWtNnBlcRcv("127.0.0.1", stream, "127.0.0.1", receive, "127.0.0.1", send)
+    conn.handleReceivedData = lambda: None
+    conn.setup()
+    conn.registerEventLoop(loop)
+    peer = LoopbackPeer.forConnection(conn)
+    peer.start()
+    try:
+        monitor = UtilHealthMonitor(loop, interval=0.02, maxMissed=2)
+        link = monitor.addLink("screen", conn, "heartbeat")
+        _ticks(loop, monitor, 3, 0.02)
+        assert link.heartbeatAnswered and link.status == UtilLinkHealth.UP
+        streamSocket = conn._sock_receive_nnblc
+        peer.stop()
+        _ticks(loop, monitor, 6, 0.02)
+        assert link.status == UtilLinkHealth.DOWN and link.reconnects >= 1
+        assert conn._sock_receive_nnblc is streamSocket and streamSocket.fileno() != -1
+    finally:
+        monitor.clear()
+        conn.clear()
@@ -0,0 +1,105 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import numpy as np
+from ControlRoomLib.UtilHeatmap import UtilHeatmap
+from ControlRoomLib.UtilRecordArchive import csvToArchive
+from ControlRoomLib.UtilReplay import boardPositions
+from ControlRoomLib.UtilSceneAssets import stlBounds
+
+EXTENT = (-50.0, 950.0, -800.0, 200.0)
+
+
+def test_binning():
+    heatmap = UtilHeatmap((0.0, 20.0, -10.0, 0.0), binSize=5.0)
+    assert heatmap.shape == (2, 4)
+    heatmap.add(0.0, -10.0)
+    heatmap.add(4.99, -5.01)
+    heatmap.add(17.5, -2.5)
+    heatmap.add(10.0, -5.0)
+    assert heatmap.counts.tolist() == [[2, 0, 0, 0], [0, 0, 1, 1]]
+    batch = UtilHeatmap((0.0, 20.0, -10.0, 0.0), binSize=5.0)
+    batch.addBatch([0.0, 4.99, 17.5, 10.0], [-10.0, -5.01, -2.5, -5.0])
+    assert np.array_equal(batch.counts, heatmap.counts)
+    assert (batch.total, batch.outside) == (4, 0)
+
+
+def test_extent_clipping():
+    heatmap = UtilHeatmap((0.0, 20.0, -10.0, 0.0), binSize=5.0)
+    x = np.array([-0.01, 20.0, 5.0, 5.0, 19.99, 0.0])
+    y = np.array([-5.0, -5.0, -10.01, 0.0, -0.01, -10.0])
+    heatmap.addBatch(x, y)
+    for xi, yi in zip(x, y):
+        heatmap.add(xi, yi)
+    assert (heatmap.total, heatmap.outside) == (12, 8)
+    assert heatmap.counts[1, 3] == 2 and heatmap.counts[0, 0] == 2 and heatmap.counts.sum() == 4
+    # A partial last bin still covers the extent
+    assert UtilHeatmap((0.0, 21.0, 0.0, 10.0), binSize=5.0).shape == (2, 5)
+
+
+def test_incremental_updates():
+    rng = np.random.default_rng(1)
+    positions = rng.uniform(-100.0, 1000.0, (5000, 3))
+    positions[:, 1] -= 600.0
+    whole = UtilHeatmap(EXTENT)
+    whole.addPositions(positions)
+    # Small batches take the np.add.at path, large ones bincount
+    parts = UtilHeatmap(EXTENT)
+    for i in range(0, 5000, 7):
+        parts.addPositions(positions[i:i+7])
+    assert np.array_equal(parts.counts, whole.counts)
+    assert (parts.total, parts.outside) == (whole.total, whole.outside)
+
+    pixels = np.empty((whole.counts.size, 4), dtype=np.uint8)
+    whole.rgba(pixels)
+    assert pixels[np.argmax(whole.counts.reshape(-1)), 0] == 255
+    assert np.all(pixels[whole.counts.reshape(-1) == 0, 3] == 0)
+    whole.clear()
+    assert (whole.total, whole.outside, whole.counts.sum()) == (0, 0, 0)
+    assert not whole.rgba(pixels).any()
+
+
+def test_add_recording(tmp_path):
+    t = np.arange(3000) * 0.01
+    data = np.column_stack([t, 0.3 * np.sin(t), -0.3 + 0.2 * np.cos(t)])
+    csvPath = str(tmp_path / "rec.csv")
+    np.savetxt(csvPath, data, delimiter=",", fmt="%.4f")
+    expected = UtilHeatmap(EXTENT)
+    expected.addPositions(boardPositions(np.loadtxt(csvPath, delimiter=",")))
+    for path in (csvPath, csvToArchive(csvPath, chunkRows=256)):
+        heatmap = UtilHeatmap(EXTENT)
+        heatmap.addRecording(path)
+        assert np.array_equal(heatmap.counts, expected.counts)
+        assert heatmap.total == 3000
+
+
+def test_stl_bounds(tmp_path):
+    configs = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Resources", "Configs")
+    assert stlBounds(os.path.join(configs, "BoardModel.STL"))[0:4] == EXTENT
+    path = str(tmp_path / "tri.stl")
+    with open(path, "w") as f:
+        f.write("solid t\n facet normal 0 0 1\n  outer loop\n   vertex 1 2 3\n   vertex -4 5 6\n" \
+            "   vertex 7 -8 9\n  endloop\n endfacet\nendsolid t\n")
+    assert stlBounds(path) == (-4.0, 7.0, -8.0, 5.0, 3.0, 9.0)
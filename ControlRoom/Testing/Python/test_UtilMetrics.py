@@ -0,0 +1,85 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import socket
+import time
+import pytest
+from ControlRoomLib.UtilConnectionsWtNnBlcRcv import UtilConnectionsWtNnBlcRcv
+from ControlRoomLib.UtilMetrics import UtilMetrics, metrics
+from ControlRoomLib.UtilReceivePolicy import UtilReceivePolicyLatest
+from AktrackSimulators import LoopbackPeer
+
+
+@pytest.fixture
+def enabled():
+    metrics.reset()
+    metrics.enabled = True
+    yield metrics
+    metrics.enabled = False
+    metrics.reset()
+
+
+def test_disabled_metrics_record_nothing():
+    m = UtilMetrics()
+    m.count("a")
+    m.observe("b", 1.0)
+    with m.span("c"):
+        pass
+    assert m.snapshot() == {"counters": {}, "histograms": {}}
+
+
+def test_connection_counters(enabled):
+    socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for i in range(3)]
+    for sock in socks:
+        sock.bind(("127.0.0.1", 0))
+    stream, receive, send = [sock.getsockname()[1] for sock in socks]
+    for sock in socks:
+        sock.close()
+    conn = UtilConnectionsWtNnBlcRcv("127.0.0.1", stream, "127.0.0.1", receive, "127.0.0.1", send, \
+        receivePolicy=UtilReceivePolicyLatest())
+    conn.metricsName = "link"
+    conn._receivePolicy.metricsName = "link.stream"
+    conn._receiveTimeout = 0.1
+    conn.handleReceivedData = lambda: None
+    conn.setup()
+    peer = LoopbackPeer.forConnection(conn)
+    peer.start()
+    try:
+        conn.utilSendCommand("hello")
+        conn._flag_receiving_nnblc = True
+        for i in range(3):
+            peer.sendData("pose_%d" % i)
+        time.sleep(0.1)
+        conn.receiveCallBack()
+        peer.stop()
+        with pytest.raises(RuntimeError):
+            conn.utilSendCommand("anyone?")
+    finally:
+        conn.clear()
+    counters = metrics.snapshot()["counters"]
+    assert counters["link.commands.sent"] == 2
+    assert counters["link.commands.timeouts"] == 1
+    assert counters["link.received"] == 1
+    assert counters["link.stream.received"] == 3
+    assert counters["link.stream.dropped"] == 2
@@ -0,0 +1,63 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import pytest
+from ControlRoomLib.UtilPoseFilter import POSE_FILTERS, UtilPoseFilterKalman, UtilPoseFilterOneEuro, \
+    makePoseFilter
+
+
+def test_make_pose_filter():
+    assert makePoseFilter("none") is None
+    for name in POSE_FILTERS[1:]:
+        assert makePoseFilter(name) is not None
+    with pytest.raises(ValueError):
+        makePoseFilter("median")
+
+
+def test_one_euro_converges_and_passes_extra_values():
+    f = UtilPoseFilterOneEuro()
+    assert f.update(0.0, [0.0, 0.0, 7.0]) == [0.0, 0.0, 7.0]
+    for i in range(1, 500):
+        out = f.update(i * 0.01, [10.0, -10.0, 7.0])
+    assert out[0] == pytest.approx(10.0, abs=1e-3)
+    assert out[1] == pytest.approx(-10.0, abs=1e-3)
+    assert out[2] == 7.0
+
+
+def test_kalman_tracks_constant_velocity_and_predicts():
+    plain, ahead = UtilPoseFilterKalman(), UtilPoseFilterKalman(horizon=0.03)
+    for i in range(200):
+        t = i * 0.01
+        x = plain.update(t, [100.0 * t, 0.0])[0]
+        x_ahead = ahead.update(t, [100.0 * t, 0.0])[0]
+    assert x == pytest.approx(100.0 * t, abs=0.05)
+    assert x_ahead == pytest.approx(100.0 * (t + 0.03), abs=0.05)
+
+
+def test_reset_forgets_state():
+    f = UtilPoseFilterKalman()
+    f.update(0.0, [5.0, 5.0])
+    f.update(0.01, [6.0, 6.0])
+    f.reset()
+    assert f.update(1.0, [-3.0, 2.0]) == [-3.0, 2.0]
@@ -0,0 +1,51 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from ControlRoomLib.UtilReceivePolicy import UtilReceivePolicyLatest, UtilReceivePolicyQueued
+
+
+def test_latest_keeps_newest_of_a_burst():
+    policy = UtilReceivePolicyLatest()
+    for data in (b"1", b"2", b"3"):
+        policy.push(data)
+    assert tuple(policy.pop()) == (b"3",)
+    assert tuple(policy.pop()) == ()
+    assert policy.stats() == {"received": 3, "handled": 1, "dropped": 2}
+
+
+def test_queued_hands_over_everything_in_order():
+    policy = UtilReceivePolicyQueued()
+    for data in (b"1", b"2", b"3"):
+        policy.push(data)
+    assert list(policy.pop()) == [b"1", b"2", b"3"]
+    assert list(policy.pop()) == []
+    assert policy.stats() == {"received": 3, "handled": 3, "dropped": 0}
+
+
+def test_queued_overflow_drops_oldest():
+    policy = UtilReceivePolicyQueued(maxlen=2)
+    for data in (b"1", b"2", b"3"):
+        policy.push(data)
+    assert list(policy.pop()) == [b"2", b"3"]
+    assert policy.dropped == 1
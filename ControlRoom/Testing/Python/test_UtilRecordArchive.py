@@ -0,0 +1,56 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import numpy as np
+from ControlRoomLib.UtilRecordArchive import UtilRecordArchive, UtilRecordArchiveWriter, csvToArchive, \
+    recordingBlocks
+
+
+def _recording(rows=1000):
+    t = np.arange(rows) * 0.01
+    return np.column_stack([t, np.sin(t), np.cos(t), np.full(rows, 3.5)])
+
+
+def test_round_trip(tmp_path):
+    data = _recording()
+    path = str(tmp_path / "rec.akrec")
+    with UtilRecordArchiveWriter(path, 4, chunkRows=64) as writer:
+        writer.extend(data[:100])
+        for row in data[100:]:
+            writer.append(row)
+    archive = UtilRecordArchive(path)
+    assert archive.rows() == 1000 and archive.chunkCount() == 16
+    assert np.array_equal(np.concatenate([archive.chunk(i) for i in range(archive.chunkCount())]), data)
+    assert np.array_equal(archive.read(2.0, 3.0), data[(data[:, 0] >= 2.0) & (data[:, 0] < 3.0)])
+
+
+def test_csv_conversion_and_blocks(tmp_path):
+    data = _recording(300)
+    csv = str(tmp_path / "rec.csv")
+    np.savetxt(csv, data, delimiter=",", fmt="%.17g")
+    out = csvToArchive(csv, chunkRows=128)
+    assert np.array_equal(np.concatenate(list(recordingBlocks(out))), data)
+    blocks = list(recordingBlocks(csv, chunkRows=100))
+    assert [b.shape[0] for b in blocks] == [100, 100, 100]
+    assert np.array_equal(np.concatenate(blocks), data)
@@ -0,0 +1,95 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import numpy as np
+from ControlRoomLib.UtilSharedRing import UtilSharedRingReader, UtilSharedRingWriter
+
+
+def _ring(capacity=8):
+    name = "aktest_%d" % os.getpid()
+    return UtilSharedRingWriter(name, capacity=capacity, columns=2), name
+
+
+def test_read_in_order_and_latest():
+    writer, name = _ring()
+    reader = UtilSharedRingReader(name)
+    try:
+        assert reader.latest() is None
+        for i in range(5):
+            writer.append((i, -i))
+        first, rows = reader.read(0)
+        assert first == 0 and rows[:, 0].tolist() == [0, 1, 2, 3, 4]
+        assert reader.latest()[0] == 4
+        assert reader.read(5)[1].shape[0] == 0
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_overwritten_rows_are_skipped():
+    writer, name = _ring(capacity=8)
+    reader = UtilSharedRingReader(name)
+    try:
+        for i in range(20):
+            writer.append((i, 0))
+        first, rows = reader.read(0)
+        # The oldest slot may be rewritten next, so it is left out
+        assert first == 13 and rows[:, 0].tolist() == list(range(13, 20))
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_torn_row_is_never_returned():
+    writer, name = _ring(capacity=8)
+    reader = UtilSharedRingReader(name)
+    try:
+        for i in range(6):
+            writer.append((i, 0))
+        # Slot of row 3 caught mid-write by the producer
+        writer._seq[3] = 2 * 3 + 1
+        writer._rows[3] = (np.nan, np.nan)
+        first, rows = reader.read(0)
+        assert first == 4 and rows[:, 0].tolist() == [4, 5]
+        writer._seq[5] = 2 * 5 + 1
+        assert reader.latest() is None
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_replaced_segment_is_not_current():
+    writer, name = _ring()
+    reader = UtilSharedRingReader(name)
+    try:
+        assert reader.isCurrent()
+        writer.close()
+        assert not reader.isCurrent()
+        writer, name = _ring()
+        assert not reader.isCurrent()
+        assert UtilSharedRingReader(name).isCurrent()
+    finally:
+        reader.close()
+        writer.close()
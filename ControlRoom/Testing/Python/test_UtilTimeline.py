@@ -0,0 +1,74 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import numpy as np
+from ControlRoomLib.UtilRingBuffer import UtilRingBuffer
+from ControlRoomLib.UtilTimeline import UtilTimeline, UtilTimelineStream
+
+
+def test_ring_buffer_wraps_oldest_first():
+    ring = UtilRingBuffer(4, 2)
+    assert ring.latest() is None
+    for i in range(6):
+        ring.append((i, -i))
+    assert ring.written == 6 and len(ring) == 4
+    assert ring.recent()[:, 0].tolist() == [2, 3, 4, 5]
+    assert ring.recent(2)[:, 0].tolist() == [4, 5]
+    assert ring.latest().tolist() == [5, -5]
+
+
+def test_ring_buffer_extend_matches_append():
+    a, b = UtilRingBuffer(5, 1), UtilRingBuffer(5, 1)
+    rows = np.arange(13.0).reshape(-1, 1)
+    for chunk in (rows[:3], rows[3:4], rows[4:13]):
+        a.extend(chunk)
+    for row in rows:
+        b.append(row)
+    assert a.written == b.written == 13
+    assert np.array_equal(a.recent(), b.recent())
+
+
+def test_stream_window_and_tail_across_wrap():
+    stream = UtilTimelineStream(8, 1)
+    stream.extend(np.arange(5.0), np.arange(5.0))
+    stream.extend(np.arange(5.0, 12.0), np.arange(5.0, 12.0))
+    assert len(stream) == 8
+    assert stream.times().tolist() == list(np.arange(4.0, 12.0))
+    t, v = stream.window(6.0, 9.0)
+    assert t.tolist() == [6.0, 7.0, 8.0] and v[:, 0].tolist() == [6.0, 7.0, 8.0]
+    t, v = stream.tail(2)
+    assert t.tolist() == [10.0, 11.0]
+
+
+def test_resample_and_sample_and_hold():
+    timeline = UtilTimeline()
+    timeline.addStream("tracker", 2, capacity=16)
+    timeline.addStream("screen", 1, capacity=16)
+    for t in range(4):
+        timeline.ingest("tracker", (t * 10.0, -t * 10.0), float(t))
+    timeline.ingestEvent("screen", "trialcomplete", 1.5)
+    res = timeline.synchronized(["tracker", "screen"], [0.5, 2.0], events=("screen",))
+    assert np.allclose(res["tracker"], [[5.0, -5.0], [20.0, -20.0]])
+    assert np.isnan(res["screen"][0, 0])
+    assert timeline.eventLabel(res["screen"][1, 0]) == "trialcomplete"
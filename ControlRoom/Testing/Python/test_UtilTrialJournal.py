@@ -0,0 +1,128 @@
+"""
+MIT License
+
+Copyright (c) 2022 Yihao Liu, Johns Hopkins University
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+import json
+import os
+import pytest
+from ControlRoomLib import UtilTrialJournal as journalModule
+from ControlRoomLib.ControlRoomEngine import ControlRoomEngine
+from ControlRoomLib.UtilTrialJournal import UtilTrialJournal
+
+
+def _state(i):
+    return {"SubjectAcr": "T_21", "ExperimentTimeStamp": "11152022151111", "TrialIndex": str(i)}
+
+
+def test_torn_last_line_is_skipped_and_terminated(tmp_path):
+    path = str(tmp_path / "journal.log")
+    journal = UtilTrialJournal(path)
+    journal.open()
+    for i in range(3):
+        journal.append("start", _state(i))
+    journal.close()
+    # Crash in the middle of writing the fourth record
+    with open(path, "a") as f:
+        f.write('{"seq": 3, "event": "sta')
+    journal = UtilTrialJournal(path)
+    assert journal.last()["seq"] == 2
+    journal.open()
+    record = journal.append("complete", _state(3))
+    journal.close()
+    assert record["seq"] == 3
+    assert UtilTrialJournal(path).last() == record
+    with open(path) as f:
+        lines = f.read().split("\n")
+    assert lines[-2] == json.dumps(record) and lines[-1] == ""
+
+
+def test_last_reads_the_tail_only(tmp_path, monkeypatch):
+    path = str(tmp_path / "journal.log")
+    journal = UtilTrialJournal(path, maxBytes=1 << 30)
+    journal.open()
+    for i in range(2000):
+        journal.append("start", _state(i))
+    # A last record longer than the tail block: found by doubling it
+    long = journal.append("apply", dict(_state(2000), Note="x" * 3 * UtilTrialJournal.TAIL_BLOCK))
+    journal.close()
+    read = []
+
+    class CountingFile(io.FileIO):
+        def read(self, size=-1):
+            data = super().read(size)
+            read.append(len(data))
+            return data
+
+    monkeypatch.setattr(journalModule, "open", lambda p, mode: CountingFile(p, "r"), raising=False)
+    assert UtilTrialJournal(path).last() == long
+    assert sum(read) <= 8 * UtilTrialJournal.TAIL_BLOCK < os.path.getsize(path)
+
+
+def test_fsync_is_batched(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, "fsync", synced.append)
+    journal = UtilTrialJournal(str(tmp_path / "journal.log"), fsyncEvery=3, fsyncInterval=1e9)
+    journal.open()
+    for i in range(7):
+        journal.append("start", _state(i))
+    assert len(synced) == 2
+    journal.sync()
+    journal.sync()
+    assert len(synced) == 3
+    journal.append("start", _state(7))
+    journal.close()
+    assert len(synced) == 4
+
+
+def test_fsync_after_interval(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, "fsync", synced.append)
+    journal = UtilTrialJournal(str(tmp_path / "journal.log"), fsyncEvery=100, fsyncInterval=0.0)
+    journal.open()
+    journal.append("start", _state(0))
+    journal.append("start", _state(1))
+    assert len(synced) == 2
+    journal.close()
+
+
+def test_restore_session_with_running_trial(subjectConfig):
+    path = subjectConfig + "TrialJournal.log"
+    engine = ControlRoomEngine(subjectConfig)
+    engine.openJournal(path)
+    engine.openSession("T_21", "11152022151111", 1)
+    engine._parameterNode.SetParameter("RunningATrial", "true")
+    engine.journalEvent("start", "VPC-D")
+    # The station goes down with the trial on
+    engine._journal._file.close()
+
+    engine = ControlRoomEngine(subjectConfig)
+    engine.openJournal(path)
+    record = engine.restoreFromJournal()
+    engine.closeJournal()
+    assert record["event"] == "start" and record["Trial"] == "VPC-D"
+    assert engine.parameter("SubjectAcr") == "T_21"
+    assert engine.parameter("ExperimentTimeStamp") == "11152022151111"
+    assert (engine.parameter("TrialIndex"), engine.parameter("CurTrial")) == ("1", "VPC-D")
+    assert engine.parameter("RunningATrial") == "false"
+    assert engine.parameter("SessionSeq") == "VPC-U\nVPC-D\nVPB-hfixed"